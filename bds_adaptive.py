@@ -0,0 +1,191 @@
+"""
+Adaptive Quadtree Grid Refinement
+
+BDS1/BDS2 use a fixed 0.03° step, which leaves gaps between circles in
+the dense core and spends queries on empty outskirts; BDS4-BDS15 use
+nine hardcoded points. The adaptive grid:
+
+1. starts from a coarse grid of square cells over the city bbox
+2. scores each cell's centre and four corners (corners are shared
+   between neighbours, so each point is counted once)
+3. splits a cell into four when the spread (max - min) of its five
+   scores exceeds THRESHOLD × the score range of the coarse grid
+4. repeats on the children, highest-spread cells first, until cells
+   reach MIN_SIZE or the query budget (number of scored points) runs out
+
+Every level is scored in one count_grid batch through the selected
+engine. The result is one row per leaf cell (centre, size, score), fine
+in the core and coarse in the outskirts.
+
+Usage:
+
+    python bds_adaptive.py UDI --budget 400 --min-size 0.004
+"""
+
+import argparse
+
+import bds_indices
+from bds_cube import cell_key
+from bds_query import BBOX
+
+COARSE_STEP = 0.05
+MIN_SIZE = 0.004
+THRESHOLD = 0.15
+BUDGET = 400
+
+
+# -----------------------------
+# Cells
+# -----------------------------
+class Cell:
+
+    def __init__(self, lon, lat, size):
+        self.lon = lon
+        self.lat = lat
+        self.size = size
+
+    @property
+    def center(self):
+        return [self.lon, self.lat]
+
+    def samples(self):
+        half = self.size / 2.0
+        return [
+            self.center,
+            [self.lon - half, self.lat - half],
+            [self.lon + half, self.lat - half],
+            [self.lon - half, self.lat + half],
+            [self.lon + half, self.lat + half],
+        ]
+
+    def split(self):
+        quarter = self.size / 4.0
+        half = self.size / 2.0
+        return [
+            Cell(self.lon + dx, self.lat + dy, half)
+            for dx in (-quarter, quarter)
+            for dy in (-quarter, quarter)
+        ]
+
+
+def coarse_cells(step=COARSE_STEP, bbox=BBOX):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    nx = max(1, round((max_lon - min_lon) / step))
+    ny = max(1, round((max_lat - min_lat) / step))
+    return [
+        Cell(min_lon + (i + 0.5) * step, min_lat + (j + 0.5) * step, step)
+        for i in range(nx)
+        for j in range(ny)
+    ]
+
+
+# -----------------------------
+# Scoring with a shared point cache
+# -----------------------------
+class Scorer:
+
+    def __init__(self, db, index, engine=None):
+        self.db = db
+        self.index = index
+        self.engine = engine
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def new_points(self, points):
+        seen = set()
+        fresh = []
+        for p in points:
+            key = cell_key(p)
+            if key not in self.rows and key not in seen:
+                seen.add(key)
+                fresh.append(p)
+        return fresh
+
+    def score(self, points):
+        fresh = self.new_points(points)
+        if fresh:
+            rows = bds_indices.compute(self.db, self.index, fresh, self.engine)
+            for p, row in zip(fresh, rows):
+                self.rows[cell_key(p)] = row
+
+    def value(self, point):
+        return self.rows[cell_key(point)][self.index.name]
+
+    def spread(self, cell):
+        values = [self.value(p) for p in cell.samples()]
+        return max(values) - min(values)
+
+
+# -----------------------------
+# Refinement
+# -----------------------------
+def refine(db, index, engine=None, step=COARSE_STEP, min_size=MIN_SIZE,
+           threshold=THRESHOLD, budget=BUDGET, bbox=BBOX):
+    """
+    Leaf rows ({center, size, <index>, counts...}) of the adaptive grid,
+    plus the number of points scored.
+    """
+    scorer = Scorer(db, index, engine)
+    frontier = coarse_cells(step, bbox)
+    scorer.score([p for cell in frontier for p in cell.samples()])
+
+    values = [row[index.name] for row in scorer.rows.values()]
+    scale = (max(values) - min(values)) or 1.0
+
+    leaves = []
+    while frontier:
+        pending = {}
+        children = []
+
+        for cell in sorted(frontier, key=scorer.spread, reverse=True):
+            if cell.size / 2.0 < min_size or scorer.spread(cell) <= threshold * scale:
+                leaves.append(cell)
+                continue
+
+            split = cell.split()
+            fresh = [
+                p for p in scorer.new_points([p for c in split for p in c.samples()])
+                if cell_key(p) not in pending
+            ]
+            if len(scorer) + len(pending) + len(fresh) > budget:
+                leaves.append(cell)
+                continue
+
+            pending.update((cell_key(p), p) for p in fresh)
+            children.extend(split)
+
+        scorer.score(list(pending.values()))
+        frontier = children
+
+    rows = [
+        {**scorer.rows[cell_key(cell.center)], "size": cell.size}
+        for cell in leaves
+    ]
+    return index.rank(rows), len(scorer)
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    from bds_query import get_db
+
+    parser = argparse.ArgumentParser(description="Adaptive quadtree grid for one BDS index")
+    parser.add_argument("index", choices=list(bds_indices.INDICES))
+    parser.add_argument("--step", type=float, default=COARSE_STEP, help="coarse cell size (degrees)")
+    parser.add_argument("--min-size", type=float, default=MIN_SIZE, help="smallest cell (degrees)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="split when spread > threshold x coarse score range")
+    parser.add_argument("--budget", type=int, default=BUDGET, help="maximum points scored")
+    parser.add_argument("--engine", help="counting engine (see bds_query.py)")
+    args = parser.parse_args()
+
+    index = bds_indices.INDICES[args.index]
+    rows, scored = refine(get_db(), index, args.engine, args.step, args.min_size,
+                          args.threshold, args.budget)
+
+    print(f"{index.title}: {len(rows)} cells from {scored} scored points\n")
+    for row in rows[:10]:
+        print(f"{row['center']}  size {row['size']:.4f}°  {index.name} {row[index.name]}")
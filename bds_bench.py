@@ -0,0 +1,288 @@
+"""
+Benchmark Suite for the BDS Indices
+
+Runs every analysis (UDI, RAS, FRI, ESCI, CHS, PUCI, ESI, DVI, HAI,
+CHPS, ECGS, SCIPI, TCRI, DREI) against a local dataset at several grid
+sizes and records, per case:
+
+    wall_s        elapsed time
+    queries       database commands issued (bds_instrument.QueryListener)
+    bytes_out/in  BSON size of those commands and their replies
+    peak_rss_mb   peak resident memory of the process running the case
+    cells_per_s   grid cells scored per second
+
+Each case runs in a forked child process, so engine caches start cold
+and peak RSS belongs to that case alone. Runs are appended to a JSON
+history file; --save-baseline stores a run as the baseline and every
+later run prints its speed-up against it, matched by (index, cells).
+
+Datasets:
+    mock:<N>               synthetic mongomock dataset (bds_synth.py);
+                           mongomock emits no command events, so queries
+                           and bytes are only recorded for real servers.
+                           mongomock cannot run the server-side engines
+                           ($geoWithin, geohash cells), so mock data runs
+                           the in-process ones (default numpy)
+    mongo:<uri>#<db>       a local MongoDB (e.g. loaded by bds_synth.py)
+
+Usage:
+
+    python bds_bench.py --data mock:20000 --engine numpy --cells 9,100,10000
+    python bds_bench.py --data mongo:mongodb://localhost:27017#bench --save-baseline
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import resource
+import subprocess
+import time
+
+import numpy as np
+from pymongo import MongoClient
+
+import bds_cube
+import bds_indices
+from bds_cube import GRID_POINTS
+from bds_instrument import QueryListener
+from bds_query import BBOX
+
+HISTORY_PATH = os.environ.get("BDS_BENCH_HISTORY", ".bds_cache/bench_history.json")
+BASELINE_PATH = os.environ.get("BDS_BENCH_BASELINE", ".bds_cache/bench_baseline.json")
+
+CELLS = [9, 100, 10000, 1000000]
+# Engines that count in this process and so run on mongomock
+MOCK_ENGINES = ("local", "numpy", "raster")
+INDICES = ["UDI", "RAS", "FRI", "ESCI", "CHS", "PUCI", "ESI", "DVI",
+           "HAI", "CHPS", "ECGS", "SCIPI", "TCRI", "DREI"]
+
+
+# -----------------------------
+# Datasets and grids
+# -----------------------------
+def open_dataset(spec, counter=None):
+    kind, _, value = spec.partition(":")
+
+    if kind == "mock":
+        import bds_synth
+
+        return bds_synth.mock_db(int(value))
+
+    if kind == "mongo":
+        uri, _, name = value.partition("#")
+        listeners = [counter] if counter else []
+        return MongoClient(uri, event_listeners=listeners)[name or "bigdata_spatial"]
+
+    raise ValueError(f"Unknown dataset {spec!r}; use mock:<N> or mongo:<uri>#<db>")
+
+
+def resolve_engine(data, engine=None):
+    """
+    The engine to benchmark: numpy on mock data, aggregate otherwise.
+    """
+    if not data.startswith("mock:"):
+        return engine or "aggregate"
+
+    engine = engine or "numpy"
+    in_process = engine in MOCK_ENGINES or (
+        engine == "cube" and bds_cube.CUBE_SOURCE in MOCK_ENGINES
+    )
+    if not in_process:
+        raise ValueError(
+            f"Engine {engine!r} runs on the database side, which mongomock does not "
+            f"support; use one of {', '.join(MOCK_ENGINES)} (or cube with "
+            f"BDS_CUBE_SOURCE=local/numpy) on mock data, or --data mongo:<uri>#<db>"
+        )
+    return engine
+
+
+def make_grid(cells, bbox=BBOX):
+    if cells == len(GRID_POINTS):
+        return [list(p) for p in GRID_POINTS]
+
+    side = max(1, int(round(math.sqrt(cells))))
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lon, lat = np.meshgrid(
+        np.linspace(min_lon, max_lon, side),
+        np.linspace(min_lat, max_lat, side),
+    )
+    return np.column_stack([lon.ravel(), lat.ravel()]).tolist()
+
+
+# -----------------------------
+# One case
+# -----------------------------
+def run_case(db, name, cells, engine, counter=None):
+    counter = counter or QueryListener()
+    started = time.perf_counter()
+
+    if name == "FRI":
+        from bds_flood import flood_risk
+
+        flood_risk(db, workers=1)
+        scored = 1
+    else:
+        points = make_grid(cells)
+        bds_indices.compute(db, bds_indices.INDICES[name], points, engine)
+        scored = len(points)
+
+    elapsed = time.perf_counter() - started
+    tracked = counter.queries > 0
+
+    return {
+        "index": name,
+        "cells": None if name == "FRI" else scored,
+        "engine": engine,
+        "wall_s": round(elapsed, 4),
+        "queries": counter.queries if tracked else None,
+        "bytes_out": counter.bytes_out if tracked else None,
+        "bytes_in": counter.bytes_in if tracked else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "cells_per_s": round(scored / elapsed, 1) if elapsed else None,
+    }
+
+
+def _child(data, name, cells, engine, conn):
+    try:
+        counter = QueryListener()
+        db = _DATASET if _DATASET is not None else open_dataset(data, counter)
+        conn.send(run_case(db, name, cells, engine, counter))
+    except Exception as exc:
+        conn.send({"index": name, "cells": cells, "engine": engine, "error": repr(exc)})
+    finally:
+        conn.close()
+
+
+# Mock datasets are built once and inherited by every forked case
+_DATASET = None
+
+
+def run_isolated(data, name, cells, engine):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return run_case(_DATASET or open_dataset(data), name, cells, engine)
+
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child, args=(data, name, cells, engine, child))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+# -----------------------------
+# History and baseline
+# -----------------------------
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load(path, default):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return default
+
+
+def _save(path, value):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(value, f, indent=2)
+
+
+def compare(run, baseline):
+    """
+    Rows of (index, cells, wall_s, baseline wall_s, speed-up).
+    """
+    base = {(c["index"], c["cells"]): c for c in baseline["cases"] if "wall_s" in c}
+    rows = []
+    for case in run["cases"]:
+        old = base.get((case["index"], case["cells"]))
+        if old and "wall_s" in case:
+            speedup = old["wall_s"] / case["wall_s"] if case["wall_s"] else None
+            rows.append((case["index"], case["cells"], case["wall_s"], old["wall_s"], speedup))
+    return rows
+
+
+def print_header():
+    print(f"{'index':7} {'cells':>8} {'wall_s':>9} {'queries':>8} {'MB in':>8} "
+          f"{'RSS MB':>8} {'cells/s':>11}")
+
+
+def print_comparison(row):
+    index, n, wall, old, speedup = row
+    ratio = f"x{speedup:.2f}" if speedup is not None else "-"
+    print(f"{index:7} {n!s:>8} {wall:>9.3f}s vs {old:>9.3f}s  {ratio}")
+
+
+def print_case(c):
+    if "error" in c:
+        print(f"{c['index']:7} {c['cells']!s:>8} error: {c['error']}")
+        return
+    mb_in = f"{c['bytes_in'] / 1e6:.2f}" if c["bytes_in"] is not None else "-"
+    print(f"{c['index']:7} {c['cells']!s:>8} {c['wall_s']:>9.3f} {c['queries']!s:>8} "
+          f"{mb_in:>8} {c['peak_rss_mb']:>8} {c['cells_per_s']!s:>11}")
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the BDS indices")
+    parser.add_argument("--data", default="mock:20000", help="mock:<N> or mongo:<uri>#<db>")
+    parser.add_argument("--engine", help="counting engine (see bds_query.py); "
+                                         "default numpy on mock data, aggregate otherwise")
+    parser.add_argument("--cells", default=",".join(map(str, CELLS)),
+                        help="comma-separated grid sizes")
+    parser.add_argument("--indices", default=",".join(INDICES), help="comma-separated names")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as baseline")
+    args = parser.parse_args()
+
+    try:
+        args.engine = resolve_engine(args.data, args.engine)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    if args.data.startswith("mock:"):
+        _DATASET = open_dataset(args.data)
+
+    cells = [int(c) for c in args.cells.split(",")]
+    names = [n.strip() for n in args.indices.split(",")]
+
+    print_header()
+    cases = []
+    for name in names:
+        for n in ([None] if name == "FRI" else cells):
+            cases.append(run_isolated(args.data, name, n, args.engine))
+            print_case(cases[-1])
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _git_commit(),
+        "data": args.data,
+        "engine": args.engine,
+        "cases": cases,
+    }
+
+    history = _load(HISTORY_PATH, [])
+    history.append(run)
+    _save(HISTORY_PATH, history)
+
+    baseline = _load(BASELINE_PATH, None)
+    if baseline:
+        print(f"\nAgainst baseline {baseline['commit']} ({baseline['engine']}, {baseline['timestamp']}):")
+        for row in compare(run, baseline):
+            print_comparison(row)
+
+    if args.save_baseline:
+        _save(BASELINE_PATH, run)
+        print(f"\nSaved baseline to {BASELINE_PATH}")
@@ -0,0 +1,223 @@
+"""
+Persistent Query-Result Cache
+
+Re-running BDS4 after BDS14 repeats the exact same hospital +
+$centerSphere counts against Atlas. This cache stores query results on
+disk (SQLite) so every script shares them across runs.
+
+Keys (all include the database name and BDS_GEO_FIELD, so geometry and
+centroid results never mix):
+- aggregate engine : (collection, centre, radius, fclass filter)
+  -> {fclass: count}; a filtered and an unfiltered tally of the same
+  circle are separate entries
+- count engine     : (collection, filter) with the centre and radius
+  inside the filter
+
+Invalidation:
+- every entry records the version stamp of its collection (the write
+  counter every BDS write path bumps, plus document count and newest
+  _id; see bds_query.collection_version)
+- a stamp mismatch is a miss and the stale entry is replaced
+- stamps are re-read after BDS_CACHE_VERSION_TTL seconds, so a long
+  session sees writes made while it runs
+
+Size:
+- total stored bytes are capped at BDS_CACHE_MB
+- least recently used entries are evicted first
+
+Enable with BDS_CACHE=1; the file lives at BDS_CACHE_PATH.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+ENABLED = os.environ.get("BDS_CACHE", "0") == "1"
+CACHE_PATH = os.environ.get("BDS_CACHE_PATH", ".bds_cache/queries.sqlite")
+MAX_BYTES = int(float(os.environ.get("BDS_CACHE_MB", 64)) * 1024 * 1024)
+
+# Seconds a collection's version stamp is reused before it is read again
+VERSION_TTL_S = float(os.environ.get("BDS_CACHE_VERSION_TTL", 5))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+"""
+
+
+def make_key(*parts):
+    text = json.dumps(parts, sort_keys=True, default=float)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+class QueryCache:
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.max_bytes = max_bytes
+        self.versions = {}
+
+    def version(self, db, collection):
+        from bds_query import collection_version
+
+        memo = (db.name, collection)
+        now = time.monotonic()
+        if memo not in self.versions or now - self.versions[memo][1] > VERSION_TTL_S:
+            self.versions[memo] = (json.dumps(collection_version(db, collection)), now)
+        return self.versions[memo][0]
+
+    def get_many(self, keys, versions):
+        """
+        {key: value} for the keys stored with the expected version.
+        """
+        found = {}
+        now = time.time()
+
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, version, value FROM entries "
+                f"WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for key, version, value in rows:
+                if version == versions[key]:
+                    found[key] = json.loads(value)
+
+        self.conn.executemany(
+            "UPDATE entries SET last_used = ? WHERE key = ?",
+            [(now, key) for key in found],
+        )
+        self.conn.commit()
+        return found
+
+    def put_many(self, items):
+        """
+        items: (key, collection, version, value) tuples.
+        """
+        now = time.time()
+        rows = []
+        for key, collection, version, value in items:
+            text = json.dumps(value)
+            rows.append((key, collection, version, text, len(text), now))
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.evict()
+        self.conn.commit()
+
+    def evict(self):
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_used"
+        ):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    # -----------------------------
+    # Cached query paths
+    # -----------------------------
+    def run_jobs(self, db, jobs, run):
+        """
+        Cached version of bds_executor.run_jobs.
+        """
+        from bds_query import GEO_FIELD
+
+        keys = [
+            make_key("job", db.name, GEO_FIELD, collection, kind, payload)
+            for collection, kind, payload in jobs
+        ]
+        versions = {k: self.version(db, job[0]) for k, job in zip(keys, jobs)}
+        found = self.get_many(keys, versions)
+
+        todo = [i for i, k in enumerate(keys) if k not in found]
+        if todo:
+            results = run(db, [jobs[i] for i in todo])
+            self.put_many(
+                (keys[i], jobs[i][0], versions[keys[i]], result)
+                for i, result in zip(todo, results)
+            )
+            for i, result in zip(todo, results):
+                found[keys[i]] = result
+
+        return [found[k] for k in keys]
+
+    def tally_points(self, db, points, radius_rad, collections, compute, fclasses=None):
+        """
+        Cached version of bds_query.tally_points.
+        """
+        from bds_query import GEO_FIELD
+
+        fclasses = fclasses or {}
+
+        def key(point, collection):
+            return make_key(
+                "tally", db.name, GEO_FIELD, collection,
+                round(float(point[0]), 9), round(float(point[1]), 9),
+                radius_rad, fclasses.get(collection),
+            )
+
+        keys = {
+            (i, c): key(p, c)
+            for i, p in enumerate(points)
+            for c in collections
+        }
+        versions = {k: self.version(db, c) for (_, c), k in keys.items()}
+        found = self.get_many(list(keys.values()), versions)
+
+        todo = sorted({i for (i, c), k in keys.items() if k not in found})
+        if todo:
+            fresh = compute(db, [points[i] for i in todo], radius_rad, collections, fclasses)
+            self.put_many(
+                (keys[(i, c)], c, versions[keys[(i, c)]], list(tally[c].items()))
+                for i, tally in zip(todo, fresh)
+                for c in collections
+            )
+            for i, tally in zip(todo, fresh):
+                for c in collections:
+                    found[keys[(i, c)]] = list(tally[c].items())
+
+        return [
+            {c: dict(found[keys[(i, c)]]) for c in collections}
+            for i in range(len(points))
+        ]
+
+
+_CACHE = None
+
+
+def cache():
+    """
+    The shared cache, or None when BDS_CACHE is not enabled.
+    """
+    global _CACHE
+    if ENABLED and _CACHE is None:
+        _CACHE = QueryCache()
+    return _CACHE if ENABLED else None
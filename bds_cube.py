@@ -0,0 +1,249 @@
+"""
+Shared Feature-Count Cube
+
+BDS1-BDS15 all recount buildings, roads, POIs and water around the
+same grid points, only with different radii and weights. The cube
+materializes those counts once per data version:
+
+    (cell, radius, layer, POI fclass) -> count
+
+and every index is then derived from it without extra queries.
+
+How it is used:
+- BDS_ENGINE=cube makes count_grid() read from the cube
+- The first script that runs fills the cube for its grid at every
+  standard radius (1.5, 2, 3, 4 km) and every layer in one go (a single
+  distance pass per centre with BDS_CUBE_SOURCE=local or numpy)
+- Later scripts on the same grid are pure lookups
+- The cube is stored on disk (BDS_CUBE_PATH) together with a data
+  version stamp, the BDS_GEO_FIELD it was counted on and the counting
+  rule of its source engine; when any layer changes, or the geo field
+  or rule differs, the cube is rebuilt
+
+Run it directly to prebuild the cube for the shared nine-point grid
+and print every index derived from it:
+
+    python bds_cube.py
+"""
+
+import json
+import os
+
+import bds_query
+from bds_local import LAYER_COLLECTIONS
+from bds_query import EARTH_RADIUS_KM
+
+CUBE_PATH = os.environ.get("BDS_CUBE_PATH", ".bds_cache/cube.json")
+
+# Engine used to fill missing cube cells
+CUBE_SOURCE = os.environ.get("BDS_CUBE_SOURCE", "aggregate")
+
+# Counting rule of each source engine: "within" = every vertex inside
+# the circle ($geoWithin), "centroid" = the stored centroid (else the
+# vertex mean) inside it, "cells" = geohash cell centres inside it
+COUNT_RULES = {
+    "aggregate": "within",
+    "local": "within",
+    "numpy": "centroid",
+    "raster": "centroid",
+    "cells": "cells",
+}
+
+# Radii used across the BDS scripts
+STANDARD_RADII_KM = [1.5, 2, 3, 4]
+
+# Shared nine-point grid used by BDS4-BDS15
+GRID_POINTS = [
+    [76.94, 11.01],
+    [76.95, 11.01],
+    [76.96, 11.01],
+    [76.94, 11.02],
+    [76.95, 11.02],
+    [76.96, 11.02],
+    [76.94, 11.03],
+    [76.95, 11.03],
+    [76.96, 11.03],
+]
+
+
+# -----------------------------
+# Keys
+# -----------------------------
+def cell_key(point):
+    return f"{float(point[0]):.6f},{float(point[1]):.6f}"
+
+
+def radius_key(radius_km):
+    return f"{float(radius_km):.6f}"
+
+
+# -----------------------------
+# Cube
+# -----------------------------
+class Cube:
+
+    def __init__(self, version, entries=None, geo_field=None, rule=None):
+        self.version = version
+        # Field the counts were tested against (bds_query.GEO_FIELD)
+        self.geo_field = geo_field or bds_query.GEO_FIELD
+        # COUNT_RULES entry of the engine that filled the cube
+        self.rule = rule or COUNT_RULES[CUBE_SOURCE]
+        # (cell_key, radius_key) -> {collection: {fclass: count}}
+        self.entries = entries or {}
+
+    def missing(self, points, radius_km, collections):
+        r = radius_key(radius_km)
+        return [
+            p for p in points
+            if any(
+                c not in self.entries.get((cell_key(p), r), {})
+                for c in collections
+            )
+        ]
+
+    def fill(self, db, points, radii_km, collections, engine=None):
+        """
+        Compute any missing (cell, radius, layer) tallies from the source
+        engine, every missing radius in one tally_grid_radii call.
+        """
+        missing = {
+            radius_km: self.missing(points, radius_km, collections)
+            for radius_km in radii_km
+        }
+        radii = [r for r, todo in missing.items() if todo]
+        if not radii:
+            return False
+
+        engine = engine or CUBE_SOURCE
+        if COUNT_RULES[engine] != self.rule:
+            if self.entries:
+                raise ValueError(
+                    f"cube counted by the {self.rule} rule, cannot fill it with {engine}"
+                )
+            self.rule = COUNT_RULES[engine]
+
+        todo_keys = {cell_key(p) for r in radii for p in missing[r]}
+        todo = [p for p in points if cell_key(p) in todo_keys]
+
+        tallies = bds_query.tally_grid_radii(
+            db, todo, [r / EARTH_RADIUS_KM for r in radii], collections, engine,
+        )
+        for radius_km in radii:
+            for point, tally in zip(todo, tallies[radius_km / EARTH_RADIUS_KM]):
+                key = (cell_key(point), radius_key(radius_km))
+                self.entries.setdefault(key, {}).update(tally)
+
+        return True
+
+    def tally(self, point, radius_km):
+        return self.entries[(cell_key(point), radius_key(radius_km))]
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, path=CUBE_PATH):
+        rows = [
+            {
+                "cell": cell,
+                "radius_km": radius,
+                "layers": {
+                    collection: [[fclass, n] for fclass, n in by_fclass.items()]
+                    for collection, by_fclass in tally.items()
+                },
+            }
+            for (cell, radius), tally in self.entries.items()
+        ]
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": self.version,
+                "geo_field": self.geo_field,
+                "rule": self.rule,
+                "cells": rows,
+            }, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        with open(path) as f:
+            data = json.load(f)
+
+        entries = {
+            (row["cell"], row["radius_km"]): {
+                collection: {fclass: n for fclass, n in pairs}
+                for collection, pairs in row["layers"].items()
+            }
+            for row in data["cells"]
+        }
+        # Files written before geo_field / rule were recorded match nothing
+        return cls(data["version"], entries, data.get("geo_field", "unknown"),
+                   data.get("rule", "unknown"))
+
+
+# -----------------------------
+# Engine used by bds_query
+# -----------------------------
+class CubeEngine:
+
+    def __init__(self, db, path=CUBE_PATH):
+        self.db = db
+        self.path = path
+        self.cube = None
+
+    def current(self):
+        if self.cube is None:
+            version = bds_query.data_version(self.db, LAYER_COLLECTIONS)
+            self.cube = Cube(version)
+            if os.path.exists(self.path):
+                stored = Cube.load(self.path)
+                if (
+                    stored.version == version
+                    and stored.geo_field == bds_query.GEO_FIELD
+                    and stored.rule == COUNT_RULES[CUBE_SOURCE]
+                ):
+                    self.cube = stored
+        return self.cube
+
+    def ensure(self, points, radii_km):
+        cube = self.current()
+        if cube.fill(self.db, points, radii_km, LAYER_COLLECTIONS):
+            cube.save(self.path)
+        return cube
+
+    def tally_points(self, points, radius_rad, collections):
+        radius_km = radius_rad * EARTH_RADIUS_KM
+        radii = STANDARD_RADII_KM + [radius_km]
+
+        cube = self.ensure(points, radii)
+        return [
+            {c: cube.tally(point, radius_km)[c] for c in collections}
+            for point in points
+        ]
+
+
+_ENGINES = {}
+
+
+def cube_for(db):
+    if db.name not in _ENGINES:
+        _ENGINES[db.name] = CubeEngine(db)
+    return _ENGINES[db.name]
+
+
+# -----------------------------
+# Prebuild + derive every index
+# -----------------------------
+if __name__ == "__main__":
+    import bds_indices
+
+    db = bds_query.get_db()
+    cube = cube_for(db).ensure(GRID_POINTS, STANDARD_RADII_KM)
+
+    print(f"Cube version {cube.version}: {len(cube.entries)} (cell, radius) entries\n")
+
+    for name, rows in bds_indices.derive_all(cube, GRID_POINTS).items():
+        index = bds_indices.INDICES[name]
+        top = index.rank(rows)[0]
+        print(f"{index.script} {name}: {top[name]} at {top['center']}")
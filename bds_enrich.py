@@ -0,0 +1,168 @@
+"""
+Derived-Geometry Attributes per Feature
+
+BDS3's get_lat_lon takes the first vertex of a Polygon/MultiPolygon as
+its location, and every $centerSphere query tests full geometries.
+This one-time job stores derived attributes on every document in
+buildings, roads, pois_area and water:
+
+    centroid  : GeoJSON Point (area-weighted for polygons,
+                length-weighted for lines)
+    bbox      : [min_lon, min_lat, max_lon, max_lat]
+    area_m2   : projected area (polygons, 0 otherwise)
+    length_m  : great-circle length (lines, 0 otherwise)
+
+and builds a 2dsphere index on centroid (see bds_indexes.py).
+
+With BDS_GEO_FIELD=centroid the count queries in bds_query test the
+centroid point instead of the whole geometry: point-in-circle is far
+cheaper than polygon containment, and the location is correct.
+
+Usage:
+
+    python bds_enrich.py            # only documents without a centroid
+    python bds_enrich.py --all      # recompute everything
+"""
+
+import sys
+import time
+
+import numpy as np
+from pymongo import UpdateOne
+
+from bds_indexes import ensure_indexes
+from bds_local import LAYER_COLLECTIONS, iter_vertices
+from bds_query import EARTH_RADIUS_KM, bump_version
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+BATCH_SIZE = 1000
+
+
+# -----------------------------
+# Geometry math
+# -----------------------------
+def _project(coords, lon0, lat0):
+    """
+    Local equirectangular projection in metres around (lon0, lat0).
+    """
+    xy = np.asarray(coords, dtype=np.float64)[:, :2]
+    x = np.radians(xy[:, 0] - lon0) * np.cos(np.radians(lat0)) * EARTH_RADIUS_M
+    y = np.radians(xy[:, 1] - lat0) * EARTH_RADIUS_M
+    return x, y
+
+
+def _ring_area_centroid(ring, lon0, lat0):
+    x, y = _project(ring, lon0, lat0)
+    cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+    area = cross.sum() / 2.0
+    if area == 0:
+        return 0.0, x.mean(), y.mean()
+    cx = ((x[:-1] + x[1:]) * cross).sum() / (6.0 * area)
+    cy = ((y[:-1] + y[1:]) * cross).sum() / (6.0 * area)
+    return area, cx, cy
+
+
+def _line_length_centroid(line):
+    xy = np.radians(np.asarray(line, dtype=np.float64)[:, :2])
+    lon, lat = xy[:, 0], xy[:, 1]
+    hav = (
+        np.sin(np.diff(lat) / 2.0) ** 2
+        + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2.0) ** 2
+    )
+    seg = 2.0 * np.arcsin(np.sqrt(np.clip(hav, 0.0, 1.0))) * EARTH_RADIUS_M
+    mid = np.degrees((xy[:-1] + xy[1:]) / 2.0)
+    return seg.sum(), mid, seg
+
+
+def derive(geometry):
+    """
+    centroid / bbox / area_m2 / length_m for one GeoJSON geometry.
+    """
+    vertices = np.array(list(iter_vertices(geometry)), dtype=np.float64)
+    lon0, lat0 = vertices[0]
+    bbox = [*vertices.min(axis=0), *vertices.max(axis=0)]
+
+    kind = geometry["type"]
+    coords = geometry["coordinates"]
+    area = length = 0.0
+    centroid = vertices.mean(axis=0)
+
+    if kind in ("Polygon", "MultiPolygon"):
+        polygons = [coords] if kind == "Polygon" else coords
+        total = sx = sy = 0.0
+        for polygon in polygons:
+            for i, ring in enumerate(polygon):
+                a, cx, cy = _ring_area_centroid(ring, lon0, lat0)
+                # Outer ring adds, holes subtract, whatever their winding
+                a = abs(a) if i == 0 else -abs(a)
+                total += a
+                sx += a * cx
+                sy += a * cy
+        area = total
+        if total > 0:
+            lon = lon0 + np.degrees(sx / total / (EARTH_RADIUS_M * np.cos(np.radians(lat0))))
+            lat = lat0 + np.degrees(sy / total / EARTH_RADIUS_M)
+            centroid = np.array([lon, lat])
+
+    elif kind in ("LineString", "MultiLineString"):
+        lines = [coords] if kind == "LineString" else coords
+        weighted = np.zeros(2)
+        for line in lines:
+            if len(line) < 2:
+                continue
+            line_length, mids, seg = _line_length_centroid(line)
+            length += line_length
+            weighted += (mids * seg[:, None]).sum(axis=0)
+        if length > 0:
+            centroid = weighted / length
+
+    return {
+        "centroid": {"type": "Point", "coordinates": [float(c) for c in centroid]},
+        "bbox": [float(b) for b in bbox],
+        "area_m2": round(float(area), 2),
+        "length_m": round(float(length), 2),
+    }
+
+
+# -----------------------------
+# Enrichment job
+# -----------------------------
+def enrich(db, collection, everything=False):
+    query = {} if everything else {"centroid": {"$exists": False}}
+    cursor = db[collection].find(query, {"geometry": 1})
+
+    started = time.perf_counter()
+    updated = skipped = 0
+    batch = []
+
+    for doc in cursor:
+        geometry = doc.get("geometry")
+        if not geometry:
+            skipped += 1
+            continue
+
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": derive(geometry)}))
+        if len(batch) >= BATCH_SIZE:
+            updated += db[collection].bulk_write(batch, ordered=False).modified_count
+            batch = []
+
+    if batch:
+        updated += db[collection].bulk_write(batch, ordered=False).modified_count
+
+    bump_version(db, collection)
+    ensure_indexes(db, [collection])
+    return {
+        "updated": updated,
+        "skipped": skipped,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+if __name__ == "__main__":
+    from bds_query import get_db
+
+    db = get_db()
+    everything = "--all" in sys.argv[1:]
+
+    for collection in LAYER_COLLECTIONS:
+        print(f"{collection}: {enrich(db, collection, everything)}")
@@ -0,0 +1,200 @@
+"""
+Concurrent Query Executor for the Grid Loop
+
+The grid loops send every MongoDB query strictly one after another, so
+on a high-latency link to Atlas the run time is (queries x round trip).
+This module sends independent per-point queries concurrently:
+
+- thread : bounded ThreadPoolExecutor sharing the MongoClient's
+           connection pool (pymongo clients are thread-safe)
+- async  : asyncio with an async driver (PyMongo's AsyncMongoClient,
+           or Motor when that is not available), on the same server as
+           the synchronous client; one async client per URI is kept on
+           a background event loop and closed at exit
+
+Both modes:
+- cap in-flight queries at BDS_WORKERS
+- apply backpressure: new queries are only submitted as others finish
+- return results in the same order as the jobs, so output is
+  deterministic whatever order the server answers in
+
+BDS_WORKERS=1 (the default) keeps the original sequential behaviour.
+Keep BDS_WORKERS at or below the client's maxPoolSize (100 by default)
+for near-linear speedup.
+"""
+
+import asyncio
+import atexit
+import inspect
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+WORKERS = int(os.environ.get("BDS_WORKERS", 1))
+MODE = os.environ.get("BDS_EXECUTOR", "thread")
+
+
+# -----------------------------
+# Thread pool mode
+# -----------------------------
+def map_ordered(func, items, workers=None):
+    workers = workers or WORKERS
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, item in enumerate(items):
+            # Backpressure: never hold more than `workers` queries in flight
+            while len(pending) >= workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+            pending[pool.submit(func, item)] = i
+
+        for future in wait(pending).done:
+            results[pending[future]] = future.result()
+
+    return results
+
+
+# -----------------------------
+# Asyncio mode
+# -----------------------------
+async def _map_ordered_async(func, items, workers):
+    limit = asyncio.Semaphore(workers)
+
+    async def run(item):
+        try:
+            return await func(item)
+        finally:
+            limit.release()
+
+    tasks = []
+    for item in items:
+        # Backpressure: wait for a free slot before creating the next task
+        await limit.acquire()
+        tasks.append(asyncio.ensure_future(run(item)))
+
+    return await asyncio.gather(*tasks)
+
+
+# One event loop thread owns every async client, so clients (and their
+# pools) outlive a single run_jobs call
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+_ASYNC_CLIENTS = {}
+
+
+def _loop():
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="bds-async", daemon=True).start()
+            atexit.register(close_async_clients)
+        return _LOOP
+
+
+def run_on_loop(coro):
+    """
+    Run a coroutine on the shared client loop and wait for its result.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _loop()).result()
+
+
+def async_db(uri, name):
+    """
+    Database handle from an async driver, one pooled client per URI.
+    Must be called on the shared loop (run_on_loop).
+    """
+    if uri not in _ASYNC_CLIENTS:
+        try:
+            from pymongo import AsyncMongoClient
+        except ImportError:
+            from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+
+        _ASYNC_CLIENTS[uri] = AsyncMongoClient(uri, maxPoolSize=max(WORKERS, 1))
+    return _ASYNC_CLIENTS[uri][name]
+
+
+def close_async_clients():
+    if _LOOP is None or not _ASYNC_CLIENTS:
+        return
+
+    async def close():
+        for client in _ASYNC_CLIENTS.values():
+            await maybe_await(client.close())
+        _ASYNC_CLIENTS.clear()
+
+    asyncio.run_coroutine_threadsafe(close(), _LOOP).result(timeout=10)
+
+
+def client_uri(client):
+    """
+    Connection string a synchronous client was opened with, so the
+    async client talks to the same server.
+    """
+    from bds_query import _CLIENTS
+
+    for uri, known in _CLIENTS.items():
+        if known is client:
+            return uri
+
+    host = getattr(client, "_init_kwargs", {}).get("host")
+    if isinstance(host, str) and host.startswith(("mongodb://", "mongodb+srv://")):
+        return host
+    raise ValueError(
+        "Cannot tell which server this client uses; open it from a "
+        "connection string or use BDS_EXECUTOR=thread"
+    )
+
+
+async def maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+# -----------------------------
+# Query jobs
+# -----------------------------
+def run_jobs(db, jobs, workers=None, mode=None):
+    """
+    Run (collection, kind, payload) jobs, kind being "aggregate"
+    (payload = pipeline, returns the documents) or "count"
+    (payload = filter, returns the count). Results follow job order.
+    """
+    workers = workers or WORKERS
+    mode = mode or MODE
+
+    if workers <= 1 or mode == "thread":
+        def run(job):
+            collection, kind, payload = job
+            if kind == "count":
+                return db[collection].count_documents(payload)
+            return list(db[collection].aggregate(payload))
+
+        return map_ordered(run, jobs, workers)
+
+    if mode == "async":
+        uri = client_uri(db.client)
+
+        async def main():
+            adb = async_db(uri, db.name)
+
+            async def run(job):
+                collection, kind, payload = job
+                if kind == "count":
+                    return await adb[collection].count_documents(payload)
+                cursor = await maybe_await(adb[collection].aggregate(payload))
+                return await cursor.to_list(None)
+
+            return await _map_ordered_async(run, jobs, workers)
+
+        return run_on_loop(main())
+
+    raise ValueError(f"Unknown BDS_EXECUTOR: {mode}")
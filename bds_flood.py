@@ -0,0 +1,216 @@
+"""
+Flood-Risk Engine: Unioned Water Buffers and One Bulk Spatial Join
+
+BDS3 ran two $geoIntersects queries per water body and counted a
+building once per water body it touched, so overlapping lakes and
+canals counted the same building several times; BUFFER_KM was never
+applied. Here:
+
+1. Every water geometry is projected to metres (local equirectangular
+   around the city centre, < 0.1% scale error over the bbox), buffered
+   by BUFFER_KM and unioned ONCE into a single flood zone
+2. The zone's polygons go into an STRtree and are prepared
+3. Buildings and roads are streamed in chunks and joined against the
+   tree in bulk (STRtree.query with predicate="intersects"); chunks are
+   submitted to a process pool (BDS_FLOOD_WORKERS) as they are read,
+   with at most 2 x workers chunks in flight
+4. Each feature is flagged at most once, however many water bodies
+   are nearby
+
+    FRI = 0.7 × flagged buildings + 0.3 × flagged roads
+
+Needs shapely >= 2.
+
+Usage:
+
+    python bds_flood.py              # print the FRI
+    python bds_flood.py --write      # also store near_water on every feature
+"""
+
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+from pymongo import UpdateMany
+
+from bds_query import EARTH_RADIUS_KM, bump_version
+
+BUFFER_KM = 1.5
+CENTER = (76.9558, 11.0168)
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+
+CHUNK_SIZE = 20000
+WORKERS = int(os.environ.get("BDS_FLOOD_WORKERS", os.cpu_count() or 1))
+
+WEIGHTS = {"buildings": 0.7, "roads": 0.3}
+
+
+# -----------------------------
+# Metric projection
+# -----------------------------
+def _to_metres(coords):
+    lon0, lat0 = np.radians(CENTER)
+    lon, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    return np.column_stack([
+        (lon - lon0) * np.cos(lat0) * EARTH_RADIUS_M,
+        (lat - lat0) * EARTH_RADIUS_M,
+    ])
+
+
+def _to_degrees(coords):
+    lon0, lat0 = np.radians(CENTER)
+    lon = lon0 + coords[:, 0] / (np.cos(lat0) * EARTH_RADIUS_M)
+    lat = lat0 + coords[:, 1] / EARTH_RADIUS_M
+    return np.degrees(np.column_stack([lon, lat]))
+
+
+def project(geometries):
+    """
+    shapely geometries in metres from GeoJSON geometries in lon/lat.
+    """
+    shapes = np.array([shapely.geometry.shape(g) for g in geometries], dtype=object)
+    return shapely.transform(shapes, _to_metres)
+
+
+# -----------------------------
+# Flood zone
+# -----------------------------
+def flood_zone(water_geometries, buffer_km=BUFFER_KM):
+    """
+    Union of all water geometries buffered by buffer_km (in metres).
+    """
+    water = shapely.make_valid(project(water_geometries))
+    return shapely.union_all(shapely.buffer(water, buffer_km * 1000))
+
+
+def zone_geojson(zone):
+    """
+    The flood zone back in lon/lat, as a GeoJSON geometry.
+    """
+    return shapely.geometry.mapping(shapely.transform(zone, _to_degrees))
+
+
+# -----------------------------
+# Bulk join (one process per chunk)
+# -----------------------------
+_TREE = None
+
+
+def _init_worker(zone_wkb):
+    global _TREE
+    parts = shapely.get_parts(shapely.from_wkb(zone_wkb))
+    shapely.prepare(parts)
+    _TREE = shapely.STRtree(parts)
+
+
+def _flag_chunk(geometries):
+    features = project(geometries)
+    hits = _TREE.query(features, predicate="intersects")
+    return np.unique(hits[0]).tolist()
+
+
+def _chunks(cursor, size):
+    docs = []
+    for doc in cursor:
+        if not doc.get("geometry"):
+            continue
+        docs.append(doc)
+        if len(docs) >= size:
+            yield docs
+            docs = []
+    if docs:
+        yield docs
+
+
+def near_water(db, zone, collections=("buildings", "roads"),
+               chunk_size=CHUNK_SIZE, workers=None, keep=()):
+    """
+    {collection: [_id of every feature intersecting the zone]}; for the
+    collections in keep, the flagged documents (_id, geometry, centroid)
+    instead of their _id.
+    """
+    workers = workers or WORKERS
+    zone_wkb = shapely.to_wkb(zone)
+    flags = {}
+
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(zone_wkb,))
+    else:
+        _init_worker(zone_wkb)
+        pool = None
+
+    try:
+        for collection in collections:
+            whole = collection in keep
+            fields = {"geometry": 1, "centroid": 1} if whole else {"geometry": 1}
+            found = flags[collection] = []
+            in_flight = deque()
+
+            for docs in _chunks(db[collection].find({}, fields), chunk_size):
+                geometries = [d["geometry"] for d in docs]
+                if pool is None:
+                    _collect(found, docs, _flag_chunk(geometries), whole)
+                    continue
+
+                # Backpressure: read on only while at most 2 x workers
+                # chunks are waiting, so memory stays bounded
+                if len(in_flight) >= 2 * workers:
+                    done_docs, future = in_flight.popleft()
+                    _collect(found, done_docs, future.result(), whole)
+                in_flight.append((docs, pool.submit(_flag_chunk, geometries)))
+
+            while in_flight:
+                done_docs, future = in_flight.popleft()
+                _collect(found, done_docs, future.result(), whole)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return flags
+
+
+def _collect(found, docs, hits, whole):
+    found.extend(docs[i] if whole else docs[i]["_id"] for i in hits)
+
+
+def flood_risk(db, buffer_km=BUFFER_KM, workers=None, keep=()):
+    """
+    (zone, flags, FRI) for the whole city; see near_water for keep.
+    """
+    water = [w["geometry"] for w in db.water.find({}, {"geometry": 1}) if w.get("geometry")]
+    zone = flood_zone(water, buffer_km)
+    flags = near_water(db, zone, tuple(WEIGHTS), workers=workers, keep=keep)
+    fri = round(sum(WEIGHTS[c] * len(flags[c]) for c in WEIGHTS), 2)
+    return zone, flags, fri
+
+
+def write_flags(db, flags, batch_size=CHUNK_SIZE):
+    """
+    Store near_water true/false on every feature of the flagged layers.
+    """
+    for collection, ids in flags.items():
+        db[collection].update_many({}, {"$set": {"near_water": False}})
+        requests = [
+            UpdateMany({"_id": {"$in": ids[i:i + batch_size]}}, {"$set": {"near_water": True}})
+            for i in range(0, len(ids), batch_size)
+        ]
+        if requests:
+            db[collection].bulk_write(requests, ordered=False)
+        bump_version(db, collection)
+
+
+if __name__ == "__main__":
+    from bds_query import get_db
+
+    db = get_db()
+    zone, flags, fri = flood_risk(db)
+
+    for collection, ids in flags.items():
+        print(f"{collection} within {BUFFER_KM} km of water: {len(ids)}")
+    print(f"Flood Risk Index (FRI): {fri}")
+
+    if "--write" in sys.argv[1:]:
+        write_flags(db, flags)
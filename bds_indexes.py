@@ -0,0 +1,223 @@
+"""
+Index Management for the Spatial Collections
+
+BDS4, BDS5, BDS9, BDS11 and BDS14 filter pois_area on properties.fclass
+(hospital, fire_station, mall, bank, ...) together with $geoWithin.
+With only a geometry index the server scans every POI in the circle and
+filters on fclass afterwards; the compound index
+
+    {properties.fclass: 1, geometry: "2dsphere"}
+
+lets it seek straight to the requested categories.
+
+This module:
+- declares the indexes every layer should have (INDEXES)
+- creates any that are missing (ensure_indexes)
+- runs explain() on every aggregation branch the default engine sends
+  for the analyses (bds_query.circle_branch, with the fclass $in pushed
+  into $match when a layer is only counted by category) and reports
+  the winning index, keys examined vs. documents examined vs. returned
+
+Usage:
+
+    python bds_indexes.py ensure
+    python bds_indexes.py explain
+"""
+
+import sys
+
+from pymongo import ASCENDING, GEOSPHERE
+
+from bds_query import circle_branch, fclass_filter, spec_collections
+
+# -----------------------------
+# Declared indexes per layer
+# -----------------------------
+# centroid indexes serve BDS_GEO_FIELD=centroid (see bds_enrich.py),
+# geohash indexes the cell ids stamped by bds_cells.py
+INDEXES = {
+    "buildings": [
+        ("geometry_2dsphere", [("geometry", GEOSPHERE)]),
+        ("centroid_2dsphere", [("centroid", GEOSPHERE)]),
+        ("geohash", [("geohash", ASCENDING)]),
+    ],
+    "roads": [
+        ("geometry_2dsphere", [("geometry", GEOSPHERE)]),
+        ("centroid_2dsphere", [("centroid", GEOSPHERE)]),
+        ("geohash", [("geohash", ASCENDING)]),
+    ],
+    "water": [
+        ("geometry_2dsphere", [("geometry", GEOSPHERE)]),
+        ("centroid_2dsphere", [("centroid", GEOSPHERE)]),
+        ("geohash", [("geohash", ASCENDING)]),
+    ],
+    "road_intersections": [
+        ("geometry_2dsphere", [("geometry", GEOSPHERE)]),
+        ("centroid_2dsphere", [("centroid", GEOSPHERE)]),
+        ("geohash", [("geohash", ASCENDING)]),
+    ],
+    "pois_area": [
+        ("geometry_2dsphere", [("geometry", GEOSPHERE)]),
+        ("fclass_geometry", [("properties.fclass", ASCENDING), ("geometry", GEOSPHERE)]),
+        ("centroid_2dsphere", [("centroid", GEOSPHERE)]),
+        ("fclass_centroid", [("properties.fclass", ASCENDING), ("centroid", GEOSPHERE)]),
+        ("geohash", [("geohash", ASCENDING)]),
+    ],
+}
+
+
+def ensure_indexes(db, collections=None):
+    """
+    Create declared indexes that do not exist yet; returns their names.
+    """
+    created = []
+
+    for collection in collections or INDEXES:
+        existing = {
+            tuple(info["key"]) for info in db[collection].index_information().values()
+        }
+        for name, keys in INDEXES.get(collection, []):
+            if tuple(keys) in existing:
+                continue
+            db[collection].create_index(keys, name=name)
+            created.append(f"{collection}.{name}")
+
+    return created
+
+
+# -----------------------------
+# explain() verification
+# -----------------------------
+def analysis_queries(point=None):
+    """
+    (label, collection, pipeline) for every distinct aggregation branch
+    the default engine sends for the indices (see bds_query.tally_points).
+    """
+    import bds_indices
+
+    point = point or [76.95, 11.02]
+    seen = set()
+    queries = []
+
+    for index in bds_indices.INDICES.values():
+        spec = index.spec()
+        filters = fclass_filter(spec)
+        for collection in spec_collections(spec):
+            fclasses = filters.get(collection)
+            key = (collection, tuple(fclasses or ()), index.radius_km)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            label = f"{index.script} {collection}"
+            if fclasses:
+                label += f" [{','.join(fclasses)}]"
+            queries.append((
+                f"{label} @ {index.radius_km} km",
+                collection,
+                circle_branch(point, index.radius_rad, 0, collection, fclasses),
+            ))
+
+    return queries
+
+
+def index_names(plan):
+    """
+    Index names used by the winning plan(s) of an explain() output.
+    """
+    if isinstance(plan, dict):
+        if "indexName" in plan:
+            yield plan["indexName"]
+        for key, value in plan.items():
+            if key not in ("rejectedPlans", "allPlansExecution"):
+                yield from index_names(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from index_names(value)
+
+
+def plan_total(plan, key):
+    """
+    Sum of key over the winning plan(s) of an explain() output.
+    """
+    if isinstance(plan, dict):
+        return (plan.get(key) or 0) + sum(
+            plan_total(value, key)
+            for name, value in plan.items()
+            if name not in ("rejectedPlans", "allPlansExecution")
+        )
+    if isinstance(plan, list):
+        return sum(plan_total(value, key) for value in plan)
+    return 0
+
+
+def execution_stats(plan):
+    """
+    The first executionStats section of an explain() output ({} if none).
+    """
+    if isinstance(plan, dict):
+        if isinstance(plan.get("executionStats"), dict):
+            return plan["executionStats"]
+        values = plan.values()
+    elif isinstance(plan, list):
+        values = plan
+    else:
+        return {}
+
+    for value in values:
+        found = execution_stats(value)
+        if found:
+            return found
+    return {}
+
+
+def explain_query(db, collection, pipeline):
+    explained = db.command({
+        "explain": {"aggregate": collection, "pipeline": pipeline, "cursor": {}},
+        "verbosity": "executionStats",
+    })
+    stats = execution_stats(explained)
+    indexes = sorted(set(index_names(explained)))
+
+    return {
+        "index": ",".join(indexes) or "COLLSCAN",
+        "keys_examined": plan_total(explained, "totalKeysExamined"),
+        "docs_examined": plan_total(explained, "totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "millis": stats.get("executionTimeMillis"),
+    }
+
+
+def explain_report(db, point=None):
+    rows = []
+    for label, collection, pipeline in analysis_queries(point):
+        rows.append({"query": label, "collection": collection,
+                     **explain_query(db, collection, pipeline)})
+    return rows
+
+
+def print_report(rows):
+    print(f"{'query':40} {'index':22} {'keys':>9} {'docs':>9} {'returned':>9} {'ms':>6}")
+    for r in rows:
+        print(
+            f"{r['query']:40} {r['index']:22} {r['keys_examined']!s:>9} "
+            f"{r['docs_examined']!s:>9} {r['returned']!s:>9} {r['millis']!s:>6}"
+        )
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("ensure", "explain"):
+        sys.exit("usage: python bds_indexes.py ensure|explain")
+
+    from bds_query import get_db
+
+    db = get_db()
+
+    if sys.argv[1] == "ensure":
+        created = ensure_indexes(db)
+        print("Created: " + (", ".join(created) if created else "nothing, all indexes present"))
+    else:
+        print_report(explain_report(db))
@@ -0,0 +1,170 @@
+"""
+Index Definitions for BDS1-BDS15
+
+Every grid index in the BDS scripts is a weighted sum of neighbourhood
+counts around a grid point. This module records each one as data:
+
+- the radius of its search circle
+- the counts it needs (buildings, roads, hospitals, ...)
+- the weight of each count
+- whether the best area is the highest or the lowest score
+
+so that the same counts (e.g. from the shared cube in bds_cube.py) can
+be turned into every index without extra queries.
+
+The weights are copied from the scripts' docstrings; the scripts keep
+their own inline formulas.
+"""
+
+from bds_query import EARTH_RADIUS_KM, count_grid, select
+
+# -----------------------------
+# Count terms
+# -----------------------------
+COMMERCIAL_FCLASSES = [
+    "mall",
+    "supermarket",
+    "bank",
+    "shop",
+    "commercial",
+    "office"
+]
+
+TERMS = {
+    "buildings": ("buildings", None),
+    "roads": ("roads", None),
+    "pois": ("pois_area", None),
+    "water": ("water", None),
+    "hospitals": ("pois_area", ["hospital"]),
+    "commercial_pois": ("pois_area", COMMERCIAL_FCLASSES),
+    "emergency_services": ("pois_area", ["hospital", "fire_station"]),
+    # Road nodes of degree >= 3, see bds_topology.py
+    "intersections": ("road_intersections", None),
+}
+
+
+# -----------------------------
+# Index definition
+# -----------------------------
+class Index:
+
+    def __init__(self, name, script, title, radius_km, weights,
+                 highest=True, parts=None):
+        self.name = name
+        self.script = script
+        self.title = title
+        self.radius_km = radius_km
+        self.weights = weights
+        self.highest = highest
+        # Composite indices: {part_name: (coefficient, part_weights)}
+        self.parts = parts or {}
+
+    @property
+    def radius_rad(self):
+        return self.radius_km / EARTH_RADIUS_KM
+
+    def linear_weights(self):
+        """
+        Weights over count terms, with composite parts expanded.
+        """
+        if not self.parts:
+            return dict(self.weights)
+
+        combined = {}
+        for coefficient, part_weights in self.parts.values():
+            for term, w in part_weights.items():
+                combined[term] = combined.get(term, 0) + coefficient * w
+        return combined
+
+    def terms(self):
+        return list(self.linear_weights())
+
+    def spec(self):
+        return {t: TERMS[t] for t in self.terms()}
+
+    def evaluate(self, point, counts):
+        row = {"center": point, **counts}
+
+        if self.parts:
+            score = 0
+            for part, (coefficient, part_weights) in self.parts.items():
+                value = sum(w * counts[t] for t, w in part_weights.items())
+                row[part] = round(value, 2)
+                score += coefficient * value
+        else:
+            score = sum(w * counts[t] for t, w in self.weights.items())
+
+        row[self.name] = round(score, 2)
+        return row
+
+    def rank(self, rows):
+        return sorted(rows, key=lambda r: r[self.name], reverse=self.highest)
+
+
+# -----------------------------
+# Registry (one entry per script)
+# -----------------------------
+DVI_BDS10 = {"water": 1.5, "buildings": 0.8}
+HAI_BDS9 = {"hospitals": 1.2, "roads": 0.3, "buildings": -0.5}
+
+INDICES = {
+    index.name: index
+    for index in [
+        Index("UDI", "BDS1", "Urban Density Index", 2,
+              {"buildings": 0.5, "pois": 0.3, "roads": 0.2}),
+        Index("RAS", "BDS2", "Road Accessibility Score", 1.5,
+              {"roads": 1, "intersections": 2}),
+        Index("ESCI", "BDS4", "Emergency Service Coverage Index", 3,
+              {"hospitals": 0.6, "roads": 0.4}),
+        Index("CHS", "BDS5", "Commercial Hotspot Score", 2,
+              {"commercial_pois": 0.6, "roads": 0.25, "buildings": 0.15}),
+        Index("PUCI", "BDS6", "Public Utility Coverage Index", 3,
+              {"water": 0.5, "roads": 0.3, "buildings": 0.2}),
+        Index("ESI", "BDS7", "Environmental Sensitivity Index", 3,
+              {"water": 0.6, "buildings": -0.3, "roads": -0.1}),
+        Index("DVI", "BDS8", "Disaster Vulnerability Index", 3,
+              {"buildings": 0.5, "water": 0.4, "roads": -0.2}),
+        Index("HAI", "BDS9", "Healthcare Accessibility Index (lowest access)", 4,
+              HAI_BDS9, highest=False),
+        Index("CHPS", "BDS10", "Composite Hospital Priority Score", 4,
+              {}, parts={"DVI": (1.5, DVI_BDS10), "HAI": (-1.2, HAI_BDS9)}),
+        Index("ECGS", "BDS11", "Emergency Coverage Gap Score", 3,
+              {"buildings": 1.3, "emergency_services": -1.5, "roads": -0.4}),
+        Index("SCIPI", "BDS12", "Smart City Infrastructure Priority Index", 2,
+              {"buildings": 0.6, "pois": 0.8, "roads": 0.4}),
+        Index("TCRI", "BDS13", "Traffic Congestion Risk Index", 2,
+              {"roads": 0.7, "pois": 0.5, "buildings": 0.3}),
+        Index("HAI14", "BDS14", "Healthcare Accessibility Index", 3,
+              {"hospitals": 1.5, "roads": 0.5, "buildings": -0.2}),
+        Index("DREI", "BDS15", "Disaster Risk Exposure Index", 3,
+              {"buildings": 1.8, "water": 1.2, "roads": -0.6}),
+    ]
+}
+
+
+# -----------------------------
+# Evaluation
+# -----------------------------
+def compute(db, index, points, engine=None):
+    """
+    Rows for one index, counting through bds_query.
+    """
+    counts = count_grid(db, points, index.radius_rad, index.spec(), engine)
+    return [index.evaluate(p, c) for p, c in zip(points, counts)]
+
+
+def derive_all(cube, points, names=None):
+    """
+    Rows for every requested index, read from a filled cube.
+    """
+    results = {}
+
+    for name in names or INDICES:
+        index = INDICES[name]
+        rows = []
+        for point in points:
+            counts = select(cube.tally(point, index.radius_km), index.spec())
+            rows.append(index.evaluate(point, counts))
+        results[name] = rows
+
+    return results
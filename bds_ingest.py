@@ -0,0 +1,344 @@
+"""
+Bulk OSM Ingestion into bigdata_spatial
+
+Loads OSM-derived layers (e.g. the Geofabrik gis_osm_*_free_1 exports)
+into the collections the BDS scripts query:
+
+    gis_osm_buildings_a_free_1  -> buildings
+    gis_osm_roads_free_1        -> roads
+    gis_osm_pois_a_free_1       -> pois_area
+    gis_osm_water_a_free_1      -> water
+
+Pipeline:
+1. Stream features in chunks (memory stays bounded by the chunk size):
+   - GeoJSON FeatureCollection (parsed incrementally, never fully loaded)
+   - GeoJSON sequence / newline-delimited GeoJSON (.geojsonl, .geojsons)
+   - Shapefile (needs fiona)
+2. Validate and fix geometries so the 2dsphere index accepts them:
+   non-finite or out-of-range coordinates are rejected, repeated
+   vertices dropped, rings closed, degenerate parts removed, and
+   self-intersections repaired with shapely.make_valid when available
+3. Create the indexes (bds_indexes.py) before the first insert, so a
+   geometry the 2dsphere index cannot take is rejected on its own
+   instead of failing an index build after the load
+4. insert_many(ordered=False) per chunk; rejected documents are counted,
+   not fatal
+
+With --drop, every target collection is dropped once, before the first
+file is loaded, so several files can fill the same collection.
+
+Usage:
+
+    python bds_ingest.py gis_osm_buildings_a_free_1.geojson --drop
+    python bds_ingest.py roads.geojsonl --collection roads --chunk 10000
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import time
+
+from pymongo.errors import BulkWriteError
+
+from bds_indexes import ensure_indexes
+from bds_query import bump_version
+
+CHUNK_SIZE = 5000
+REPORT_EVERY_S = 5
+
+COLLECTION_HINTS = [
+    ("building", "buildings"),
+    ("road", "roads"),
+    ("pois", "pois_area"),
+    ("water", "water"),
+]
+
+
+# -----------------------------
+# Readers
+# -----------------------------
+def iter_geojson_seq(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip().lstrip("\x1e")
+            if line:
+                yield json.loads(line)
+
+
+def iter_feature_collection(path, block_size=1 << 20):
+    """
+    Features of a FeatureCollection, decoded one at a time from
+    fixed-size blocks of the file.
+    """
+    decoder = json.JSONDecoder()
+    skip = re.compile(r"[\s,]*")
+
+    with open(path) as f:
+        # Read until the array after "features" has opened; the key and
+        # its "[" may arrive in different blocks
+        buffer = ""
+        start = -1
+        while start < 0:
+            key = buffer.find('"features"')
+            if key >= 0:
+                start = buffer.find("[", key)
+                if start >= 0:
+                    break
+            block = f.read(block_size)
+            if not block:
+                return
+            buffer += block
+
+        pos = start + 1
+
+        while True:
+            pos = skip.match(buffer, pos).end()
+
+            if buffer.startswith("]", pos):
+                return
+
+            try:
+                feature, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                block = f.read(block_size)
+                if not block:
+                    raise
+                buffer = buffer[pos:] + block
+                pos = 0
+                continue
+
+            yield feature
+
+
+def iter_shapefile(path):
+    import fiona
+
+    with fiona.open(path) as source:
+        for record in source:
+            geometry = record["geometry"]
+            yield {
+                "type": "Feature",
+                "properties": dict(record["properties"]),
+                "geometry": dict(getattr(geometry, "__geo_interface__", geometry)),
+            }
+
+
+def iter_features(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".shp":
+        return iter_shapefile(path)
+    if ext in (".geojsonl", ".geojsons", ".ndjson", ".jsonl"):
+        return iter_geojson_seq(path)
+    return iter_feature_collection(path)
+
+
+# -----------------------------
+# Geometry validation / repair
+# -----------------------------
+def _clean_line(coords):
+    cleaned = []
+    for point in coords:
+        lon, lat = float(point[0]), float(point[1])
+        if not (math.isfinite(lon) and math.isfinite(lat)):
+            return None
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            return None
+        if not cleaned or cleaned[-1] != [lon, lat]:
+            cleaned.append([lon, lat])
+    return cleaned
+
+
+def _clean_ring(coords):
+    ring = _clean_line(coords)
+    if ring is None:
+        return None
+    if ring[0] != ring[-1]:
+        ring.append(ring[0])
+    return ring if len(ring) >= 4 else None
+
+
+def _clean_polygon(rings):
+    cleaned = [_clean_ring(r) for r in rings]
+    if not cleaned or cleaned[0] is None:
+        return None
+    return [r for r in cleaned if r is not None]
+
+
+def _make_valid(geometry):
+    try:
+        from shapely.geometry import mapping, shape
+        from shapely.ops import unary_union
+        from shapely.validation import make_valid
+    except ImportError:
+        return geometry
+
+    shp = shape(geometry)
+    if shp.is_valid:
+        return geometry
+
+    fixed = make_valid(shp)
+    if fixed.geom_type == "GeometryCollection":
+        # Keep every polygonal part (as one (Multi)Polygon), drop the
+        # lines and points the repair split off
+        polygons = [g for g in fixed.geoms if g.geom_type in ("Polygon", "MultiPolygon")]
+        if not polygons:
+            return None
+        fixed = unary_union(polygons)
+
+    # A collapsed polygon repairs into lines or points: not an area
+    if fixed.is_empty or fixed.geom_type not in ("Polygon", "MultiPolygon"):
+        return None
+    return json.loads(json.dumps(mapping(fixed)))
+
+
+def fix_geometry(geometry):
+    """
+    A 2dsphere-safe copy of geometry, or None if it cannot be repaired.
+    """
+    if not geometry or "type" not in geometry:
+        return None
+
+    kind = geometry["type"]
+    coords = geometry.get("coordinates")
+
+    if kind == "Point":
+        cleaned = _clean_line([coords])
+        return {"type": kind, "coordinates": cleaned[0]} if cleaned else None
+
+    if kind == "MultiPoint":
+        cleaned = _clean_line(coords)
+        return {"type": kind, "coordinates": cleaned} if cleaned else None
+
+    if kind == "LineString":
+        cleaned = _clean_line(coords)
+        return {"type": kind, "coordinates": cleaned} if cleaned and len(cleaned) >= 2 else None
+
+    if kind == "MultiLineString":
+        lines = [_clean_line(line) for line in coords]
+        lines = [line for line in lines if line and len(line) >= 2]
+        return {"type": kind, "coordinates": lines} if lines else None
+
+    if kind == "Polygon":
+        cleaned = _clean_polygon(coords)
+        if cleaned is None:
+            return None
+        return _make_valid({"type": kind, "coordinates": cleaned})
+
+    if kind == "MultiPolygon":
+        polygons = [_clean_polygon(p) for p in coords]
+        polygons = [p for p in polygons if p is not None]
+        if not polygons:
+            return None
+        return _make_valid({"type": kind, "coordinates": polygons})
+
+    return None
+
+
+# -----------------------------
+# Loader
+# -----------------------------
+def guess_collection(path):
+    name = os.path.basename(path).lower()
+    for hint, collection in COLLECTION_HINTS:
+        if hint in name:
+            return collection
+    raise ValueError(f"Cannot infer the collection for {path}; pass --collection")
+
+
+def chunks(features, size):
+    chunk = []
+    for feature in features:
+        chunk.append(feature)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ingest(db, path, collection_name=None, drop=False, chunk_size=CHUNK_SIZE):
+    collection = db[collection_name or guess_collection(path)]
+    if drop:
+        collection.drop()
+
+    stats = {"read": 0, "inserted": 0, "invalid": 0, "rejected": 0}
+    started = last_report = time.perf_counter()
+
+    ensure_indexes(db, [collection.name])
+    stats["index_seconds"] = round(time.perf_counter() - started, 2)
+
+    for chunk in chunks(iter_features(path), chunk_size):
+        documents = []
+        for feature in chunk:
+            stats["read"] += 1
+            geometry = fix_geometry(feature.get("geometry"))
+            if geometry is None:
+                stats["invalid"] += 1
+                continue
+            documents.append({
+                "type": "Feature",
+                "properties": feature.get("properties") or {},
+                "geometry": geometry,
+            })
+
+        if documents:
+            try:
+                result = collection.insert_many(documents, ordered=False)
+                stats["inserted"] += len(result.inserted_ids)
+            except BulkWriteError as exc:
+                details = exc.details
+                stats["inserted"] += details.get("nInserted", 0)
+                stats["rejected"] += len(details.get("writeErrors", []))
+
+        now = time.perf_counter()
+        if now - last_report >= REPORT_EVERY_S:
+            rate = stats["read"] / (now - started)
+            print(f"{collection.name}: {stats['read']} read, "
+                  f"{stats['inserted']} inserted ({rate:,.0f} rows/s)")
+            last_report = now
+
+    bump_version(db, collection.name)
+    elapsed = time.perf_counter() - started
+
+    stats["seconds"] = round(elapsed, 2)
+    stats["rows_per_s"] = round(stats["read"] / elapsed, 1) if elapsed else None
+    return collection.name, stats
+
+
+def ingest_all(db, paths, collection_name=None, drop=False, chunk_size=CHUNK_SIZE):
+    """
+    (collection, path, stats) per file; with drop, each target
+    collection is dropped once before any file is loaded.
+    """
+    targets = [(path, collection_name or guess_collection(path)) for path in paths]
+    if drop:
+        for name in dict.fromkeys(name for _, name in targets):
+            db[name].drop()
+
+    results = []
+    for path, name in targets:
+        name, stats = ingest(db, path, name, chunk_size=chunk_size)
+        results.append((name, path, stats))
+    return results
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load OSM layers into bigdata_spatial")
+    parser.add_argument("paths", nargs="+", help="GeoJSON, GeoJSON sequence or shapefile")
+    parser.add_argument("--collection", help="target collection (default: inferred from file name)")
+    parser.add_argument("--drop", action="store_true", help="drop the collection before loading")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="documents per insert_many")
+    args = parser.parse_args()
+
+    from bds_query import get_db
+
+    db = get_db()
+    for name, path, stats in ingest_all(db, args.paths, args.collection, args.drop, args.chunk):
+        print(f"\n{name} <- {path}")
+        for key, value in stats.items():
+            print(f"  {key}: {value}")
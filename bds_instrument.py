@@ -0,0 +1,372 @@
+"""
+Per-Query Instrumentation and Explain-Plan Capture
+
+With BDS_INSTRUMENT=1, every database command issued by the process
+(any MongoClient created after bds_query is imported, which the BDS
+scripts do at the top) is recorded by a pymongo CommandListener:
+
+- latency histogram per (command, collection)
+- filter shape: the query with every value replaced by "?", so the
+  same circle query at different points groups together
+- result size (reply bytes, documents returned)
+- for the slowest queries, an explain("executionStats"): index used,
+  keys and documents examined, run against the server that answered
+  the query (its address from the event, with the credentials and TLS
+  options of BDS_MONGO_URI) unless BDS_INSTRUMENT_URI names another
+
+At exit the run writes, under BDS_INSTRUMENT_DIR:
+
+    queries.prom     Prometheus text exposition (histograms, totals)
+    report-<ts>.json per-shape summary + slowest queries with plans
+
+and prints a "slowest queries" table. When BDS_INSTRUMENT is unset no
+listener is registered and nothing is recorded.
+
+    BDS_INSTRUMENT=1 python BDS4.py
+"""
+
+import atexit
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+ENABLED = os.environ.get("BDS_INSTRUMENT") == "1"
+REPORT_DIR = os.environ.get("BDS_INSTRUMENT_DIR", ".bds_cache/instrument")
+EXPLAIN = os.environ.get("BDS_INSTRUMENT_EXPLAIN", "1") == "1"
+
+# Explains run against this server (default: the one that answered)
+EXPLAIN_URI = os.environ.get("BDS_INSTRUMENT_URI")
+
+SLOWEST = 10
+# Slowest commands kept in full (with their body, for explain)
+KEEP = 100
+
+# Histogram bucket upper bounds (seconds)
+BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+IGNORED = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "endSessions",
+    "saslStart", "saslContinue", "explain", "killCursors",
+}
+
+
+# -----------------------------
+# Filter shapes
+# -----------------------------
+def shape(value):
+    """
+    value with every leaf replaced by "?" (keys and operators kept).
+    """
+    if isinstance(value, dict):
+        return {k: shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(v, dict) for v in value):
+            return [shape(v) for v in value]
+        return "?"
+    return "?"
+
+
+def command_filter(name, command):
+    if name == "find":
+        return command.get("filter", {})
+    if name in ("count", "distinct"):
+        return command.get("query", {})
+    if name == "aggregate":
+        return command.get("pipeline", [])
+    return None
+
+
+def _returned(reply):
+    cursor = reply.get("cursor")
+    if cursor:
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    return reply.get("n")
+
+
+# -----------------------------
+# Listener
+# -----------------------------
+class QueryListener(monitoring.CommandListener):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.records = []  # min-heap of (seconds, tiebreak, record)
+        self.counter = itertools.count()
+        self.series = {}
+        self.queries = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def started(self, event):
+        if event.command_name in IGNORED:
+            return
+
+        import bson
+
+        name = event.command_name
+        command = event.command
+        query = command_filter(name, command)
+        with self.lock:
+            self.queries += 1
+            self.bytes_out += len(bson.encode(command))
+            self.pending[(event.connection_id, event.request_id)] = {
+                "command": name,
+                "database": event.database_name,
+                # (host, port) of the server the command went to
+                "address": event.connection_id,
+                "collection": command.get(name) if isinstance(command.get(name), str) else None,
+                "shape": json.dumps(shape(query), sort_keys=True) if query is not None else None,
+                "body": dict(command) if query is not None else None,
+            }
+
+    def _finish(self, event, reply):
+        with self.lock:
+            query = self.pending.pop((event.connection_id, event.request_id), None)
+        if query is None:
+            return
+
+        import bson
+
+        seconds = event.duration_micros / 1e6
+        size = len(bson.encode(reply)) if reply is not None else 0
+        query.update(
+            seconds=seconds,
+            reply_bytes=size,
+            returned=_returned(reply) if reply is not None else None,
+            failed=reply is None,
+        )
+
+        key = (query["command"], query["collection"] or "")
+        with self.lock:
+            self.bytes_in += size
+            series = self.series.setdefault(key, {
+                "buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0,
+                "reply_bytes": 0, "failed": 0, "shapes": {},
+            })
+            series["buckets"][_bucket(seconds)] += 1
+            series["sum"] += seconds
+            series["count"] += 1
+            series["reply_bytes"] += size
+            series["failed"] += int(query["failed"])
+            if query["shape"]:
+                by_shape = series["shapes"].setdefault(query["shape"], [0, 0.0])
+                by_shape[0] += 1
+                by_shape[1] += seconds
+
+            entry = (seconds, next(self.counter), query)
+            if len(self.records) < KEEP:
+                heapq.heappush(self.records, entry)
+            elif seconds > self.records[0][0]:
+                heapq.heapreplace(self.records, entry)
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event, None)
+
+    def slowest(self, n=SLOWEST):
+        with self.lock:
+            return [r for _, _, r in heapq.nlargest(n, self.records)]
+
+
+def _bucket(seconds):
+    for i, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            return i
+    return len(BUCKETS)
+
+
+# -----------------------------
+# Explain capture
+# -----------------------------
+def server_client(address, uri=None):
+    """
+    Client connected straight to the server at address, with the
+    credentials and TLS options of uri.
+    """
+    from pymongo import uri_parser
+
+    options = {}
+    if uri:
+        parsed = uri_parser.parse_uri(uri)
+        options = {
+            k: v for k, v in parsed["options"].items()
+            if k.lower() not in ("replicaset", "directconnection", "readpreference")
+        }
+        if parsed["username"]:
+            options.update(username=parsed["username"], password=parsed["password"])
+
+    host, port = address
+    return MongoClient(host, port, directConnection=True, **options)
+
+
+def explain(client, record):
+    """
+    Index used and keys/docs examined for one recorded command.
+    """
+    from bds_indexes import index_names, plan_total
+
+    body = {
+        k: v for k, v in record["body"].items()
+        if not k.startswith("$") and k not in ("lsid", "txnNumber")
+    }
+    plan = client[record["database"]].command(
+        {"explain": body, "verbosity": "executionStats"}
+    )
+    return {
+        "index": ",".join(sorted(set(index_names(plan)))) or "COLLSCAN",
+        "keys_examined": plan_total(plan, "totalKeysExamined"),
+        "docs_examined": plan_total(plan, "totalDocsExamined"),
+    }
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def _labels(command, collection, **extra):
+    pairs = {"command": command, "collection": collection, **extra}
+    return ",".join(f'{k}="{v}"' for k, v in pairs.items())
+
+
+def prometheus_text(listener):
+    lines = [
+        "# HELP bds_query_duration_seconds Database command latency",
+        "# TYPE bds_query_duration_seconds histogram",
+    ]
+    for (command, collection), s in sorted(listener.series.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ["+Inf"], s["buckets"]):
+            cumulative += n
+            lines.append(
+                f"bds_query_duration_seconds_bucket{{{_labels(command, collection, le=bound)}}} {cumulative}"
+            )
+        lines.append(f"bds_query_duration_seconds_sum{{{_labels(command, collection)}}} {s['sum']:.6f}")
+        lines.append(f"bds_query_duration_seconds_count{{{_labels(command, collection)}}} {s['count']}")
+
+    for metric, field, help_text in [
+        ("bds_query_reply_bytes_total", "reply_bytes", "Reply size in BSON bytes"),
+        ("bds_query_failed_total", "failed", "Failed database commands"),
+    ]:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for (command, collection), s in sorted(listener.series.items()):
+            lines.append(f"{metric}{{{_labels(command, collection)}}} {s[field]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def report(listener, client_for=None, n=SLOWEST):
+    """
+    Per-series summary and the n slowest queries; client_for(record)
+    gives the client to explain each one with (None = no plans).
+    """
+    slowest = []
+    for record in listener.slowest(n):
+        row = {k: v for k, v in record.items() if k != "body"}
+        if client_for is not None and record["body"] is not None:
+            try:
+                row["plan"] = explain(client_for(record), record)
+            except Exception as exc:
+                row["plan"] = {"error": repr(exc)}
+        slowest.append(row)
+
+    return {
+        "queries": listener.queries,
+        "bytes_out": listener.bytes_out,
+        "bytes_in": listener.bytes_in,
+        "series": [
+            {
+                "command": command,
+                "collection": collection,
+                "count": s["count"],
+                "seconds": round(s["sum"], 6),
+                "reply_bytes": s["reply_bytes"],
+                "shapes": [
+                    {"shape": sh, "count": c, "seconds": round(t, 6)}
+                    for sh, (c, t) in sorted(s["shapes"].items(), key=lambda x: -x[1][1])
+                ],
+            }
+            for (command, collection), s in sorted(listener.series.items())
+        ],
+        "slowest": slowest,
+    }
+
+
+def print_slowest(rows):
+    print(f"\nSlowest queries ({len(rows)}):")
+    print(f"{'ms':>9} {'command':10} {'collection':12} {'returned':>8} {'index':22} "
+          f"{'keys':>8} {'docs':>8}")
+    for r in rows:
+        plan = r.get("plan") or {}
+        print(
+            f"{r['seconds'] * 1000:>9.1f} {r['command']:10} {r['collection']!s:12} "
+            f"{r['returned']!s:>8} {plan.get('index', '-')!s:22} "
+            f"{plan.get('keys_examined', '-')!s:>8} {plan.get('docs_examined', '-')!s:>8}"
+        )
+
+
+# -----------------------------
+# Process-wide registration
+# -----------------------------
+_LISTENER = None
+
+
+def listener():
+    return _LISTENER
+
+
+def write_reports(directory=REPORT_DIR):
+    if _LISTENER is None or not _LISTENER.queries:
+        return None
+
+    clients = {}
+
+    def client_for(record):
+        from bds_query import MONGO_URI
+
+        key = "uri" if EXPLAIN_URI else tuple(record["address"])
+        if key not in clients:
+            if EXPLAIN_URI:
+                clients[key] = MongoClient(EXPLAIN_URI)
+            else:
+                clients[key] = server_client(record["address"], MONGO_URI)
+        return clients[key]
+
+    try:
+        data = report(_LISTENER, client_for if EXPLAIN else None)
+    finally:
+        for client in clients.values():
+            client.close()
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, "queries.prom"), "w") as f:
+        f.write(prometheus_text(_LISTENER))
+
+    path = os.path.join(directory, time.strftime("report-%Y%m%dT%H%M%S.json"))
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+
+    print_slowest(data["slowest"])
+    print(f"Query report: {path}")
+    return path
+
+
+def install():
+    """
+    Register the process-wide listener (once) when BDS_INSTRUMENT=1.
+    """
+    global _LISTENER
+    if not ENABLED or _LISTENER is not None:
+        return _LISTENER
+
+    _LISTENER = QueryListener()
+    monitoring.register(_LISTENER)
+    atexit.register(write_reports)
+    return _LISTENER
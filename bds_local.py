@@ -0,0 +1,389 @@
+"""
+In-Process Spatial Index Engine
+
+Loads buildings, roads, pois_area and water from bigdata_spatial once
+and answers the same $geoWithin / $centerSphere counts locally, so grid
+loops can grow to 100k+ cells without touching the database again.
+
+Concept:
+- Every feature is stored as a flat run of vertices (coords + offsets)
+- Vertices are projected onto the unit sphere (x, y, z), where the
+  straight-line chord distance is an exact monotone proxy for the
+  great-circle angle that $centerSphere uses
+- A KD-tree over each feature's first vertex finds candidates:
+  a feature can only lie inside the circle if its first vertex does
+- A feature is inside if ALL its vertices are inside the circle,
+  which is the $geoWithin rule for lines and polygons
+
+Each feature also stores its extent (largest angle from the first
+vertex to any other vertex), so most candidates are accepted without
+looking at their vertices at all.
+
+Several radii are answered in one pass (tally_radii): the candidates
+of the largest circle are each placed in the smallest circle that
+contains them, and the per-radius counts are the running sums of that
+histogram.
+
+Use it through bds_query with BDS_ENGINE=local; the scripts and their
+scoring formulas stay unchanged.
+"""
+
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+LAYER_COLLECTIONS = ["buildings", "roads", "pois_area", "water", "road_intersections"]
+
+# Columnar snapshot directory to load layers from instead of MongoDB
+SNAPSHOT_DIR = os.environ.get("BDS_SNAPSHOT")
+
+
+# -----------------------------
+# Geometry helpers
+# -----------------------------
+def iter_vertices(geometry):
+    kind = geometry["type"]
+
+    if kind == "GeometryCollection":
+        for part in geometry["geometries"]:
+            yield from iter_vertices(part)
+        return
+
+    depth = {
+        "Point": 0,
+        "MultiPoint": 1,
+        "LineString": 1,
+        "MultiLineString": 2,
+        "Polygon": 2,
+        "MultiPolygon": 3,
+    }[kind]
+
+    stack = [(geometry["coordinates"], depth)]
+    while stack:
+        coords, level = stack.pop()
+        if level == 0:
+            yield coords[0], coords[1]
+        else:
+            stack.extend((c, level - 1) for c in reversed(coords))
+
+
+def vertex_centroid(geometry):
+    """
+    Mean lon/lat of the vertices, counting a closed ring's repeated
+    first vertex once.
+    """
+    kind = geometry["type"]
+    if kind in ("Polygon", "MultiPolygon"):
+        polygons = [geometry["coordinates"]] if kind == "Polygon" else geometry["coordinates"]
+        vertices = [
+            vertex[:2]
+            for polygon in polygons
+            for ring in polygon
+            for vertex in (ring[:-1] if len(ring) > 1 and ring[0] == ring[-1] else ring)
+        ]
+    else:
+        vertices = list(iter_vertices(geometry))
+    if not vertices:
+        return None
+    return np.mean(np.asarray(vertices, dtype=np.float64), axis=0)
+
+
+def unit_vectors(lon, lat):
+    lon = np.radians(lon)
+    lat = np.radians(lat)
+    cos_lat = np.cos(lat)
+    return np.column_stack([
+        cos_lat * np.cos(lon),
+        cos_lat * np.sin(lon),
+        np.sin(lat),
+    ])
+
+
+def chord(angle):
+    return 2.0 * np.sin(np.asarray(angle) / 2.0)
+
+
+def angle(chord_length):
+    return 2.0 * np.arcsin(np.clip(np.asarray(chord_length) / 2.0, 0.0, 1.0))
+
+
+# -----------------------------
+# Layer: flat vertex storage
+# -----------------------------
+class Layer:
+    """
+    One collection held as arrays:
+    coords (V, 2) lon/lat, offsets (N + 1) into coords,
+    fclass (N) codes into fclass_names.
+    """
+
+    def __init__(self, coords, offsets, fclass, fclass_names,
+                 centroid=None, bbox=None):
+        self.coords = coords
+        self.offsets = offsets
+        self.fclass = fclass
+        self.fclass_names = fclass_names
+        # Optional precomputed per-feature arrays (e.g. from a snapshot)
+        self.centroid = centroid
+        self.bbox = bbox
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def centroids(self):
+        """
+        Stored centroids when available, otherwise the vertex-mean
+        lon/lat per feature (the point itself for Points).
+        """
+        if self.centroid is not None:
+            return self.centroid
+
+        lengths = np.diff(self.offsets)
+        if len(lengths) == 0:
+            return np.zeros((0, 2))
+        sums = np.add.reduceat(self.coords, self.offsets[:-1], axis=0)
+        return sums / lengths[:, None]
+
+    def bboxes(self):
+        """
+        (min_lon, min_lat, max_lon, max_lat) per feature.
+        """
+        if self.bbox is not None:
+            return self.bbox
+
+        if len(self) == 0:
+            return np.zeros((0, 4))
+        starts = self.offsets[:-1]
+        return np.hstack([
+            np.minimum.reduceat(self.coords, starts, axis=0),
+            np.maximum.reduceat(self.coords, starts, axis=0),
+        ])
+
+    @classmethod
+    def from_documents(cls, documents):
+        coords = []
+        offsets = [0]
+        fclass = []
+        codes = {}
+        centroids = []
+
+        for doc in documents:
+            geometry = doc.get("geometry")
+            if not geometry:
+                continue
+
+            vertices = list(iter_vertices(geometry))
+            if not vertices:
+                continue
+
+            coords.extend(vertices)
+            offsets.append(len(coords))
+
+            name = (doc.get("properties") or {}).get("fclass")
+            fclass.append(codes.setdefault(name, len(codes)))
+
+            # Stored centroid from bds_enrich.py, else the vertex mean
+            centroid = doc.get("centroid")
+            centroids.append(
+                centroid["coordinates"][:2] if centroid else vertex_centroid(geometry)
+            )
+
+        return cls(
+            np.array(coords, dtype=np.float64).reshape(-1, 2),
+            np.array(offsets, dtype=np.int64),
+            np.array(fclass, dtype=np.int32),
+            list(codes),
+            centroid=np.array(centroids, dtype=np.float64).reshape(-1, 2),
+        )
+
+
+def load_layer(db, collection):
+    if SNAPSHOT_DIR:
+        import bds_snapshot
+
+        return bds_snapshot.open_layer(SNAPSHOT_DIR, collection)
+
+    cursor = db[collection].find(
+        {},
+        {"_id": 0, "geometry": 1, "centroid": 1, "properties.fclass": 1},
+    )
+    return Layer.from_documents(cursor)
+
+
+# -----------------------------
+# Spatial index over one layer
+# -----------------------------
+def segment_max(values, offsets):
+    return np.maximum.reduceat(values, offsets[:-1])
+
+
+class LocalIndex:
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.vertices = unit_vectors(layer.coords[:, 0], layer.coords[:, 1])
+
+        starts = layer.offsets[:-1]
+        self.anchor = self.vertices[starts]
+
+        lengths = np.diff(layer.offsets)
+        owner_anchor = np.repeat(self.anchor, lengths, axis=0)
+        spread = np.linalg.norm(self.vertices - owner_anchor, axis=1)
+        self.extent = angle(segment_max(spread, layer.offsets)) if len(layer) else np.zeros(0)
+
+        self.tree = cKDTree(self.anchor)
+
+    def farthest(self, ids, center_xyz):
+        """
+        Chord from the centre to the farthest vertex of each feature.
+        """
+        offsets = self.layer.offsets
+        starts = offsets[ids]
+        lengths = offsets[ids + 1] - starts
+        local = np.concatenate([[0], np.cumsum(lengths)])
+        vertex_ids = np.repeat(starts - local[:-1], lengths) + np.arange(local[-1])
+
+        return segment_max(
+            np.linalg.norm(self.vertices[vertex_ids] - center_xyz, axis=1),
+            local,
+        )
+
+    def inside(self, center_xyz, radius_rad):
+        """
+        Indices of features that lie entirely within the circle.
+        """
+        candidates = np.asarray(
+            self.tree.query_ball_point(center_xyz, chord(radius_rad)),
+            dtype=np.int64,
+        )
+        if len(candidates) == 0:
+            return candidates
+
+        anchor_angle = angle(
+            np.linalg.norm(self.anchor[candidates] - center_xyz, axis=1)
+        )
+        sure = anchor_angle + self.extent[candidates] <= radius_rad
+        unsure = candidates[~sure]
+        if len(unsure) == 0:
+            return candidates
+
+        far = self.farthest(unsure, center_xyz)
+        confirmed = unsure[far <= chord(radius_rad)]
+
+        return np.concatenate([candidates[sure], confirmed])
+
+    def tally(self, center_xyz, radius_rad):
+        ids = self.inside(center_xyz, radius_rad)
+        counts = np.bincount(
+            self.layer.fclass[ids],
+            minlength=len(self.layer.fclass_names),
+        )
+        return {
+            name: int(n)
+            for name, n in zip(self.layer.fclass_names, counts)
+            if n
+        }
+
+    def shells(self, center_xyz, radii_rad):
+        """
+        Per-feature shell: index of the smallest of the ascending radii
+        whose circle contains the feature (len(radii_rad) = none), for
+        the candidates within the largest radius.
+        """
+        radii_rad = np.asarray(radii_rad, dtype=np.float64)
+        candidates = np.asarray(
+            self.tree.query_ball_point(center_xyz, chord(radii_rad[-1])),
+            dtype=np.int64,
+        )
+
+        # The anchor angle and anchor + extent bound the containment
+        # angle; only features whose bounds straddle a radius are resolved
+        # vertex by vertex
+        low = angle(np.linalg.norm(self.anchor[candidates] - center_xyz, axis=1))
+        high = low + self.extent[candidates]
+        shell = np.searchsorted(radii_rad, high, side="left")
+        open_ = np.flatnonzero(np.searchsorted(radii_rad, low, side="left") != shell)
+
+        if len(open_):
+            far = self.farthest(candidates[open_], center_xyz)
+            shell[open_] = np.searchsorted(chord(radii_rad), far, side="left")
+
+        return candidates, shell
+
+    def tally_radii(self, center_xyz, radii_rad):
+        """
+        One tally per ascending radius, from a single candidate pass.
+        """
+        ids, shell = self.shells(center_xyz, radii_rad)
+        n_names = len(self.layer.fclass_names)
+
+        # (shell, fclass) histogram, accumulated over the shells
+        histogram = np.bincount(
+            shell * n_names + self.layer.fclass[ids],
+            minlength=(len(radii_rad) + 1) * n_names,
+        ).reshape(len(radii_rad) + 1, n_names)
+        cumulative = np.cumsum(histogram[:-1], axis=0)
+
+        return [
+            {name: int(n) for name, n in zip(self.layer.fclass_names, row) if n}
+            for row in cumulative
+        ]
+
+
+# -----------------------------
+# Engine used by bds_query
+# -----------------------------
+class LocalEngine:
+
+    def __init__(self, db):
+        self.db = db
+        self.indexes = {}
+
+    def index(self, collection):
+        if collection not in self.indexes:
+            self.indexes[collection] = LocalIndex(load_layer(self.db, collection))
+        return self.indexes[collection]
+
+    def tally_points(self, points, radius_rad, collections):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        centers = unit_vectors(points[:, 0], points[:, 1])
+
+        indexes = {c: self.index(c) for c in collections}
+        return [
+            {c: indexes[c].tally(center, radius_rad) for c in collections}
+            for center in centers
+        ]
+
+    def tally_points_radii(self, points, radii_rad, collections):
+        """
+        Per-radius lists of per-point tallies, radii ascending.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        centers = unit_vectors(points[:, 0], points[:, 1])
+
+        per_radius = [[{} for _ in centers] for _ in radii_rad]
+        for c in collections:
+            index = self.index(c)
+            for i, center in enumerate(centers):
+                for tallies, tally in zip(per_radius, index.tally_radii(center, radii_rad)):
+                    tallies[i][c] = tally
+        return per_radius
+
+
+_ENGINES = {}
+
+
+def engine_key(db):
+    """
+    Engines are shared per database; db may be None when every layer
+    comes from a snapshot.
+    """
+    return db.name if db is not None else None
+
+
+def engine_for(db):
+    key = engine_key(db)
+    if key not in _ENGINES:
+        _ENGINES[key] = LocalEngine(db)
+    return _ENGINES[key]
@@ -0,0 +1,156 @@
+"""
+Stage-Level Profiling Hooks
+
+The scripts spend their time in three places: MongoDB I/O, scoring and
+Folium rendering. Wrapping each part in a stage shows which one to work
+on:
+
+    from bds_profile import stage
+
+    with stage("fetch"):
+        counts_per_point = count_grid(...)
+    with stage("compute"):
+        ...
+    with stage("render"):
+        ...
+
+With BDS_PROFILE=<dir> (or bds_profile.enable(dir), e.g. from a
+--profile switch) every stage writes to <dir>:
+
+    <stage>.prof    cProfile stats (snakeviz / python -m pstats)
+    <stage>.txt     top functions by cumulative time and the top
+                    tracemalloc allocations of the stage
+    stages.json     wall and CPU seconds and peak traced memory per stage
+
+When profiling is off, stage() returns a shared no-op context manager:
+no profiler, no tracing, no timers.
+
+    BDS_PROFILE=.bds_cache/profile python BDS1.py
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+PROFILE_DIR = os.environ.get("BDS_PROFILE")
+
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+TRACE_FRAMES = 5
+
+_OFF = contextlib.nullcontext()
+
+# Stage names already written this run (repeats get a numeric suffix)
+_SEEN = {}
+_ACTIVE = []
+_RUN = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def enable(directory):
+    global PROFILE_DIR
+    PROFILE_DIR = directory
+
+
+def stage(name):
+    """
+    Context manager profiling one stage (no-op unless enabled).
+    """
+    if not PROFILE_DIR:
+        return _OFF
+    return _Stage(name, PROFILE_DIR)
+
+
+# -----------------------------
+# One profiled stage
+# -----------------------------
+class _Stage:
+
+    def __init__(self, name, directory):
+        self.directory = directory
+        count = _SEEN.get(name, 0)
+        _SEEN[name] = count + 1
+        self.name = name if count == 0 else f"{name}-{count + 1}"
+        # Peak traced memory seen before the last reset_peak (by nested stages)
+        self.peak = 0
+
+    def __enter__(self):
+        # cProfile allows one active profiler: nested stages only time
+        self.profiler = None if _ACTIVE else cProfile.Profile()
+
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        if _ACTIVE:
+            # Keep the enclosing stage's peak so far before resetting it
+            parent = _ACTIVE[-1]
+            parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        _ACTIVE.append(self)
+        self.before = tracemalloc.take_snapshot()
+
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        if self.profiler:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler:
+            self.profiler.disable()
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+
+        after = tracemalloc.take_snapshot()
+        peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        if self.started_tracing:
+            tracemalloc.stop()
+        _ACTIVE.remove(self)
+        if _ACTIVE:
+            _ACTIVE[-1].peak = max(_ACTIVE[-1].peak, peak)
+
+        os.makedirs(self.directory, exist_ok=True)
+        allocations = after.compare_to(self.before, "lineno")[:TOP_ALLOCATIONS]
+        self._write_text(allocations)
+        timing = {
+            "run": _RUN,
+            "stage": self.name,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "peak_traced_mb": round(peak / 1e6, 2),
+        }
+        _append_timing(self.directory, timing)
+
+        print(f"[profile] {self.name}: wall {wall:.2f}s, cpu {cpu:.2f}s, "
+              f"peak {peak / 1e6:.1f} MB -> {self.directory}")
+        return False
+
+    def _write_text(self, allocations):
+        out = io.StringIO()
+        if self.profiler:
+            path = os.path.join(self.directory, f"{self.name}.prof")
+            self.profiler.dump_stats(path)
+            stats = pstats.Stats(self.profiler, stream=out)
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+        out.write(f"\nTop {len(allocations)} allocations (size change by line)\n\n")
+        for diff in allocations:
+            out.write(f"{diff}\n")
+
+        with open(os.path.join(self.directory, f"{self.name}.txt"), "w") as f:
+            f.write(out.getvalue())
+
+
+def _append_timing(directory, timing):
+    path = os.path.join(directory, "stages.json")
+    stages = []
+    if os.path.exists(path):
+        with open(path) as f:
+            stages = json.load(f)
+    stages.append(timing)
+    with open(path, "w") as f:
+        json.dump(stages, f, indent=2)
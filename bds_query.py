@@ -0,0 +1,390 @@
+"""
+Shared Neighbourhood Counting for the BDS Index Scripts
+
+Every index script counts features of a few layers inside a
+$centerSphere circle around each grid point. Issuing one
+count_documents call per layer per point costs one Atlas round trip
+each, so the 9-point grid with three layers is 27 round trips.
+
+count_grid() answers the same counts for a whole batch of points in a
+single aggregation:
+- every (point, collection) pair becomes one $unionWith branch
+- each branch matches the circle and groups by properties.fclass; when
+  every count of a layer names its fclasses, the branch also matches
+  properties.fclass $in those values, so the compound
+  {properties.fclass, geometry} index can serve it
+- per-category counts (hospital, mall, ...) are summed client-side
+
+So a script that needs buildings, roads and hospitals around nine
+points pays one round trip instead of 27.
+
+Counts are requested with a spec that maps a result name to the
+collection and the fclass values to keep (None keeps everything):
+
+    COUNTS = {
+        "hospitals": ("pois_area", ["hospital"]),
+        "roads": ("roads", None),
+    }
+
+Engines (BDS_ENGINE environment variable):
+- aggregate : batched $unionWith aggregation (default)
+- count     : one count_documents per layer per point (original behaviour)
+- local     : in-memory spatial index, see bds_local.py
+- numpy     : chunked haversine over centroid arrays, see bds_vector.py
+- raster    : summed-area-table raster over the city bbox, see bds_raster.py
+- cube      : materialized count cube shared by all scripts, see bds_cube.py
+- cells     : one $group per layer over stored geohash cells, see bds_cells.py
+
+Queries of the aggregate and count engines are sent concurrently when
+BDS_WORKERS > 1 (bds_executor.py) and their results are kept in a
+shared on-disk cache when BDS_CACHE=1 (bds_cache.py).
+
+get_db() connects to the cluster named by BDS_MONGO_URI, which must be
+set; the connection string is never stored in the code.
+
+BDS_GEO_FIELD=centroid tests the precomputed centroid point written by
+bds_enrich.py instead of the full geometry.
+
+BDS_INSTRUMENT=1 records every database command of the run
+(bds_instrument.py).
+
+A radius of 0 means "geometries touching the point itself"
+($geoIntersects).
+
+tally_grid_radii() answers several radii together; the local and numpy
+engines do it in one distance pass per centre.
+"""
+
+import hashlib
+import json
+import os
+
+from pymongo import MongoClient
+
+import bds_cache
+import bds_executor
+import bds_instrument
+
+EARTH_RADIUS_KM = 6378.1
+
+# Coimbatore bounding box (BDS1 / BDS2)
+BBOX = (76.85, 10.95, 77.05, 11.10)
+
+# -----------------------------
+# MongoDB Connection
+# -----------------------------
+# Connection string comes from the environment; no credential is kept here
+MONGO_URI = os.environ.get("BDS_MONGO_URI")
+DB_NAME = "bigdata_spatial"
+
+
+# Per-query instrumentation (BDS_INSTRUMENT=1); must precede client creation
+bds_instrument.install()
+
+_CLIENTS = {}
+
+
+def get_db(uri=None):
+    """
+    Database handle on one pooled client per URI, shared by every caller.
+    """
+    uri = uri or MONGO_URI
+    if not uri:
+        raise RuntimeError(
+            "No MongoDB connection string: set BDS_MONGO_URI "
+            "(e.g. mongodb+srv://<user>:<password>@<cluster>/)"
+        )
+    if uri not in _CLIENTS:
+        _CLIENTS[uri] = MongoClient(uri)
+    return _CLIENTS[uri][DB_NAME]
+
+
+# -----------------------------
+# Engine selection
+# -----------------------------
+ENGINE = os.environ.get("BDS_ENGINE", "aggregate")
+
+# Field the circle is tested against: "geometry" or "centroid"
+GEO_FIELD = os.environ.get("BDS_GEO_FIELD", "geometry")
+
+# Upper bound on $unionWith branches sent in one aggregation
+MAX_BRANCHES = 200
+
+
+# -----------------------------
+# Query builders
+# -----------------------------
+def within(point, radius_rad):
+    if radius_rad == 0:
+        return {
+            GEO_FIELD: {
+                "$geoIntersects": {
+                    "$geometry": {
+                        "type": "Point",
+                        "coordinates": list(point)
+                    }
+                }
+            }
+        }
+
+    return {
+        GEO_FIELD: {
+            "$geoWithin": {
+                "$centerSphere": [point, radius_rad]
+            }
+        }
+    }
+
+
+def count_filter(point, radius_rad, fclasses=None):
+    query = within(point, radius_rad)
+    if fclasses is None:
+        return query
+
+    if len(fclasses) == 1:
+        fclass = fclasses[0]
+    else:
+        fclass = {"$in": list(fclasses)}
+
+    return {"properties.fclass": fclass, **query}
+
+
+def circle_branch(point, radius_rad, cell, collection, fclasses=None):
+    """
+    One $unionWith branch: fclass counts of collection inside the circle,
+    optionally restricted to fclasses (served by the fclass + geo index).
+    """
+    return [
+        {"$match": count_filter(point, radius_rad, fclasses)},
+        {"$group": {"_id": "$properties.fclass", "n": {"$sum": 1}}},
+        {"$set": {"cell": cell, "coll": collection}},
+    ]
+
+
+# -----------------------------
+# Tallies
+# -----------------------------
+def spec_collections(spec):
+    collections = []
+    for collection, _ in spec.values():
+        if collection not in collections:
+            collections.append(collection)
+    return collections
+
+
+def fclass_filter(spec):
+    """
+    {collection: fclasses} for the collections whose spec entries all
+    filter on fclass; their branches match only those fclasses.
+    """
+    filters = {}
+    for collection, fclasses in spec.values():
+        if fclasses is None:
+            filters[collection] = None
+        elif filters.get(collection, ()) is not None:
+            filters[collection] = sorted(set(filters.get(collection, ())) | set(fclasses))
+    return {c: f for c, f in filters.items() if f is not None}
+
+
+def tally_points(db, points, radius_rad, collections, fclasses=None):
+    """
+    Per-point {collection: {fclass: count}} for every collection,
+    fetched with one aggregation per batch of points. fclasses
+    ({collection: fclass list}, see fclass_filter) limits the tallies
+    of those collections to the listed fclasses.
+    """
+    fclasses = fclasses or {}
+    tallies = [
+        {collection: {} for collection in collections}
+        for _ in points
+    ]
+
+    # Enough batches to keep every worker busy, none over MAX_BRANCHES
+    per_batch = max(1, min(
+        MAX_BRANCHES // max(1, len(collections)),
+        -(-len(points) // bds_executor.WORKERS),
+    ))
+
+    jobs = []
+    for start in range(0, len(points), per_batch):
+        branches = []
+        for cell in range(start, min(start + per_batch, len(points))):
+            for collection in collections:
+                branches.append((collection, circle_branch(
+                    points[cell], radius_rad, cell, collection, fclasses.get(collection),
+                )))
+
+        first_collection, pipeline = branches[0]
+        pipeline = pipeline + [
+            {"$unionWith": {"coll": collection, "pipeline": branch}}
+            for collection, branch in branches[1:]
+        ]
+        jobs.append((first_collection, "aggregate", pipeline))
+
+    for rows in bds_executor.run_jobs(db, jobs):
+        for row in rows:
+            tallies[row["cell"]][row["coll"]][row["_id"]] = row["n"]
+
+    return tallies
+
+
+def select(tally, spec):
+    counts = {}
+    for name, (collection, fclasses) in spec.items():
+        by_fclass = tally[collection]
+        if fclasses is None:
+            counts[name] = sum(by_fclass.values())
+        else:
+            counts[name] = sum(by_fclass.get(f, 0) for f in fclasses)
+    return counts
+
+
+# -----------------------------
+# Data version stamps
+# -----------------------------
+# Per-collection write counters, bumped by every BDS write path
+VERSIONS_COLLECTION = "bds_versions"
+
+
+def bump_version(db, collection):
+    """
+    Move collection's version stamp after writing to it.
+    """
+    db[VERSIONS_COLLECTION].update_one({"_id": collection}, {"$inc": {"writes": 1}}, upsert=True)
+
+
+def collection_version(db, collection):
+    """
+    Change stamp: the write counter (ingest, enrich, cells stamp, flood
+    --write, topology, synth and the updater all bump it), plus document
+    count and newest _id for writers outside these modules.
+    """
+    counter = db[VERSIONS_COLLECTION].find_one({"_id": collection})
+    newest = db[collection].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return [
+        counter["writes"] if counter else 0,
+        db[collection].estimated_document_count(),
+        str(newest["_id"]) if newest else None,
+    ]
+
+
+def data_version(db, collections):
+    stamp = {c: collection_version(db, c) for c in sorted(collections)}
+    return hashlib.sha1(json.dumps(stamp).encode()).hexdigest()
+
+
+# -----------------------------
+# Public entry points
+# -----------------------------
+# Engines that produce per-fclass tallies (tally_grid); "count" only
+# answers named counts through count_grid
+TALLY_ENGINES = ("aggregate", "local", "numpy", "raster", "cube", "cells")
+
+
+def tally_grid(db, points, radius_rad, collections, engine=None, fclasses=None):
+    """
+    Per-point {collection: {fclass: count}}, in the same order as points.
+    fclasses (see fclass_filter) lets the aggregate engine match only the
+    fclasses a spec needs; other engines tally every fclass.
+    """
+    engine = engine or ENGINE
+
+    if engine == "aggregate":
+        cache = bds_cache.cache()
+        if cache:
+            return cache.tally_points(db, points, radius_rad, collections, tally_points, fclasses)
+        return tally_points(db, points, radius_rad, collections, fclasses)
+
+    if engine == "local":
+        import bds_local
+
+        return bds_local.engine_for(db).tally_points(points, radius_rad, collections)
+
+    if engine == "numpy":
+        import bds_vector
+
+        return bds_vector.engine_for(db).tally_points(points, radius_rad, collections)
+
+    if engine == "raster":
+        import bds_raster
+
+        return bds_raster.engine_for(db).tally_points(points, radius_rad, collections)
+
+    if engine == "cube":
+        import bds_cube
+
+        return bds_cube.cube_for(db).tally_points(points, radius_rad, collections)
+
+    if engine == "cells":
+        import bds_cells
+
+        return bds_cells.engine_for(db).tally_points(points, radius_rad, collections)
+
+    if engine == "count":
+        raise ValueError(
+            "The count engine only answers count_grid; tallies need one of "
+            + ", ".join(TALLY_ENGINES)
+        )
+    raise ValueError(f"Unknown BDS_ENGINE: {engine}")
+
+
+# Engines that read every radius off one distance pass per centre
+MULTI_RADIUS_ENGINES = ("local", "numpy")
+
+
+def tally_grid_radii(db, points, radii_rad, collections, engine=None):
+    """
+    {radius_rad: per-point tallies} for several radii at once.
+
+    The local and numpy engines sort the containment distances around
+    each centre once and read every radius off them; other engines
+    (and radius 0) fall back to one tally_grid call per radius. A
+    distance histogram is the difference of consecutive radii.
+    """
+    engine = engine or ENGINE
+    radii = sorted(set(radii_rad))
+    result = {}
+
+    if engine in MULTI_RADIUS_ENGINES:
+        positive = [r for r in radii if r > 0]
+        if positive:
+            if engine == "local":
+                import bds_local as module
+            else:
+                import bds_vector as module
+
+            per_radius = module.engine_for(db).tally_points_radii(points, positive, collections)
+            result.update(zip(positive, per_radius))
+
+    for radius_rad in radii:
+        if radius_rad not in result:
+            result[radius_rad] = tally_grid(db, points, radius_rad, collections, engine)
+    return {radius_rad: result[radius_rad] for radius_rad in radii}
+
+
+def count_grid(db, points, radius_rad, spec, engine=None):
+    """
+    Named counts for every point, in the same order as points.
+    """
+    engine = engine or ENGINE
+
+    if engine == "count":
+        jobs = [
+            (collection, "count", count_filter(point, radius_rad, fclasses))
+            for point in points
+            for collection, fclasses in spec.values()
+        ]
+        cache = bds_cache.cache()
+        if cache:
+            counts = iter(cache.run_jobs(db, jobs, bds_executor.run_jobs))
+        else:
+            counts = iter(bds_executor.run_jobs(db, jobs))
+        return [
+            {name: next(counts) for name in spec}
+            for _ in points
+        ]
+
+    tallies = tally_grid(
+        db, points, radius_rad, spec_collections(spec), engine, fclass_filter(spec)
+    )
+    return [select(tally, spec) for tally in tallies]
@@ -0,0 +1,174 @@
+"""
+Scalable Folium Rendering
+
+One folium.CircleMarker / folium.GeoJson per feature makes the HTML grow
+by a full Leaflet object per feature, and the browser stalls once a
+city-scale layer is drawn. Here:
+
+- polygons and lines go into ONE GeoJSON FeatureCollection per layer;
+  the style is picked from a feature property (e.g. kind = water/road),
+  so folium embeds each distinct style once, not once per feature
+- the collection is simplified per zoom band (tolerance = one screen
+  pixel at the band's zoom) and only the band for the current zoom is
+  on the map
+- points are drawn with FastMarkerCluster: the coordinates are a single
+  JS array and markers are created client-side, clustered when zoomed out
+- maps prefer canvas rendering over one SVG element per shape
+
+    m = make_map([11.0168, 76.9558], 12)
+    add_geojson_layer(m, "Water & roads", geometries, kinds, STYLES)
+    add_point_layer(m, "Buildings", latlons, "red")
+"""
+
+import json
+
+import folium
+import numpy as np
+import shapely
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster
+from jinja2 import Template
+
+# Zoom levels where a finer simplification takes over
+ZOOM_BANDS = [12, 14, 16]
+
+# Decimals kept in output coordinates (~10 cm)
+DECIMALS = 6
+
+TILE_SIZE = 256
+
+
+# -----------------------------
+# Geometry preparation
+# -----------------------------
+def pixel_degrees(zoom):
+    """
+    Width of one screen pixel at zoom, in degrees of longitude.
+    """
+    return 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+def simplify(geometries, zoom):
+    """
+    shapely geometries simplified to one pixel at zoom.
+    """
+    simplified = shapely.simplify(geometries, pixel_degrees(zoom), preserve_topology=True)
+    return shapely.transform(simplified, lambda coords: np.round(coords, DECIMALS))
+
+
+def feature_collection(geometries, properties):
+    """
+    A GeoJSON FeatureCollection dict; empty geometries are dropped.
+    """
+    features = []
+    for geometry, props in zip(shapely.to_geojson(geometries), properties):
+        if geometry is None or geometry == "null":
+            continue
+        features.append({
+            "type": "Feature",
+            "geometry": json.loads(geometry),
+            "properties": props,
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+# -----------------------------
+# Zoom-dependent layers
+# -----------------------------
+class ZoomBands(MacroElement):
+    """
+    Shows exactly one of several layers, chosen by the map's zoom.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var bands = [
+                {% for layer, low, high in this.bands %}
+                [{{ layer.get_name() }}, {{ low }}, {{ high }}],
+                {% endfor %}
+            ];
+            function show() {
+                var zoom = map.getZoom();
+                bands.forEach(function (band) {
+                    if (zoom >= band[1] && zoom < band[2]) {
+                        map.addLayer(band[0]);
+                    } else {
+                        map.removeLayer(band[0]);
+                    }
+                });
+            }
+            map.on("zoomend", show);
+            show();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, bands):
+        super().__init__()
+        self._name = "ZoomBands"
+        self.bands = bands
+
+
+def add_geojson_layer(m, name, geometries, kinds, styles, popup_fields=None,
+                      zoom_bands=ZOOM_BANDS):
+    """
+    One GeoJSON layer per zoom band for lon/lat GeoJSON geometries,
+    styled by styles[kind].
+    """
+    shapes = np.array([shapely.geometry.shape(g) for g in geometries], dtype=object)
+    properties = [{"kind": kind} for kind in kinds]
+
+    def style(feature):
+        return styles[feature["properties"]["kind"]]
+
+    bands = []
+    limits = [0] + zoom_bands[1:] + [99]
+    for i, zoom in enumerate(zoom_bands):
+        group = folium.FeatureGroup(name=name, show=False, control=False)
+        folium.GeoJson(
+            feature_collection(simplify(shapes, zoom), properties),
+            style_function=style,
+            popup=folium.GeoJsonPopup(popup_fields) if popup_fields else None,
+        ).add_to(group)
+        group.add_to(m)
+        bands.append((group, limits[i], limits[i + 1]))
+
+    ZoomBands(bands).add_to(m)
+    return bands
+
+
+# -----------------------------
+# Point layers
+# -----------------------------
+POINT_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 3, color: "%s", fill: true, fillOpacity: 0.7
+    });
+    return marker.bindPopup("%s");
+}
+"""
+
+
+def add_point_layer(m, name, latlons, color, popup=""):
+    """
+    Clustered circle markers built client-side from one coordinate array.
+    """
+    data = np.round(np.asarray(latlons, dtype=np.float64).reshape(-1, 2), DECIMALS).tolist()
+    return FastMarkerCluster(
+        data,
+        callback=POINT_CALLBACK % (color, popup),
+        name=name,
+        options={"disableClusteringAtZoom": 17, "chunkedLoading": True},
+    ).add_to(m)
+
+
+def make_map(location, zoom_start, tiles="cartodbpositron"):
+    return folium.Map(
+        location=location,
+        zoom_start=zoom_start,
+        tiles=tiles,
+        prefer_canvas=True
+    )
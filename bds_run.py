@@ -0,0 +1,190 @@
+"""
+Batch Runner for the BDS Analyses
+
+Each BDS script opens its own MongoClient, rebuilds the grid and
+re-queries the same layers. This runner computes any set of indices
+together:
+
+1. One pooled client (bds_query.get_db)
+2. One grid shared by every index
+3. One data pass: each layer is tallied once for the whole grid at all
+   the radii it is needed at (a single distance pass per centre with
+   the local and numpy engines), and every index at a radius is derived
+   from the same tallies
+4. All results are written together to one JSON file
+
+FRI (BDS3) is a city-wide score, not a grid; it is computed once by
+bds_flood.py when requested.
+
+Usage:
+
+    python bds_run.py --indices UDI,RAS,FRI --out results.json
+    python bds_run.py --indices all --grid nine --engine cube
+    python bds_run.py --indices all --profile .bds_cache/profile
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import bds_indices
+import bds_profile
+from bds_cube import GRID_POINTS
+from bds_query import (
+    BBOX, EARTH_RADIUS_KM, ENGINE, TALLY_ENGINES, get_db, select, spec_collections,
+    tally_grid_radii,
+)
+
+# BDS1/BDS2 bounding-box grid step
+STEP = 0.03
+
+CITY_INDICES = {"FRI"}
+
+
+# -----------------------------
+# Grid
+# -----------------------------
+def bbox_grid(step=STEP, bbox=BBOX):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return [
+        [float(lon), float(lat)]
+        for lon in np.arange(min_lon, max_lon, step)
+        for lat in np.arange(min_lat, max_lat, step)
+    ]
+
+
+def make_grid(kind, step=STEP):
+    if kind == "nine":
+        return [list(p) for p in GRID_POINTS]
+    return bbox_grid(step)
+
+
+# -----------------------------
+# One data pass for all indices
+# -----------------------------
+def plan(names):
+    """
+    {radius_km: set of collections} needed by the requested grid indices.
+    """
+    radii = {}
+    for name in names:
+        index = bds_indices.INDICES[name]
+        radii.setdefault(index.radius_km, set()).update(spec_collections(index.spec()))
+    return radii
+
+
+def tally_radii(db, points, radii, engine=None):
+    """
+    {radius_km: per-point tallies}. Layers needed at the same set of
+    radii are tallied together in one tally_grid_radii call.
+    """
+    by_collection = {}
+    for radius_km, collections in radii.items():
+        for collection in collections:
+            by_collection.setdefault(collection, set()).add(radius_km)
+
+    groups = {}
+    for collection, radii_km in by_collection.items():
+        groups.setdefault(tuple(sorted(radii_km)), []).append(collection)
+
+    tallies = {radius_km: [{} for _ in points] for radius_km in radii}
+    for radii_km, collections in groups.items():
+        per_radius = tally_grid_radii(
+            db, points, [r / EARTH_RADIUS_KM for r in radii_km], sorted(collections), engine
+        )
+        for radius_km in radii_km:
+            for tally, part in zip(tallies[radius_km], per_radius[radius_km / EARTH_RADIUS_KM]):
+                tally.update(part)
+    return tallies
+
+
+def run(db, names, points, engine=None):
+    grid_names = [n for n in names if n not in CITY_INDICES]
+    with bds_profile.stage("fetch"):
+        tallies = tally_radii(db, points, plan(grid_names), engine)
+
+    results = {}
+    with bds_profile.stage("compute"):
+        for name in grid_names:
+            index = bds_indices.INDICES[name]
+            rows = [
+                index.evaluate(point, select(tally, index.spec()))
+                for point, tally in zip(points, tallies[index.radius_km])
+            ]
+            results[name] = index.rank(rows)
+
+    if "FRI" in names:
+        from bds_flood import flood_risk
+
+        with bds_profile.stage("flood"):
+            _, flags, fri = flood_risk(db)
+        results["FRI"] = {
+            "buildings_near_water": len(flags["buildings"]),
+            "roads_near_water": len(flags["roads"]),
+            "FRI": fri,
+        }
+
+    return results
+
+
+def parse_indices(value):
+    known = list(bds_indices.INDICES) + sorted(CITY_INDICES)
+    if value == "all":
+        return known
+
+    names = [n.strip() for n in value.split(",") if n.strip()]
+    unknown = [n for n in names if n not in known]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown indices {', '.join(unknown)}; choose from {', '.join(known)}"
+        )
+    return names
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute several BDS indices in one data pass")
+    parser.add_argument("--indices", type=parse_indices, default="all",
+                        help="comma-separated names (UDI,RAS,FRI,...) or 'all'")
+    parser.add_argument("--grid", choices=["bbox", "nine"], default="bbox",
+                        help="bbox: BDS1/BDS2 grid, nine: shared BDS4-BDS15 points")
+    parser.add_argument("--step", type=float, default=STEP, help="bbox grid spacing (degrees)")
+    parser.add_argument("--engine", default=ENGINE, choices=TALLY_ENGINES,
+                        help="counting engine (see bds_query.py)")
+    parser.add_argument("--out", default="bds_results.json", help="output JSON file")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="profile each stage into DIR (see bds_profile.py)")
+    args = parser.parse_args()
+
+    # argparse does not check defaults against choices (BDS_ENGINE=count)
+    if args.engine not in TALLY_ENGINES:
+        parser.error(f"engine {args.engine!r} cannot tally; choose from {', '.join(TALLY_ENGINES)}")
+
+    if args.profile:
+        bds_profile.enable(args.profile)
+
+    points = make_grid(args.grid, args.step)
+
+    started = time.perf_counter()
+    results = run(get_db(), args.indices, points, args.engine)
+    elapsed = time.perf_counter() - started
+
+    with bds_profile.stage("write"), open(args.out, "w") as f:
+        json.dump({
+            "engine": args.engine,
+            "grid": points,
+            "seconds": round(elapsed, 2),
+            "results": results,
+        }, f, indent=2)
+
+    for name, rows in results.items():
+        if name in CITY_INDICES:
+            print(f"{name}: {rows[name]}")
+        else:
+            top = rows[0]
+            print(f"{bds_indices.INDICES[name].script} {name}: {top[name]} at {top['center']}")
+    print(f"\n{len(results)} indices over {len(points)} points in {elapsed:.1f}s -> {args.out}")
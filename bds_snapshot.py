@@ -0,0 +1,136 @@
+"""
+Columnar Local Snapshot of the Spatial Collections
+
+Dumps buildings, roads, pois_area and water into a columnar on-disk
+snapshot so analyses can run offline from local files in seconds
+instead of streaming every run from mongodb+srv.
+
+Layout (one directory per collection, raw .npy columns):
+
+    <snapshot>/
+        manifest.json            data version + per-layer metadata
+        buildings/
+            centroid.npy         (N, 2) float64 lon/lat
+            bbox.npy             (N, 4) float64 min_lon, min_lat, max_lon, max_lat
+            fclass.npy           (N,)   int32 codes (dictionary-encoded)
+            offsets.npy          (N + 1,) int64 offsets into coords
+            coords.npy           (V, 2) float64 vertex lon/lat
+        roads/ ...
+
+fclass dictionaries live in manifest.json. Columns are opened with
+numpy memory mapping, so loading has no parse step: pages are read
+lazily as the engines touch them.
+
+Usage:
+
+    python bds_snapshot.py export ./snapshot
+    python bds_snapshot.py info ./snapshot
+
+With BDS_SNAPSHOT set, the local, numpy and raster engines read layers
+from the snapshot instead of MongoDB, so no connection is needed:
+
+    BDS_SNAPSHOT=./snapshot python -c "import bds_indices as i; \
+        print(i.compute(None, i.INDICES['UDI'], [[76.95, 11.02]], 'local'))"
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from bds_local import LAYER_COLLECTIONS, Layer, load_layer
+
+COLUMNS = ["centroid", "bbox", "fclass", "offsets", "coords"]
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def save_layer(layer, directory):
+    os.makedirs(directory, exist_ok=True)
+    columns = {
+        "centroid": layer.centroids(),
+        "bbox": layer.bboxes(),
+        "fclass": layer.fclass,
+        "offsets": layer.offsets,
+        "coords": layer.coords,
+    }
+    for name, values in columns.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(values))
+
+    return {"features": len(layer), "fclass_names": layer.fclass_names}
+
+
+def export_snapshot(db, path, collections=LAYER_COLLECTIONS):
+    from bds_query import data_version
+
+    manifest = {
+        "version": data_version(db, collections),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "layers": {},
+    }
+
+    for collection in collections:
+        started = time.perf_counter()
+        layer = load_layer(db, collection)
+        manifest["layers"][collection] = save_layer(
+            layer, os.path.join(path, collection)
+        )
+        print(f"{collection}: {len(layer)} features in {time.perf_counter() - started:.1f}s")
+
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+# -----------------------------
+# Import (memory-mapped)
+# -----------------------------
+def read_manifest(path):
+    with open(os.path.join(path, "manifest.json")) as f:
+        return json.load(f)
+
+
+def open_layer(path, collection):
+    meta = read_manifest(path)["layers"][collection]
+    directory = os.path.join(path, collection)
+    columns = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        for name in COLUMNS
+    }
+    return Layer(
+        columns["coords"],
+        columns["offsets"],
+        columns["fclass"],
+        meta["fclass_names"],
+        centroid=columns["centroid"],
+        bbox=columns["bbox"],
+    )
+
+
+def open_snapshot(path):
+    return {c: open_layer(path, c) for c in read_manifest(path)["layers"]}
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("export", "info"):
+        sys.exit("usage: python bds_snapshot.py export|info <snapshot-dir>")
+
+    command, path = sys.argv[1], sys.argv[2]
+
+    if command == "export":
+        from bds_query import get_db
+
+        export_snapshot(get_db(), path)
+    else:
+        manifest = read_manifest(path)
+        print(f"Snapshot {path} (version {manifest['version']}, {manifest['created']})")
+        for collection, meta in manifest["layers"].items():
+            print(f"{collection}: {meta['features']} features, "
+                  f"{len(meta['fclass_names'])} fclass values")
@@ -0,0 +1,288 @@
+"""
+Synthetic Coimbatore-Scale Dataset Generator
+
+Every script points at the live Atlas cluster, so nothing can be
+benchmarked or tested offline. This generator produces the four layers
+the scripts query, with the same shape as the Geofabrik exports:
+
+- buildings : small rotated rectangles (8-40 m sides)
+- roads     : polylines on a ~100 m street lattice, so roads share
+              vertices and form real intersections (bds_topology.py)
+- pois_area : small polygons with the fclass values the indices use
+              (hospital, fire_station, mall, supermarket, bank, ...)
+- water     : lakes and tanks as 24-gons (40-900 m radius)
+
+Features follow a clustered density: a mixture of Gaussian urban cores
+(CLUSTERS: centre, spread in km, weight) over a uniform background, all
+inside the city bbox. Generation is vectorized in chunks with a seeded
+numpy RNG, so runs are reproducible and memory stays bounded from 10k
+to 50M features.
+
+Targets:
+
+    python bds_synth.py 100000 --out synth/              # GeoJSONSeq files
+    python bds_synth.py 1000000 --mongo mongodb://localhost:27017
+    python -c "import bds_synth; db = bds_synth.mock_db(50000)"   # mongomock
+
+The files load with bds_ingest.py; the Mongo target gets its indexes
+from bds_indexes.py.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from bds_query import BBOX, EARTH_RADIUS_KM, bump_version
+
+# (lon, lat, spread_km, weight): Gandhipuram/Town Hall core and
+# secondary centres along the main corridors
+CLUSTERS = [
+    (76.9558, 11.0168, 2.0, 0.45),
+    (76.9950, 11.0250, 1.5, 0.15),
+    (76.9300, 10.9950, 1.5, 0.12),
+    (77.0250, 11.0600, 2.0, 0.10),
+    (76.9000, 11.0700, 1.5, 0.08),
+]
+BACKGROUND = 0.10
+
+# Share of the total feature count per layer
+LAYER_SHARES = {"buildings": 0.70, "roads": 0.20, "pois_area": 0.09, "water": 0.01}
+
+BUILDING_FCLASSES = (["building"], [1.0])
+ROAD_FCLASSES = (
+    ["residential", "service", "tertiary", "secondary", "primary", "trunk", "footway"],
+    [0.45, 0.15, 0.13, 0.10, 0.07, 0.03, 0.07],
+)
+POI_FCLASSES = (
+    ["shop", "school", "hospital", "bank", "supermarket", "mall", "commercial",
+     "office", "fire_station", "park", "restaurant", "place_of_worship"],
+    [0.22, 0.10, 0.06, 0.08, 0.06, 0.02, 0.08, 0.08, 0.02, 0.08, 0.12, 0.08],
+)
+WATER_FCLASSES = (["water", "reservoir", "wetland"], [0.6, 0.3, 0.1])
+
+LATTICE_DEG = 0.001
+CHUNK_SIZE = 100000
+
+KM_PER_DEG = EARTH_RADIUS_KM * np.pi / 180.0
+
+
+# -----------------------------
+# Positions and shapes
+# -----------------------------
+def positions(rng, n, clusters=CLUSTERS, background=BACKGROUND, bbox=BBOX):
+    """
+    (n, 2) lon/lat drawn from the cluster mixture, inside bbox.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    weights = np.array([c[3] for c in clusters] + [background], dtype=np.float64)
+    choice = rng.choice(len(weights), size=n, p=weights / weights.sum())
+
+    out = np.column_stack([
+        rng.uniform(min_lon, max_lon, n),
+        rng.uniform(min_lat, max_lat, n),
+    ])
+    for i, (lon, lat, spread_km, _) in enumerate(clusters):
+        mask = choice == i
+        k = int(mask.sum())
+        sigma = spread_km / KM_PER_DEG
+        out[mask, 0] = rng.normal(lon, sigma / np.cos(np.radians(lat)), k)
+        out[mask, 1] = rng.normal(lat, sigma, k)
+
+    out[:, 0] = np.clip(out[:, 0], min_lon, max_lon)
+    out[:, 1] = np.clip(out[:, 1], min_lat, max_lat)
+    return out
+
+
+def _metres_to_degrees(dx, dy, lat):
+    return dx / (KM_PER_DEG * 1000.0 * np.cos(np.radians(lat))), dy / (KM_PER_DEG * 1000.0)
+
+
+def rectangles(rng, centers, min_m, max_m):
+    """
+    (n, 5, 2) closed rotated rectangles around centers.
+    """
+    n = len(centers)
+    half_w = rng.uniform(min_m, max_m, n) / 2.0
+    half_h = rng.uniform(min_m, max_m, n) / 2.0
+    theta = rng.uniform(0.0, np.pi, n)
+
+    corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1], [-1, -1]], dtype=np.float64)
+    x = corners[None, :, 0] * half_w[:, None]
+    y = corners[None, :, 1] * half_h[:, None]
+    cos, sin = np.cos(theta)[:, None], np.sin(theta)[:, None]
+
+    dlon, dlat = _metres_to_degrees(x * cos - y * sin, x * sin + y * cos, centers[:, 1:2])
+    return np.stack([centers[:, 0:1] + dlon, centers[:, 1:2] + dlat], axis=-1)
+
+
+def polygons(rng, centers, min_m, max_m, sides=24):
+    """
+    (n, sides + 1, 2) closed irregular round polygons around centers.
+    """
+    n = len(centers)
+    radius = rng.uniform(min_m, max_m, n)[:, None] * rng.uniform(0.8, 1.2, (n, sides))
+    angles = np.linspace(0.0, 2.0 * np.pi, sides, endpoint=False)[None, :]
+
+    dlon, dlat = _metres_to_degrees(radius * np.cos(angles), radius * np.sin(angles), centers[:, 1:2])
+    ring = np.stack([centers[:, 0:1] + dlon, centers[:, 1:2] + dlat], axis=-1)
+    return np.concatenate([ring, ring[:, :1]], axis=1)
+
+
+def lattice_walks(rng, centers, max_segments=5):
+    """
+    (n, max_segments + 1, 2) walks along the street lattice, plus the
+    number of vertices to keep per walk.
+    """
+    n = len(centers)
+    start = np.round(centers / LATTICE_DEG) * LATTICE_DEG
+
+    # Alternate axes so a walk turns at every vertex and never doubles back
+    axis = (rng.integers(0, 2, n)[:, None] + np.arange(max_segments)[None, :]) % 2
+    steps = rng.integers(1, 4, (n, max_segments)) * rng.choice([-1, 1], (n, max_segments))
+    moves = np.zeros((n, max_segments, 2))
+    moves[axis == 0, 0] = steps[axis == 0]
+    moves[axis == 1, 1] = steps[axis == 1]
+
+    path = np.concatenate([np.zeros((n, 1, 2)), np.cumsum(moves, axis=1)], axis=1)
+    walks = np.round(start[:, None, :] / LATTICE_DEG + path) * LATTICE_DEG
+    keep = rng.integers(2, max_segments + 2, n)
+    return np.round(walks, 7), keep
+
+
+# -----------------------------
+# Features
+# -----------------------------
+def _fclasses(rng, n, table):
+    names, weights = table
+    weights = np.asarray(weights, dtype=np.float64)
+    return rng.choice(names, size=n, p=weights / weights.sum()).tolist()
+
+
+def _feature(osm_id, fclass, geometry):
+    return {
+        "type": "Feature",
+        "properties": {"osm_id": str(osm_id), "fclass": fclass},
+        "geometry": geometry,
+    }
+
+
+def layer_chunk(rng, layer, n, first_id):
+    """
+    n GeoJSON features of one layer.
+    """
+    centers = positions(rng, n)
+    ids = range(first_id, first_id + n)
+
+    if layer == "roads":
+        walks, keep = lattice_walks(rng, centers)
+        fclass = _fclasses(rng, n, ROAD_FCLASSES)
+        return [
+            _feature(i, f, {"type": "LineString", "coordinates": w[:k].tolist()})
+            for i, f, w, k in zip(ids, fclass, walks, keep)
+        ]
+
+    if layer == "buildings":
+        rings, table = rectangles(rng, centers, 8, 40), BUILDING_FCLASSES
+    elif layer == "pois_area":
+        rings, table = rectangles(rng, centers, 15, 120), POI_FCLASSES
+    else:
+        rings, table = polygons(rng, centers, 40, 900), WATER_FCLASSES
+
+    fclass = _fclasses(rng, n, table)
+    return [
+        _feature(i, f, {"type": "Polygon", "coordinates": [r.tolist()]})
+        for i, f, r in zip(ids, fclass, np.round(rings, 7))
+    ]
+
+
+def layer_counts(total):
+    return {layer: max(1, int(round(total * share))) for layer, share in LAYER_SHARES.items()}
+
+
+def generate(total, seed=0, chunk_size=CHUNK_SIZE):
+    """
+    Yields (layer, features) chunks for a dataset of about total features.
+    """
+    rng = np.random.default_rng(seed)
+    next_id = 1
+
+    for layer, count in layer_counts(total).items():
+        for start in range(0, count, chunk_size):
+            n = min(chunk_size, count - start)
+            yield layer, layer_chunk(rng, layer, n, next_id)
+            next_id += n
+
+
+# -----------------------------
+# Targets
+# -----------------------------
+def write_files(total, directory, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    handles = {}
+    try:
+        for layer, features in generate(total, seed):
+            if layer not in handles:
+                handles[layer] = open(os.path.join(directory, f"{layer}.geojsonl"), "w")
+            handles[layer].write("".join(json.dumps(f) + "\n" for f in features))
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return sorted(f.name for f in handles.values())
+
+
+def write_db(db, total, seed=0, drop=True, indexes=True):
+    if drop:
+        for layer in LAYER_SHARES:
+            db[layer].drop()
+
+    for layer, features in generate(total, seed):
+        db[layer].insert_many(features, ordered=False)
+    for layer in LAYER_SHARES:
+        bump_version(db, layer)
+
+    if indexes:
+        from bds_indexes import ensure_indexes
+
+        ensure_indexes(db, list(LAYER_SHARES))
+    return {layer: db[layer].estimated_document_count() for layer in LAYER_SHARES}
+
+
+def mock_db(total, seed=0, name="bigdata_spatial"):
+    """
+    A mongomock database filled with a synthetic dataset.
+    """
+    import mongomock
+
+    db = mongomock.MongoClient()[name]
+    write_db(db, total, seed, drop=False, indexes=False)
+    return db
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Coimbatore-scale dataset")
+    parser.add_argument("total", type=int, help="approximate number of features (all layers)")
+    parser.add_argument("--seed", type=int, default=0)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", help="directory for <layer>.geojsonl files")
+    target.add_argument("--mongo", help="MongoDB URI to load into")
+    parser.add_argument("--db", default="bigdata_spatial", help="database name for --mongo")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.out:
+        written = write_files(args.total, args.out, args.seed)
+        print("Wrote " + ", ".join(written))
+    else:
+        from pymongo import MongoClient
+
+        counts = write_db(MongoClient(args.mongo)[args.db], args.total, args.seed)
+        print(counts)
+
+    elapsed = time.perf_counter() - started
+    print(f"{args.total} features in {elapsed:.1f}s ({args.total / elapsed:,.0f}/s)")
@@ -0,0 +1,296 @@
+"""
+Offline Raster Tile Pyramid for Index Heatmaps
+
+BDS1 and BDS2 draw one folium.Circle per grid cell, so the map grows
+with the grid. This module renders an index surface (UDI, RAS, FRI, ...)
+once into a z/x/y PNG pyramid on local disk:
+
+    <tiles>/<INDEX>/
+        metadata.json           surface hash, zoom range, value range
+        <z>/<x>/<y>.png         256 x 256 RGBA, web-mercator tiles
+
+- every tile pixel is mapped to its grid cell with array arithmetic and
+  colored through a 256-entry lookup table (no per-pixel Python)
+- PNGs are written with zlib only (no imaging library needed)
+- a pyramid whose metadata matches the surface is reused as is, so
+  later sessions skip rendering entirely
+
+Leaflet then loads the tiles as one layer (tile_layer), and the browser
+cost no longer depends on the number of cells. Tile URLs are relative to
+the tile directory, so an inline notebook map cannot load them:
+save_map writes the map HTML into the tile directory, where they
+resolve, and that file is what to open (or serve over HTTP).
+
+In BDS1/BDS2 set BDS_TILES=<dir> to draw the heatmap as tiles:
+
+    BDS_TILES=tiles python BDS1.py
+"""
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+TILE_DIR = os.environ.get("BDS_TILES")
+
+TILE_SIZE = 256
+MIN_ZOOM = 10
+MAX_ZOOM = 15
+
+# Low-to-high color stops (yellow -> orange -> red) and tile opacity
+COLOR_STOPS = [(255, 255, 178), (254, 178, 76), (240, 59, 32), (189, 0, 38)]
+ALPHA = 170
+
+
+# -----------------------------
+# Index surface
+# -----------------------------
+class Surface:
+    """
+    Values on a regular lon/lat grid; cell (i, j) is centred on
+    (lon0 + i * step, lat0 + j * step). NaN cells are transparent.
+    """
+
+    def __init__(self, lon0, lat0, step, values):
+        self.lon0 = lon0
+        self.lat0 = lat0
+        self.step = step
+        self.values = np.asarray(values, dtype=np.float64)
+
+    @classmethod
+    def from_rows(cls, rows, key, step):
+        """
+        Surface of rows[key] from index rows with a "center" [lon, lat].
+        """
+        centers = np.array([r["center"] for r in rows], dtype=np.float64)
+        lon0, lat0 = centers.min(axis=0)
+        ij = np.rint((centers - [lon0, lat0]) / step).astype(np.int64)
+
+        values = np.full(ij.max(axis=0) + 1, np.nan)
+        values[ij[:, 0], ij[:, 1]] = [r[key] for r in rows]
+        return cls(float(lon0), float(lat0), step, values)
+
+    def bounds(self):
+        nx, ny = self.values.shape
+        half = self.step / 2.0
+        return (
+            self.lon0 - half,
+            self.lat0 - half,
+            self.lon0 + (nx - 1) * self.step + half,
+            self.lat0 + (ny - 1) * self.step + half,
+        )
+
+    def sample(self, lon, lat):
+        """
+        Values at lon/lat arrays (nearest cell, NaN outside the grid).
+        """
+        nx, ny = self.values.shape
+        i = np.floor((lon - self.lon0) / self.step + 0.5).astype(np.int64)
+        j = np.floor((lat - self.lat0) / self.step + 0.5).astype(np.int64)
+        inside = (i >= 0) & (i < nx) & (j >= 0) & (j < ny)
+
+        out = np.full(lon.shape, np.nan)
+        out[inside] = self.values[i[inside], j[inside]]
+        return out
+
+    def digest(self):
+        h = hashlib.sha1()
+        h.update(json.dumps([self.lon0, self.lat0, self.step, list(self.values.shape)]).encode())
+        h.update(np.ascontiguousarray(self.values).tobytes())
+        h.update(json.dumps([COLOR_STOPS, ALPHA]).encode())
+        return h.hexdigest()
+
+
+# -----------------------------
+# Web-mercator tile math
+# -----------------------------
+def tile_range(bounds, zoom):
+    """
+    (x_min, x_max, y_min, y_max) of the tiles covering bounds at zoom.
+    """
+    min_lon, min_lat, max_lon, max_lat = bounds
+    n = 2 ** zoom
+
+    def x(lon):
+        return int((lon + 180.0) / 360.0 * n)
+
+    def y(lat):
+        lat = math.radians(lat)
+        return int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+
+    return x(min_lon), x(max_lon), y(max_lat), y(min_lat)
+
+
+def pixel_lonlat(x, y, zoom):
+    """
+    lon/lat of every pixel centre of tile (x, y), each (256, 256).
+    """
+    scale = TILE_SIZE * 2 ** zoom
+    offsets = np.arange(TILE_SIZE) + 0.5
+
+    lon = (x * TILE_SIZE + offsets) / scale * 360.0 - 180.0
+    merc = np.pi * (1.0 - 2.0 * (y * TILE_SIZE + offsets) / scale)
+    lat = np.degrees(np.arctan(np.sinh(merc)))
+
+    return np.meshgrid(lon, lat)
+
+
+# -----------------------------
+# Colormap and PNG writer
+# -----------------------------
+def colormap_lut(stops=COLOR_STOPS, alpha=ALPHA):
+    positions = np.linspace(0.0, 1.0, len(stops))
+    ramp = np.linspace(0.0, 1.0, 256)
+    lut = np.empty((256, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.rint(np.interp(ramp, positions, [s[channel] for s in stops]))
+    lut[:, 3] = alpha
+    return lut
+
+
+def colorize(values, low, high, lut):
+    """
+    (H, W, 4) uint8 RGBA for a value array; NaN becomes transparent.
+    """
+    span = (high - low) or 1.0
+    missing = np.isnan(values)
+    scaled = np.clip((np.nan_to_num(values, nan=low) - low) / span, 0.0, 1.0)
+
+    rgba = lut[np.rint(scaled * 255).astype(np.intp)]
+    rgba[missing] = 0
+    return rgba
+
+
+def _chunk(kind, data):
+    body = kind + data
+    return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+
+def encode_png(rgba):
+    height, width = rgba.shape[:2]
+    # Filter type 0 (None) in front of every scanline
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _chunk(b"IHDR", header)
+        + _chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + _chunk(b"IEND", b"")
+    )
+
+
+# -----------------------------
+# Pyramid export
+# -----------------------------
+def export_tiles(surface, directory, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Render surface to <directory>/z/x/y.png unless an identical pyramid
+    is already there; returns the metadata. A re-render replaces the
+    whole directory, which should hold nothing but the pyramid.
+    """
+    meta_path = os.path.join(directory, "metadata.json")
+    metadata = {
+        "digest": surface.digest(),
+        "bounds": surface.bounds(),
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "low": float(np.nanmin(surface.values)),
+        "high": float(np.nanmax(surface.values)),
+    }
+
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == json.loads(json.dumps(metadata)):
+                return metadata
+
+    # Render into a sibling directory and swap it in, so tiles of an
+    # older extent or zoom range never survive a re-render
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".tiles-", dir=parent)
+
+    try:
+        lut = colormap_lut()
+        tiles = 0
+
+        for zoom in range(min_zoom, max_zoom + 1):
+            x_min, x_max, y_min, y_max = tile_range(metadata["bounds"], zoom)
+            for x in range(x_min, x_max + 1):
+                os.makedirs(os.path.join(staging, str(zoom), str(x)), exist_ok=True)
+                for y in range(y_min, y_max + 1):
+                    lon, lat = pixel_lonlat(x, y, zoom)
+                    rgba = colorize(surface.sample(lon, lat), metadata["low"], metadata["high"], lut)
+                    with open(os.path.join(staging, str(zoom), str(x), f"{y}.png"), "wb") as f:
+                        f.write(encode_png(rgba))
+                    tiles += 1
+
+        with open(os.path.join(staging, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+        if os.path.exists(directory):
+            retired = staging + ".old"
+            os.replace(directory, retired)
+            os.replace(staging, directory)
+            shutil.rmtree(retired)
+        else:
+            os.replace(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    metadata["rendered"] = tiles
+    return metadata
+
+
+# -----------------------------
+# Folium / Leaflet layer
+# -----------------------------
+def tile_layer(directory, name, opacity=1.0, base=None):
+    """
+    Leaflet layer for a pyramid; with base, the URL is relative to the
+    directory the map HTML is saved in.
+    """
+    import folium
+
+    with open(os.path.join(directory, "metadata.json")) as f:
+        metadata = json.load(f)
+
+    url = os.path.relpath(directory, base) if base else directory.rstrip("/")
+    return folium.TileLayer(
+        tiles=url.replace(os.sep, "/") + "/{z}/{x}/{y}.png",
+        attr=name,
+        name=name,
+        overlay=True,
+        opacity=opacity,
+        min_zoom=metadata["min_zoom"],
+        max_native_zoom=metadata["max_zoom"],
+        max_zoom=18,
+    )
+
+
+def index_tile_layer(rows, key, step, directory=None):
+    """
+    Export rows[key] under <directory>/<key> and return its tile layer.
+    """
+    root = directory or TILE_DIR
+    target = os.path.join(root, key)
+    export_tiles(Surface.from_rows(rows, key, step), target)
+    return tile_layer(target, key, base=root)
+
+
+def save_map(m, name, directory=None):
+    """
+    Write the map HTML into the tile directory, next to the pyramids its
+    tile layers point at; returns the file path.
+    """
+    path = os.path.join(directory or TILE_DIR, f"{name}.html")
+    m.save(path)
+    return path
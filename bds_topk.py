@@ -0,0 +1,255 @@
+"""
+Branch-and-Bound Top-k Search
+
+Most scripts score every grid cell and print results[0]. For "where is
+the best (or worst) area" questions the top-k search scores only what
+can still win.
+
+Bounds: for any point p in a square region with centre c and
+half-diagonal d, the circle of radius r around p lies inside the circle
+of radius r + d around c and contains the one of radius r - d. Counts
+only grow with the radius, so every count term of p lies between its
+counts at c for r - d and r + d. With the index's linear weights
+(Index.linear_weights), positive terms take the high count and negative
+terms the low one for the upper bound, and the reverse for the lower.
+
+Search:
+1. Cover the bbox with coarse regions and bound them
+2. Repeatedly split the regions with the best upper bound into four,
+   bound the children and score their centres exactly (one batch per
+   round: radii r, r - d and r + d in one tally_grid_radii call)
+3. Drop every region whose bound cannot beat the current k-th best
+4. Stop when no region can improve the top k, or all remaining regions
+   are at the target resolution
+
+Lowest-is-best indices (HAI) are searched on the negated score.
+
+Engines that cap the radius (raster: MAX_RADIUS_KM) start on coarse
+regions small enough that r + d stays countable; engines that cannot
+tally (count) fall back to aggregate with a warning.
+
+Usage:
+
+    python bds_topk.py UDI -k 5 --resolution 50
+"""
+
+import argparse
+import heapq
+import math
+import warnings
+
+import bds_indices
+from bds_query import BBOX, EARTH_RADIUS_KM, ENGINE, TALLY_ENGINES, select, tally_grid_radii
+
+COARSE_STEP = 0.05
+RESOLUTION_M = 50
+BATCH = 64
+
+# Margin on the half-diagonal for the spherical vs. planar distance
+DIAGONAL_SLACK = 1.01
+
+
+# -----------------------------
+# Regions and bounds
+# -----------------------------
+def half_diagonal_km(lat, size):
+    half = math.radians(size / 2.0)
+    return DIAGONAL_SLACK * EARTH_RADIUS_KM * math.hypot(
+        half * math.cos(math.radians(lat)), half
+    )
+
+
+def split(region):
+    lon, lat, size = region
+    quarter = size / 4.0
+    return [
+        (lon + dx, lat + dy, size / 2.0)
+        for dx in (-quarter, quarter)
+        for dy in (-quarter, quarter)
+    ]
+
+
+def radius_limit_km(engine):
+    """
+    Largest radius the engine can count, or None when unbounded.
+    """
+    if engine == "raster":
+        from bds_raster import MAX_RADIUS_KM
+
+        return MAX_RADIUS_KM
+    return None
+
+
+def covered_step(radius_km, step, bbox, limit_km):
+    """
+    The largest step <= step (halving) whose regions keep r + d within
+    limit_km, so the upper bounds stay countable.
+    """
+    if limit_km is None:
+        return step
+    if radius_km >= limit_km:
+        raise ValueError(f"Radius {radius_km} km is beyond the engine's {limit_km} km limit")
+
+    # Lowest latitude has the widest degree of longitude
+    lat = min(abs(bbox[1]), abs(bbox[3]))
+    while radius_km + half_diagonal_km(lat, step) > limit_km:
+        step /= 2.0
+    return step
+
+
+def coarse_regions(step=COARSE_STEP, bbox=BBOX):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    nx = max(1, round((max_lon - min_lon) / step))
+    ny = max(1, round((max_lat - min_lat) / step))
+    return [
+        (min_lon + (i + 0.5) * step, min_lat + (j + 0.5) * step, step)
+        for i in range(nx)
+        for j in range(ny)
+    ]
+
+
+class Search:
+
+    def __init__(self, db, index, engine=None):
+        engine = engine or ENGINE
+        if engine not in TALLY_ENGINES:
+            warnings.warn(
+                f"Engine {engine!r} cannot tally several radii; top-k uses 'aggregate'",
+                stacklevel=2,
+            )
+            engine = "aggregate"
+
+        self.db = db
+        self.index = index
+        self.engine = engine
+        self.weights = index.linear_weights()
+        self.sign = 1 if index.highest else -1
+        self.points_scored = 0
+
+    def counts(self, points, radii_km):
+        """
+        Named counts per point for each radius, from one
+        tally_grid_radii call (radius <= 0 counts nothing).
+        """
+        spec = self.index.spec()
+        positive = [r for r in radii_km if r > 0]
+        tallies = tally_grid_radii(
+            self.db, points, [r / EARTH_RADIUS_KM for r in positive],
+            sorted({c for c, _ in spec.values()}), self.engine,
+        ) if positive else {}
+
+        return [
+            [select(t, spec) for t in tallies[r / EARTH_RADIUS_KM]] if r > 0
+            else [dict.fromkeys(spec, 0) for _ in points]
+            for r in radii_km
+        ]
+
+    def bound(self, low, high):
+        """
+        Upper bound of sign × score from the r - d and r + d counts.
+        """
+        upper = lower = 0.0
+        for term, w in self.weights.items():
+            upper += w * (high[term] if w > 0 else low[term])
+            lower += w * (low[term] if w > 0 else high[term])
+        return upper if self.sign > 0 else -lower
+
+    def expand(self, regions):
+        """
+        (bound, row) for every region: exact row at its centre, bound
+        over the whole region.
+        """
+        if not regions:
+            return []
+
+        r = self.index.radius_km
+        centers = [[lon, lat] for lon, lat, _ in regions]
+
+        # Regions of one round share a size; d varies only with latitude
+        d = max(half_diagonal_km(lat, size) for _, lat, size in regions)
+        exact, low, high = self.counts(centers, [r, r - d, r + d])
+
+        self.points_scored += len(regions)
+        return [
+            (self.bound(lo, hi), self.index.evaluate(c, e))
+            for c, e, lo, hi in zip(centers, exact, low, high)
+        ]
+
+
+# -----------------------------
+# Top-k
+# -----------------------------
+def top_k(db, index, k=1, resolution_m=RESOLUTION_M, engine=None,
+          step=COARSE_STEP, bbox=BBOX, batch=BATCH):
+    """
+    The k best rows at the given resolution, plus search statistics.
+    """
+    search = Search(db, index, engine)
+    resolution = resolution_m / 1000.0 / (EARTH_RADIUS_KM * math.pi / 180.0)
+
+    # Engines with a radius limit (raster) start on finer regions
+    step = covered_step(index.radius_km, step, bbox, radius_limit_km(search.engine))
+
+    best = []      # min-heap of (sign × score, tiebreak, row)
+    frontier = []  # max-heap of (-bound, tiebreak, region)
+    counter = 0
+
+    def offer(regions):
+        nonlocal counter
+        for region, (bound, row) in zip(regions, search.expand(regions)):
+            counter += 1
+            value = search.sign * row[index.name]
+            if len(best) < k:
+                heapq.heappush(best, (value, counter, row))
+            elif value > best[0][0]:
+                heapq.heapreplace(best, (value, counter, row))
+            if region[2] > resolution:
+                heapq.heappush(frontier, (-bound, counter, region))
+
+    offer(coarse_regions(step, bbox))
+
+    while frontier:
+        threshold = best[0][0] if len(best) == k else -math.inf
+
+        batch_regions = []
+        while frontier and len(batch_regions) < batch:
+            bound = -frontier[0][0]
+            if bound <= threshold:
+                break
+            batch_regions.append(heapq.heappop(frontier)[2])
+
+        if not batch_regions:
+            break
+
+        by_size = {}
+        for region in batch_regions:
+            for child in split(region):
+                by_size.setdefault(child[2], []).append(child)
+        for children in by_size.values():
+            offer(children)
+
+    rows = [row for _, _, row in sorted(best, reverse=True)]
+    stats = {"points_scored": search.points_scored, "regions_left": len(frontier)}
+    return rows, stats
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    from bds_query import get_db
+
+    parser = argparse.ArgumentParser(description="Branch-and-bound top-k for one BDS index")
+    parser.add_argument("index", choices=list(bds_indices.INDICES))
+    parser.add_argument("-k", type=int, default=1, help="number of locations")
+    parser.add_argument("--resolution", type=float, default=RESOLUTION_M,
+                        help="finest cell size (metres)")
+    parser.add_argument("--engine", help="counting engine (see bds_query.py)")
+    args = parser.parse_args()
+
+    index = bds_indices.INDICES[args.index]
+    rows, stats = top_k(get_db(), index, args.k, args.resolution, args.engine)
+
+    print(f"{index.title}: top {args.k} after scoring {stats['points_scored']} points\n")
+    for row in rows:
+        print(f"{row['center']}  {index.name} {row[index.name]}")
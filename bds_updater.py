@@ -0,0 +1,380 @@
+"""
+Incremental Maintenance of the Count Cube and Derived Indices
+
+Inserting or editing a few features should not rerun whole analyses.
+The updater tails the changes to buildings, roads, pois_area, water and
+road_intersections and applies each one to the materialized results:
+
+1. The changed feature (before and/or after image) is tested against
+   every cube circle (cell, radius) by the rule the cube was counted
+   with: all its vertices inside ($geoWithin; aggregate and local) or
+   its centroid inside (numpy and raster). A cube filled from geohash
+   cells cannot be kept exact and is refused
+2. Only those cube tallies move, by -1 for the old image and +1 for the
+   new one, under the feature's fclass
+3. Only the indices whose radius was touched are re-derived (pure
+   lookups in the cube), and cube + results are written back within
+   FLUSH_S
+
+Work is proportional to the number of changed features times the
+number of cube circles, independent of the layer sizes. Start the
+updater once the cube is current (python bds_cube.py).
+
+Sources:
+- MongoDB change streams (replica set / Atlas), resumed from the last
+  saved resume token. The token is saved right after the cube, so a
+  crash in between replays changes instead of losing them. Every collection needs changeStreamPreAndPostImages:
+  updates and deletes need the pre-image (where the feature was) and
+  updates the post-image as of that change, not the current document.
+  An event missing either image drops that layer from the cube, and it
+  is recounted on the next cube fill
+- A JSONL oplog stand-in for testing, one event per line:
+
+    {"op": "insert", "collection": "buildings", "after": {...}}
+    {"op": "update", "collection": "roads", "before": {...}, "after": {...}}
+    {"op": "delete", "collection": "water", "before": {...}}
+
+Usage:
+
+    python bds_updater.py watch
+    python bds_updater.py replay changes.jsonl [--follow]
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import bds_cube
+import bds_indices
+import bds_query
+from bds_local import iter_vertices, unit_vectors, vertex_centroid
+
+RESULTS_PATH = os.environ.get("BDS_RESULTS_PATH", ".bds_cache/indices.json")
+RESUME_PATH = os.environ.get("BDS_RESUME_PATH", ".bds_cache/resume_token.json")
+
+# Longest delay between a change and the written results (seconds)
+FLUSH_S = 2.0
+POLL_S = 0.5
+
+
+# -----------------------------
+# Change sources
+# -----------------------------
+def oplog_events(path, follow=False):
+    """
+    Events from a JSONL file; with follow, keep tailing it (None = idle).
+    """
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if line.strip():
+                yield json.loads(line)
+            elif line:
+                continue
+            elif follow:
+                yield None
+                time.sleep(POLL_S)
+            else:
+                return
+
+
+def change_stream_events(db, collections=bds_cube.LAYER_COLLECTIONS, resume_path=RESUME_PATH):
+    """
+    Normalized events from a change stream, each with the stream's
+    resume token ({"op": "idle"} when nothing is pending). The token is
+    saved by Updater.refresh once the cube holds the changes.
+    """
+    from bson import json_util
+
+    resume_token = None
+    if os.path.exists(resume_path):
+        with open(resume_path) as f:
+            resume_token = json_util.loads(f.read())
+
+    pipeline = [{"$match": {"ns.coll": {"$in": list(collections)}}}]
+
+    with db.watch(
+        pipeline,
+        # Post-images as of the change itself: updateLookup returns the
+        # document as it is when the event is read, which double-counts
+        # quick successive updates
+        full_document="whenAvailable",
+        full_document_before_change="whenAvailable",
+        resume_after=resume_token,
+    ) as stream:
+        while stream.alive:
+            change = stream.try_next()
+            token = json_util.dumps(stream.resume_token)
+            if change is None:
+                yield {"op": "idle", "resume_token": token}
+                time.sleep(POLL_S)
+                continue
+
+            op = change["operationType"]
+            if op not in ("insert", "update", "replace", "delete"):
+                continue
+            yield {
+                "op": op,
+                "collection": change["ns"]["coll"],
+                "before": change.get("fullDocumentBeforeChange"),
+                "after": change.get("fullDocument"),
+                "resume_token": token,
+            }
+
+
+# -----------------------------
+# Applying changes
+# -----------------------------
+def _cell_point(cell):
+    lon, lat = cell.split(",")
+    return float(lon), float(lat)
+
+
+class Updater:
+
+    def __init__(self, db, names=None, results_path=RESULTS_PATH, resume_path=RESUME_PATH):
+        self.db = db
+        self.engine = bds_cube.cube_for(db)
+        self.cube = self.engine.current()
+        if self.cube.rule not in ("within", "centroid"):
+            raise ValueError(
+                f"cube counted by the {self.cube.rule} rule cannot be updated "
+                "incrementally; refill it with BDS_CUBE_SOURCE=aggregate, local or numpy"
+            )
+        self.names = names or list(bds_indices.INDICES)
+        self.results_path = results_path
+        self.resume_path = resume_path
+        self.changed = 0
+        # Collections changed since the last refresh (version stamps to bump)
+        self.dirty = set()
+        # Resume token of the last event read / last one saved
+        self.token = None
+        self.saved_token = None
+        self._index_circles()
+
+    def _index_circles(self):
+        """
+        Unit vectors and lon/lat radians of every cube cell, grouped by
+        radius.
+        """
+        self.circles = {}
+        for cell, radius in self.cube.entries:
+            self.circles.setdefault(radius, []).append(cell)
+
+        self.centers = {}
+        self.center_radians = {}
+        for radius, cells in self.circles.items():
+            points = np.array([_cell_point(c) for c in cells])
+            self.centers[radius] = unit_vectors(points[:, 0], points[:, 1])
+            self.center_radians[radius] = np.radians(points)
+
+    def _geometry(self, doc):
+        if bds_query.GEO_FIELD == "centroid" and "centroid" in doc:
+            return doc["centroid"]
+        return doc.get("geometry")
+
+    def _centroid_covering(self, doc):
+        """
+        (cell, radius) keys whose circle contains the feature's centroid,
+        with the same haversine test as the numpy engine.
+        """
+        if doc.get("centroid"):
+            point = doc["centroid"]["coordinates"][:2]
+        elif doc.get("geometry"):
+            point = vertex_centroid(doc["geometry"])
+        else:
+            point = None
+        if point is None:
+            return []
+
+        lon, lat = np.radians(np.asarray(point, dtype=np.float64))
+        covering = []
+        for radius, centers in self.center_radians.items():
+            lon0, lat0 = centers[:, 0], centers[:, 1]
+            hav = (
+                np.sin((lat - lat0) / 2.0) ** 2
+                + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2.0) ** 2
+            )
+            limit = np.sin(float(radius) / bds_query.EARTH_RADIUS_KM / 2.0) ** 2
+            for i in np.flatnonzero(hav <= limit):
+                covering.append((self.circles[radius][i], radius))
+        return covering
+
+    def _covering(self, doc):
+        """
+        (cell, radius) keys whose circle counts the feature under the
+        cube's rule.
+        """
+        if self.cube.rule == "centroid":
+            return self._centroid_covering(doc)
+
+        geometry = self._geometry(doc)
+        if not geometry:
+            return []
+
+        vertices = np.array(list(iter_vertices(geometry)), dtype=np.float64)
+        xyz = unit_vectors(vertices[:, 0], vertices[:, 1])
+
+        covering = []
+        for radius, centers in self.centers.items():
+            # Smallest cosine = farthest vertex from each centre
+            farthest = np.arccos(np.clip((centers @ xyz.T).min(axis=1), -1.0, 1.0))
+            limit = float(radius) / bds_query.EARTH_RADIUS_KM
+            for i in np.flatnonzero(farthest <= limit):
+                covering.append((self.circles[radius][i], radius))
+        return covering
+
+    def _shift(self, collection, doc, delta, touched):
+        fclass = (doc.get("properties") or {}).get("fclass")
+        for key in self._covering(doc):
+            tally = self.cube.entries[key]
+            if collection not in tally:
+                continue
+            by_fclass = tally[collection]
+            by_fclass[fclass] = by_fclass.get(fclass, 0) + delta
+            if by_fclass[fclass] == 0:
+                del by_fclass[fclass]
+            touched.add(key)
+
+    def _forget(self, collection):
+        for tally in self.cube.entries.values():
+            tally.pop(collection, None)
+
+    def apply(self, event, touched):
+        collection = event["collection"]
+        if collection not in bds_cube.LAYER_COLLECTIONS:
+            return
+
+        self.dirty.add(collection)
+        op = event["op"]
+        before, after = event.get("before"), event.get("after")
+        if (op in ("update", "replace", "delete") and before is None) or (
+            op != "delete" and after is None
+        ):
+            # A missing pre- or post-image: the layer can no longer be
+            # kept exact and is recounted on the next cube fill
+            self._forget(collection)
+            touched.update(self.cube.entries)
+        else:
+            if before is not None:
+                self._shift(collection, before, -1, touched)
+            if after is not None and op != "delete":
+                self._shift(collection, after, +1, touched)
+
+        self.changed += 1
+
+    # -----------------------------
+    # Derived results
+    # -----------------------------
+    def derive(self, names=None):
+        """
+        Indices over every cube cell that has their radius.
+        """
+        results = {}
+        for name in names or self.names:
+            index = bds_indices.INDICES[name]
+            radius = bds_cube.radius_key(index.radius_km)
+            rows = []
+            for cell in self.circles.get(radius, []):
+                tally = self.cube.entries[(cell, radius)]
+                if all(c in tally for c in bds_query.spec_collections(index.spec())):
+                    rows.append(index.evaluate(list(_cell_point(cell)),
+                                               bds_query.select(tally, index.spec())))
+            results[name] = index.rank(rows)
+        return results
+
+    def _save_token(self):
+        """
+        Resume token of the last applied event; only ever written after
+        the cube that holds its changes.
+        """
+        if self.token is None or self.token == self.saved_token:
+            return
+        os.makedirs(os.path.dirname(self.resume_path) or ".", exist_ok=True)
+        tmp = self.resume_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.token)
+        os.replace(tmp, self.resume_path)
+        self.saved_token = self.token
+
+    def refresh(self, touched, token=None):
+        """
+        Re-derive the indices whose radius was touched, write back, then
+        save the resume token of the events applied so far.
+        """
+        if token is not None:
+            self.token = token
+        if not touched and not self.dirty:
+            self._save_token()
+            return
+
+        radii = {radius for _, radius in touched}
+        if os.path.exists(self.results_path):
+            with open(self.results_path) as f:
+                results = json.load(f)
+        else:
+            results = {}
+
+        names = [
+            n for n in self.names
+            if n not in results or bds_cube.radius_key(bds_indices.INDICES[n].radius_km) in radii
+        ]
+        results.update(self.derive(names))
+
+        # Query-cache entries of the changed layers are stale from here on
+        for collection in sorted(self.dirty):
+            bds_query.bump_version(self.db, collection)
+        self.dirty.clear()
+        self.cube.version = bds_query.data_version(self.db, bds_cube.LAYER_COLLECTIONS)
+        self.cube.save(self.engine.path)
+
+        os.makedirs(os.path.dirname(self.results_path) or ".", exist_ok=True)
+        tmp = self.results_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(results, f)
+        os.replace(tmp, self.results_path)
+
+        self._save_token()
+
+    def run(self, events):
+        touched = set()
+        last_flush = time.perf_counter()
+        token = None
+
+        for event in events:
+            idle = event is None or event["op"] == "idle"
+            if event is not None:
+                token = event.get("resume_token", token)
+                if not idle:
+                    self.apply(event, touched)
+
+            now = time.perf_counter()
+            pending = touched or self.dirty or token != self.saved_token
+            if pending and (idle or now - last_flush >= FLUSH_S):
+                self.refresh(touched, token)
+                touched = set()
+                last_flush = now
+
+        self.refresh(touched, token)
+        return self.changed
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("watch", "replay"):
+        sys.exit("usage: python bds_updater.py watch | replay <changes.jsonl> [--follow]")
+
+    db = bds_query.get_db()
+    updater = Updater(db)
+
+    if sys.argv[1] == "watch":
+        source = change_stream_events(db)
+    else:
+        source = oplog_events(sys.argv[2], follow="--follow" in sys.argv[3:])
+
+    print(f"{updater.run(source)} changes applied")
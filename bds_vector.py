@@ -0,0 +1,239 @@
+"""
+Vectorized Haversine Counting over Centroid Arrays
+
+Each layer is pulled out of MongoDB once and reduced to float64
+centroid arrays. Counting then replaces the per-point Python loop with
+broadcasted haversine distances between a block of grid centres and a
+block of features:
+
+    hav = sin²(Δlat / 2) + cos(lat1) · cos(lat2) · sin²(Δlon / 2)
+    inside  ⇔  hav ≤ sin²(radius / 2)
+
+which is the same great-circle test $centerSphere applies, so counts
+match MongoDB exactly for Point geometries. Lines and polygons are
+counted by their stored centroid (bds_enrich.py), else their vertex
+mean. Only those points are read: enriched documents are fetched with
+just the centroid, and the rest are reduced to a point per document as
+the cursor streams, a chunk of numpy arrays at a time.
+
+Memory stays flat: a block never holds more than CHUNK_ELEMS
+(centre, feature) pairs, whatever the grid size or layer size. Features
+are sorted by (fclass, latitude) once, so per-category counts are plain
+row sums and each block of latitude-sorted centres only visits the
+features in its latitude band.
+
+Several radii cost one distance pass (counts_radii): every pair is
+binned by the smallest radius whose circle holds it, and the counts at
+each radius are the running sums of those bins.
+
+Use it through bds_query with BDS_ENGINE=numpy.
+"""
+
+import os
+
+import numpy as np
+
+from bds_local import SNAPSHOT_DIR, engine_key, load_layer, vertex_centroid
+
+# Max (centre x feature) pairs evaluated at once (~32 MB per float64 block)
+CHUNK_ELEMS = int(os.environ.get("BDS_CHUNK_ELEMS", 1 << 22))
+
+# Centres per block; features per block follow from CHUNK_ELEMS
+CELLS_PER_BLOCK = 256
+
+# Documents converted to numpy per chunk while loading a layer
+LOAD_CHUNK = 100_000
+
+
+# -----------------------------
+# Centroid arrays for one layer
+# -----------------------------
+def load_centroids(db, collection):
+    """
+    (lon, lat, fclass codes, fclass names) for one layer, one point per
+    feature, without holding the geometries of the whole layer.
+    """
+    if SNAPSHOT_DIR:
+        layer = load_layer(db, collection)
+        centroids = layer.centroids()
+        return centroids[:, 0], centroids[:, 1], layer.fclass, layer.fclass_names
+
+    codes = {}
+    chunks = []
+    rows = []
+
+    def flush():
+        if rows:
+            points = np.array([r[:2] for r in rows], dtype=np.float64)
+            fclass = np.array([r[2] for r in rows], dtype=np.int32)
+            chunks.append((points, fclass))
+            rows.clear()
+
+    def add(point, doc):
+        name = (doc.get("properties") or {}).get("fclass")
+        rows.append((point[0], point[1], codes.setdefault(name, len(codes))))
+        if len(rows) >= LOAD_CHUNK:
+            flush()
+
+    fclass_only = {"_id": 0, "properties.fclass": 1}
+    for doc in db[collection].find({"centroid": {"$exists": True}},
+                                   {**fclass_only, "centroid": 1}):
+        add(doc["centroid"]["coordinates"], doc)
+
+    for doc in db[collection].find({"centroid": {"$exists": False}},
+                                   {**fclass_only, "geometry": 1}):
+        centroid = vertex_centroid(doc["geometry"]) if doc.get("geometry") else None
+        if centroid is not None:
+            add(centroid, doc)
+    flush()
+
+    if not chunks:
+        return np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int32), list(codes)
+    points = np.concatenate([c[0] for c in chunks])
+    fclass = np.concatenate([c[1] for c in chunks])
+    return points[:, 0], points[:, 1], fclass, list(codes)
+
+
+class CentroidLayer:
+
+    def __init__(self, lon, lat, fclass, fclass_names):
+        order = np.lexsort((lat, fclass))
+
+        self.lat = np.radians(lat[order])
+        self.lon = np.radians(lon[order])
+        self.cos_lat = np.cos(self.lat)
+        self.fclass_names = fclass_names
+
+        codes = fclass[order]
+        self.groups = []
+        for code in np.unique(codes):
+            start, stop = np.searchsorted(codes, [code, code + 1])
+            self.groups.append((fclass_names[code], start, stop))
+
+    def counts(self, lon, lat, radius_rad):
+        """
+        {fclass: count array over centres} for centres given in radians.
+        """
+        return {
+            name: per_radius[0]
+            for name, per_radius in self.counts_radii(lon, lat, [radius_rad]).items()
+        }
+
+    def counts_radii(self, lon, lat, radii_rad):
+        """
+        {fclass: (radii, centres) count array} for ascending radii, from
+        one distance pass: each (centre, feature) pair is placed in the
+        smallest circle containing it and the shells are summed up.
+        """
+        limits = np.sin(np.asarray(radii_rad, dtype=np.float64) / 2.0) ** 2
+        n_shells = len(limits) + 1
+        max_radius = radii_rad[-1]
+
+        by_lat = np.argsort(lat, kind="stable")
+        lon, lat = lon[by_lat], lat[by_lat]
+        cos_lat = np.cos(lat)
+
+        cells_per_block = max(1, min(len(lon), CELLS_PER_BLOCK, CHUNK_ELEMS))
+        features_per_block = max(1, CHUNK_ELEMS // cells_per_block)
+
+        result = {}
+        for name, start, stop in self.groups:
+            shells = np.zeros((len(lon), n_shells), dtype=np.int64)
+            group_lat = self.lat[start:stop]
+
+            for c0 in range(0, len(lon), cells_per_block):
+                c1 = c0 + cells_per_block
+                clat = lat[c0:c1, None]
+                clon = lon[c0:c1, None]
+                ccos = cos_lat[c0:c1, None]
+                rows = np.arange(len(clat))[:, None] * n_shells
+
+                band = start + np.searchsorted(
+                    group_lat,
+                    [clat[0, 0] - max_radius, clat[-1, 0] + max_radius],
+                )
+
+                for f0 in range(band[0], band[1], features_per_block):
+                    f1 = min(f0 + features_per_block, band[1])
+                    hav = (
+                        np.sin((self.lat[f0:f1] - clat) / 2.0) ** 2
+                        + ccos * self.cos_lat[f0:f1]
+                        * np.sin((self.lon[f0:f1] - clon) / 2.0) ** 2
+                    )
+                    if len(limits) == 1:
+                        shells[c0:c1, 0] += np.count_nonzero(hav <= limits[0], axis=1)
+                        continue
+                    shell = np.searchsorted(limits, hav.ravel(), side="left")
+                    shells[c0:c1] += np.bincount(
+                        (shell.reshape(hav.shape) + rows).ravel(),
+                        minlength=len(clat) * n_shells,
+                    ).reshape(len(clat), n_shells)
+
+            counts = np.empty((len(limits), len(lon)), dtype=np.int64)
+            counts[:, by_lat] = np.cumsum(shells[:, :-1], axis=1).T
+            result[name] = counts
+
+        return result
+
+
+# -----------------------------
+# Engine used by bds_query
+# -----------------------------
+class VectorEngine:
+
+    def __init__(self, db):
+        self.db = db
+        self.layers = {}
+
+    def layer(self, collection):
+        if collection not in self.layers:
+            self.layers[collection] = CentroidLayer(*load_centroids(self.db, collection))
+        return self.layers[collection]
+
+    def tally_points(self, points, radius_rad, collections):
+        points = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        lon, lat = points[:, 0], points[:, 1]
+
+        per_layer = {
+            c: self.layer(c).counts(lon, lat, radius_rad)
+            for c in collections
+        }
+        return [
+            {
+                c: {name: int(n[i]) for name, n in per_layer[c].items() if n[i]}
+                for c in collections
+            }
+            for i in range(len(lon))
+        ]
+
+    def tally_points_radii(self, points, radii_rad, collections):
+        """
+        Per-radius lists of per-point tallies, radii ascending.
+        """
+        points = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        lon, lat = points[:, 0], points[:, 1]
+
+        per_layer = {
+            c: self.layer(c).counts_radii(lon, lat, radii_rad)
+            for c in collections
+        }
+        return [
+            [
+                {
+                    c: {name: int(n[j, i]) for name, n in per_layer[c].items() if n[j, i]}
+                    for c in collections
+                }
+                for i in range(len(lon))
+            ]
+            for j in range(len(radii_rad))
+        ]
+
+
+_ENGINES = {}
+
+
+def engine_for(db):
+    key = engine_key(db)
+    if key not in _ENGINES:
+        _ENGINES[key] = VectorEngine(db)
+    return _ENGINES[key]
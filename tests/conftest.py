@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bds_synth  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def synth_db():
+    """
+    Synthetic mongomock dataset shared by the tests; the engines cache
+    per database name, so it gets a name of its own.
+    """
+    return bds_synth.mock_db(8000, seed=7, name="bds_test_synth")
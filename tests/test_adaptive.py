@@ -0,0 +1,30 @@
+import pytest
+
+import bds_adaptive
+import bds_indices
+from bds_query import BBOX
+
+
+@pytest.mark.parametrize("budget", [60, 400])
+def test_refine_tiles_bbox_within_budget(synth_db, budget):
+    index = bds_indices.INDICES["UDI"]
+    rows, scored = bds_adaptive.refine(synth_db, index, "numpy", budget=budget, bbox=BBOX)
+
+    assert scored <= budget
+    # Leaves cover the coarse grid exactly once
+    coarse = bds_adaptive.coarse_cells(bbox=BBOX)
+    area = sum(row["size"] ** 2 for row in rows)
+    assert area == pytest.approx(sum(c.size ** 2 for c in coarse))
+    assert len({tuple(row["center"]) for row in rows}) == len(rows)
+    if budget == 400:
+        assert min(row["size"] for row in rows) < bds_adaptive.COARSE_STEP
+
+
+def test_refined_rows_match_numpy_scores(synth_db):
+    index = bds_indices.INDICES["UDI"]
+    rows, _ = bds_adaptive.refine(synth_db, index, "numpy", budget=200, bbox=BBOX)
+
+    expected = bds_indices.compute(synth_db, index, [row["center"] for row in rows], "numpy")
+    for row, direct in zip(rows, expected):
+        assert row[index.name] == direct[index.name]
+    assert rows == index.rank(list(rows))
@@ -0,0 +1,46 @@
+import pytest
+
+import bds_bench
+import bds_cube
+
+
+def test_mock_data_defaults_to_an_in_process_engine():
+    assert bds_bench.resolve_engine("mock:1000") == "numpy"
+    assert bds_bench.resolve_engine("mock:1000", "raster") == "raster"
+    assert bds_bench.resolve_engine("mongo:mongodb://localhost#bench") == "aggregate"
+
+
+@pytest.mark.parametrize("engine", ["aggregate", "count", "cells"])
+def test_mock_data_rejects_server_side_engines(engine):
+    with pytest.raises(ValueError, match="mongo:<uri>"):
+        bds_bench.resolve_engine("mock:1000", engine)
+
+
+def test_cube_on_mock_data_needs_a_local_source(monkeypatch):
+    monkeypatch.setattr(bds_cube, "CUBE_SOURCE", "aggregate")
+    with pytest.raises(ValueError):
+        bds_bench.resolve_engine("mock:1000", "cube")
+
+    monkeypatch.setattr(bds_cube, "CUBE_SOURCE", "local")
+    assert bds_bench.resolve_engine("mock:1000", "cube") == "cube"
+
+
+def test_default_mock_run_has_no_errors(synth_db):
+    engine = bds_bench.resolve_engine("mock:8000")
+    for name in ("UDI", "HAI"):
+        case = bds_bench.run_case(synth_db, name, 9, engine)
+        assert "error" not in case and case["cells"] == 9
+
+
+def test_compare_prints_a_dash_for_zero_wall_time(capsys):
+    run = {"cases": [{"index": "UDI", "cells": 9, "wall_s": 0.0},
+                     {"index": "HAI", "cells": 9, "wall_s": 0.5}]}
+    baseline = {"cases": [{"index": "UDI", "cells": 9, "wall_s": 0.2},
+                          {"index": "HAI", "cells": 9, "wall_s": 1.0}]}
+    rows = bds_bench.compare(run, baseline)
+    assert [row[4] for row in rows] == [None, 2.0]
+
+    for row in rows:
+        bds_bench.print_comparison(row)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].endswith(" -") and lines[1].endswith("x2.00")
@@ -0,0 +1,59 @@
+import mongomock
+
+import bds_cache
+import bds_query
+
+
+def test_tally_cache_keys_on_geo_field(tmp_path, monkeypatch):
+    cache = bds_cache.QueryCache(str(tmp_path / "queries.sqlite"))
+    monkeypatch.setattr(cache, "version", lambda db, collection: "v1")
+
+    class Db:
+        name = "bds_test_cache"
+
+    calls = []
+
+    def compute(db, points, radius_rad, collections, fclasses=None):
+        calls.append(bds_query.GEO_FIELD)
+        n = 1 if bds_query.GEO_FIELD == "geometry" else 2
+        return [{c: {"building": n} for c in collections} for _ in points]
+
+    points = [[76.95, 11.02]]
+    monkeypatch.setattr(bds_query, "GEO_FIELD", "geometry")
+    assert cache.tally_points(Db, points, 0.0003, ["buildings"], compute) == [{"buildings": {"building": 1}}]
+
+    monkeypatch.setattr(bds_query, "GEO_FIELD", "centroid")
+    assert cache.tally_points(Db, points, 0.0003, ["buildings"], compute) == [{"buildings": {"building": 2}}]
+
+    monkeypatch.setattr(bds_query, "GEO_FIELD", "geometry")
+    assert cache.tally_points(Db, points, 0.0003, ["buildings"], compute) == [{"buildings": {"building": 1}}]
+    assert calls == ["geometry", "centroid"]
+
+
+def test_in_place_update_invalidates_after_ttl(tmp_path, monkeypatch):
+    db = mongomock.MongoClient()["bds_test_cache_versions"]
+    db.buildings.insert_one({"properties": {"fclass": "building"}})
+    cache = bds_cache.QueryCache(str(tmp_path / "queries.sqlite"))
+
+    calls = []
+
+    def compute(db, points, radius_rad, collections, fclasses=None):
+        calls.append(len(points))
+        return [{c: {"building": len(calls)} for c in collections} for _ in points]
+
+    def tally():
+        return cache.tally_points(db, [[76.95, 11.02]], 0.0003, ["buildings"], compute)
+
+    assert tally() == [{"buildings": {"building": 1}}]
+
+    # Same count and newest _id: only the write counter moves
+    db.buildings.update_one({}, {"$set": {"properties.fclass": "house"}})
+    bds_query.bump_version(db, "buildings")
+
+    monkeypatch.setattr(bds_cache, "VERSION_TTL_S", 3600)
+    assert tally() == [{"buildings": {"building": 1}}]
+
+    monkeypatch.setattr(bds_cache, "VERSION_TTL_S", 0)
+    assert tally() == [{"buildings": {"building": 2}}]
+    assert tally() == [{"buildings": {"building": 2}}]
+    assert calls == [1, 1]
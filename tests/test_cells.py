@@ -0,0 +1,63 @@
+import mongomock
+import numpy as np
+import pytest
+
+import bds_synth
+import bds_vector
+from bds_cells import PRECISION, CellCounts, CellEngine, decode, encode
+from bds_query import EARTH_RADIUS_KM
+from bds_run import bbox_grid
+
+
+def test_encode_known_cell():
+    assert encode(-5.6, 42.6, 5) == ["ezs42"]
+    # Arrays encode element-wise, with the same cells as scalars
+    assert encode([76.9558, -5.6], [11.0168, 42.6], 5) == [encode(76.9558, 11.0168, 5)[0], "ezs42"]
+
+
+def test_decode_is_the_cell_centre():
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(76.85, 77.05, 500)
+    lat = rng.uniform(10.95, 11.10, 500)
+    for precision in (5, 7, 9):
+        cells = encode(lon, lat, precision)
+        c_lon, c_lat = decode(cells)
+        lon_bits, lat_bits = (5 * precision + 1) // 2, 5 * precision // 2
+        assert np.all(np.abs(c_lon - lon) <= 180.0 / (1 << lon_bits))
+        assert np.all(np.abs(c_lat - lat) <= 90.0 / (1 << lat_bits))
+        # A centre encodes back to its own cell, and prefixes are parents
+        assert encode(c_lon, c_lat, precision) == cells
+        assert [c[:precision - 1] for c in cells] == encode(lon, lat, precision - 1)
+
+
+def test_cell_tally_matches_numpy_at_cell_centres():
+    # Features placed on cell centres: the cell rule is then exact
+    rng = np.random.default_rng(1)
+    features = bds_synth.layer_chunk(rng, "pois_area", 2000, 1)
+    points = np.array([f["geometry"]["coordinates"][0][0] for f in features])
+    cells = encode(points[:, 0], points[:, 1], PRECISION)
+    lon, lat = decode(cells)
+
+    db = mongomock.MongoClient()["bds_test_cells_points"]
+    counts = {}
+    for f, cell, x, y in zip(features, cells, lon, lat):
+        f["geometry"] = {"type": "Point", "coordinates": [float(x), float(y)]}
+        fclass = f["properties"]["fclass"]
+        counts.setdefault(cell, {})
+        counts[cell][fclass] = counts[cell].get(fclass, 0) + 1
+    db.pois_area.insert_many(features)
+
+    layer = CellCounts(counts)
+    centres = bbox_grid(0.04, (76.88, 10.97, 77.02, 11.08))
+    for radius_km in (1.5, 3):
+        radius_rad = radius_km / EARTH_RADIUS_KM
+        expected = bds_vector.VectorEngine(db).tally_points(centres, radius_rad, ["pois_area"])
+        assert [{"pois_area": layer.tally(p, radius_rad)} for p in centres] == expected
+        assert any(row["pois_area"] for row in expected)
+
+
+def test_engine_refuses_unstamped_layers():
+    db = mongomock.MongoClient()["bds_test_cells_unstamped"]
+    db.buildings.insert_many([{"geohash": "tf2yq6z1"}, {"properties": {"fclass": "building"}}])
+    with pytest.raises(RuntimeError, match="bds_cells.py stamp"):
+        CellEngine(db).tally_points([[76.95, 11.02]], 0.0003, ["buildings"])
@@ -0,0 +1,21 @@
+import bds_cube
+import bds_query
+
+
+def test_cube_rejects_other_geo_field(tmp_path, monkeypatch):
+    path = str(tmp_path / "cube.json")
+    monkeypatch.setattr(bds_query, "data_version", lambda db, collections: "v1")
+
+    class Db:
+        name = "bds_test_cube"
+
+    monkeypatch.setattr(bds_query, "GEO_FIELD", "geometry")
+    cube = bds_cube.Cube("v1", {("76.950000,11.020000", "2.000000"): {"buildings": {"building": 5}}})
+    cube.save(path)
+    assert bds_cube.Cube.load(path).geo_field == "geometry"
+    assert bds_cube.CubeEngine(Db, path).current().entries == cube.entries
+
+    monkeypatch.setattr(bds_query, "GEO_FIELD", "centroid")
+    fresh = bds_cube.CubeEngine(Db, path).current()
+    assert fresh.entries == {}
+    assert fresh.geo_field == "centroid"
@@ -0,0 +1,63 @@
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+import bds_executor
+
+
+class InFlight:
+    """
+    Counts concurrent calls and keeps the highest count seen.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.now = 0
+        self.peak = 0
+
+    def enter(self):
+        with self.lock:
+            self.now += 1
+            self.peak = max(self.peak, self.now)
+
+    def leave(self):
+        with self.lock:
+            self.now -= 1
+
+
+@pytest.mark.parametrize("workers", [1, 3, 8])
+def test_map_ordered_keeps_order_and_bounds_work(workers):
+    rng = random.Random(workers)
+    delays = [rng.uniform(0, 0.01) for _ in range(40)]
+    flight = InFlight()
+
+    def work(i):
+        flight.enter()
+        time.sleep(delays[i])
+        flight.leave()
+        return i * i
+
+    assert bds_executor.map_ordered(work, range(40), workers) == [i * i for i in range(40)]
+    assert flight.peak <= workers
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_async_map_keeps_order_and_bounds_work(workers):
+    rng = random.Random(workers)
+    delays = [rng.uniform(0, 0.01) for _ in range(40)]
+    flight = InFlight()
+
+    async def work(i):
+        flight.enter()
+        await asyncio.sleep(delays[i])
+        flight.leave()
+        return -i
+
+    results = bds_executor.run_on_loop(
+        bds_executor._map_ordered_async(work, list(range(40)), workers)
+    )
+    assert results == [-i for i in range(40)]
+    assert 1 <= flight.peak <= workers
@@ -0,0 +1,18 @@
+import pytest
+
+pytest.importorskip("shapely")
+
+import bds_flood  # noqa: E402
+
+
+def test_near_water_streamed_chunks_match(synth_db):
+    water = [w["geometry"] for w in synth_db.water.find({}, {"geometry": 1})]
+    zone = bds_flood.flood_zone(water, 1.5)
+
+    whole = bds_flood.near_water(synth_db, zone, workers=1)
+    streamed = bds_flood.near_water(synth_db, zone, chunk_size=97, workers=2,
+                                    keep=("buildings",))
+
+    assert streamed["roads"] == whole["roads"]
+    assert [d["_id"] for d in streamed["buildings"]] == whole["buildings"]
+    assert all("geometry" in d for d in streamed["buildings"])
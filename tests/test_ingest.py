@@ -0,0 +1,85 @@
+import json
+
+import mongomock
+import pytest
+
+import bds_ingest
+from bds_ingest import fix_geometry, iter_feature_collection
+
+
+def _collection(n):
+    return {
+        "type": "FeatureCollection",
+        "name": "buildings",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"osm_id": str(i), "fclass": "building"},
+                "geometry": {"type": "Point", "coordinates": [76.9 + i * 1e-3, 11.0]},
+            }
+            for i in range(n)
+        ],
+    }
+
+
+def test_feature_collection_every_block_boundary(tmp_path):
+    data = _collection(5)
+    path = tmp_path / "layer.geojson"
+    text = json.dumps(data)
+    path.write_text(text)
+
+    header = text.index("[", text.index('"features"')) + 1
+    for block_size in range(1, header + 8):
+        assert list(iter_feature_collection(str(path), block_size)) == data["features"]
+
+
+def test_make_valid_keeps_every_polygonal_part():
+    pytest.importorskip("shapely")
+    from shapely.geometry import shape
+
+    # Two squares joined by a zero-width spike: repair yields two
+    # polygons plus the spike as a line
+    bowtie = {
+        "type": "Polygon",
+        "coordinates": [[
+            [0, 0], [1, 0], [1, 1], [0, 1], [0, 0.5], [3, 0.5], [3, 0],
+            [4, 0], [4, 1], [3, 1], [3, 0.5], [0, 0.5], [0, 0],
+        ]],
+    }
+    fixed = fix_geometry(bowtie)
+
+    assert fixed["type"] == "MultiPolygon"
+    assert shape(fixed).is_valid
+    assert shape(fixed).area == pytest.approx(2.0)
+
+
+def test_make_valid_rejects_collapsed_polygon():
+    pytest.importorskip("shapely")
+    collapsed = {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [2, 0], [0, 0]]]}
+    assert fix_geometry(collapsed) is None
+
+
+def test_drop_once_then_index_before_insert(tmp_path, monkeypatch):
+    db = mongomock.MongoClient()["bds_test_ingest"]
+    db.buildings.insert_one({"stale": True})
+
+    paths = []
+    for i, n in enumerate((3, 4)):
+        path = tmp_path / f"gis_osm_buildings_a_free_{i}.geojsonl"
+        path.write_text("".join(json.dumps(f) + "\n" for f in _collection(n)["features"]))
+        paths.append(str(path))
+
+    indexed_at = []
+
+    def ensure_indexes(db, collections):
+        indexed_at.extend(db[c].count_documents({}) for c in collections)
+
+    monkeypatch.setattr(bds_ingest, "ensure_indexes", ensure_indexes)
+    results = bds_ingest.ingest_all(db, paths, drop=True)
+
+    assert [name for name, _, _ in results] == ["buildings", "buildings"]
+    assert [stats["inserted"] for _, _, stats in results] == [3, 4]
+    assert db.buildings.count_documents({}) == 7
+    assert db.buildings.count_documents({"stale": True}) == 0
+    # Indexes exist before each file's first insert
+    assert indexed_at == [0, 3]
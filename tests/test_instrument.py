@@ -0,0 +1,109 @@
+import json
+from types import SimpleNamespace
+
+import bds_instrument
+
+ADDRESS = ("shard-00-01.example.net", 27017)
+
+
+def _circle(lon, lat):
+    return {
+        "geometry": {"$geoWithin": {"$centerSphere": [[lon, lat], 0.0003]}},
+        "properties.fclass": {"$in": ["hospital", "bank"]},
+    }
+
+
+def _run(listener, request_id, command, seconds, reply):
+    name = next(iter(command))
+    event = SimpleNamespace(
+        command_name=name, command=command, database_name="bigdata_spatial",
+        connection_id=ADDRESS, request_id=request_id,
+        duration_micros=int(seconds * 1e6), reply=reply,
+    )
+    listener.started(event)
+    if reply is None:
+        listener.failed(event)
+    else:
+        listener.succeeded(event)
+
+
+def _listener():
+    listener = bds_instrument.QueryListener()
+    _run(listener, 1, {"find": "pois_area", "filter": _circle(76.95, 11.01)}, 0.004,
+         {"cursor": {"firstBatch": [{"_id": 1}, {"_id": 2}]}, "ok": 1})
+    _run(listener, 2, {"find": "pois_area", "filter": _circle(76.96, 11.02)}, 0.3,
+         {"cursor": {"firstBatch": []}, "ok": 1})
+    _run(listener, 3, {"count": "buildings", "query": _circle(76.95, 11.01)}, 0.02, None)
+    _run(listener, 4, {"ping": 1}, 0.001, {"ok": 1})
+    return listener
+
+
+def test_shape_hides_values_keeps_operators():
+    assert bds_instrument.shape(_circle(76.95, 11.01)) == {
+        "geometry": {"$geoWithin": {"$centerSphere": "?"}},
+        "properties.fclass": {"$in": "?"},
+    }
+    assert bds_instrument.shape(_circle(76.95, 11.01)) == bds_instrument.shape(_circle(77.0, 10.9))
+    pipeline = [{"$match": {"x": 1}}, {"$group": {"_id": "$f", "n": {"$sum": 1}}}]
+    assert bds_instrument.shape(pipeline) == [
+        {"$match": {"x": "?"}}, {"$group": {"_id": "?", "n": {"$sum": "?"}}},
+    ]
+
+
+def test_listener_groups_by_command_and_shape():
+    listener = _listener()
+    assert listener.queries == 3
+    find = listener.series[("find", "pois_area")]
+    assert find["count"] == 2 and len(find["shapes"]) == 1
+    assert listener.series[("count", "buildings")]["failed"] == 1
+    assert listener.slowest(1)[0]["seconds"] == 0.3
+    assert listener.slowest(1)[0]["address"] == ADDRESS
+
+
+def test_prometheus_text_histograms_are_cumulative():
+    text = bds_instrument.prometheus_text(_listener())
+    lines = dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+    labels = 'command="find",collection="pois_area"'
+    assert lines[f'bds_query_duration_seconds_bucket{{{labels},le="0.005"}}'] == "1"
+    assert lines[f'bds_query_duration_seconds_bucket{{{labels},le="0.25"}}'] == "1"
+    assert lines[f'bds_query_duration_seconds_bucket{{{labels},le="0.5"}}'] == "2"
+    assert lines[f'bds_query_duration_seconds_bucket{{{labels},le="+Inf"}}'] == "2"
+    assert lines[f"bds_query_duration_seconds_count{{{labels}}}"] == "2"
+    assert float(lines[f"bds_query_duration_seconds_sum{{{labels}}}"]) == 0.304
+    assert lines['bds_query_failed_total{command="count",collection="buildings"}'] == "1"
+    assert "# TYPE bds_query_duration_seconds histogram" in text
+
+
+def test_report_explains_on_the_answering_server(monkeypatch):
+    seen = []
+
+    def fake_explain(client, record):
+        seen.append((client, record["command"]))
+        return {"index": "geometry_2dsphere", "keys_examined": 10, "docs_examined": 4}
+
+    monkeypatch.setattr(bds_instrument, "explain", fake_explain)
+    data = bds_instrument.report(_listener(), lambda record: record["address"], n=2)
+
+    assert data["queries"] == 3
+    assert [row["seconds"] for row in data["slowest"]] == [0.3, 0.02]
+    assert all("body" not in row for row in data["slowest"])
+    assert data["slowest"][0]["plan"]["index"] == "geometry_2dsphere"
+    assert seen == [(ADDRESS, "find"), (ADDRESS, "count")]
+    series = {(s["command"], s["collection"]): s for s in data["series"]}
+    assert series[("find", "pois_area")]["shapes"][0]["count"] == 2
+    json.dumps(data)
+
+    assert "plan" not in bds_instrument.report(_listener())["slowest"][0]
+
+
+def test_server_client_keeps_credentials_and_tls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(bds_instrument, "MongoClient", lambda *a, **kw: calls.append((a, kw)))
+    bds_instrument.server_client(
+        ADDRESS, "mongodb://user:secret@h1:27017,h2:27017/?tls=true&replicaSet=rs0&authSource=admin",
+    )
+    assert calls == [(ADDRESS, {
+        "directConnection": True, "tls": True, "authSource": "admin",
+        "username": "user", "password": "secret",
+    })]
@@ -0,0 +1,55 @@
+import mongomock
+import numpy as np
+
+import bds_synth
+from bds_local import iter_vertices
+from bds_query import EARTH_RADIUS_KM, tally_grid
+from bds_run import bbox_grid
+
+COLLECTIONS = ["buildings", "roads", "pois_area", "water"]
+BBOX = (76.88, 10.97, 77.02, 11.08)
+
+
+def _within(geometry, point, radius_rad):
+    """
+    The $geoWithin rule, one feature at a time: every vertex inside.
+    """
+    lon, lat = np.radians(np.array(list(iter_vertices(geometry)))).T
+    lon0, lat0 = np.radians(point)
+    hav = (
+        np.sin((lat - lat0) / 2.0) ** 2
+        + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2.0) ** 2
+    )
+    return bool((hav <= np.sin(radius_rad / 2.0) ** 2).all())
+
+
+def test_local_matches_brute_force_containment(synth_db):
+    points = bbox_grid(0.05, BBOX)
+    radius_rad = 1.5 / EARTH_RADIUS_KM
+    local = tally_grid(synth_db, points, radius_rad, COLLECTIONS, "local")
+
+    for collection in COLLECTIONS:
+        docs = list(synth_db[collection].find())
+        for point, tally in zip(points, local):
+            expected = {}
+            for doc in docs:
+                if _within(doc["geometry"], point, radius_rad):
+                    fclass = doc["properties"]["fclass"]
+                    expected[fclass] = expected.get(fclass, 0) + 1
+            assert tally[collection] == expected
+    assert any(tally["buildings"] for tally in local)
+
+
+def test_local_matches_numpy_on_points():
+    db = mongomock.MongoClient()["bds_test_local_points"]
+    rng = np.random.default_rng(5)
+    features = bds_synth.layer_chunk(rng, "pois_area", 2000, 1)
+    for f in features:
+        f["geometry"] = {"type": "Point", "coordinates": f["geometry"]["coordinates"][0][0]}
+    db.pois_area.insert_many(features)
+
+    points = bbox_grid(0.04, BBOX)
+    for radius_km in (0.8, 2, 3.5):
+        radius_rad = radius_km / EARTH_RADIUS_KM
+        assert tally_grid(db, points, radius_rad, ["pois_area"], "local") == \
+            tally_grid(db, points, radius_rad, ["pois_area"], "numpy")
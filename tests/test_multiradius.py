@@ -0,0 +1,21 @@
+import pytest
+
+from bds_query import EARTH_RADIUS_KM, tally_grid, tally_grid_radii
+from bds_run import bbox_grid
+
+COLLECTIONS = ["buildings", "roads", "pois_area", "water"]
+# Radius 0 and a duplicate included on purpose
+RADII_KM = [3, 0, 1.5, 2.25, 1.5]
+
+
+@pytest.mark.parametrize("engine", ["local", "numpy"])
+def test_radii_match_per_radius_tally_grid(synth_db, engine):
+    points = bbox_grid(0.05, (76.88, 10.97, 77.02, 11.08))
+    radii_rad = [r / EARTH_RADIUS_KM for r in RADII_KM]
+
+    per_radius = tally_grid_radii(synth_db, points, radii_rad, COLLECTIONS, engine)
+
+    assert list(per_radius) == sorted(set(radii_rad))
+    for radius_rad, tallies in per_radius.items():
+        assert tallies == tally_grid(synth_db, points, radius_rad, COLLECTIONS, engine)
+    assert any(tally["buildings"] for tally in per_radius[1.5 / EARTH_RADIUS_KM])
@@ -0,0 +1,34 @@
+import json
+
+import bds_profile
+
+
+def test_nested_stage_keeps_the_outer_peak(tmp_path, monkeypatch):
+    monkeypatch.setattr(bds_profile, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(bds_profile, "_SEEN", {})
+
+    with bds_profile.stage("outer"):
+        block = bytearray(20_000_000)
+        del block
+        with bds_profile.stage("inner"):
+            small = bytearray(1_000_000)
+            del small
+        with bds_profile.stage("inner"):
+            with bds_profile.stage("deep"):
+                block = bytearray(8_000_000)
+                del block
+
+    peaks = {
+        s["stage"]: s["peak_traced_mb"]
+        for s in json.loads((tmp_path / "stages.json").read_text())
+    }
+    assert set(peaks) == {"outer", "inner", "inner-2", "deep"}
+    assert peaks["outer"] >= 20
+    assert 1 <= peaks["inner"] < 20
+    assert 8 <= peaks["deep"] <= peaks["inner-2"] < 20
+    assert (tmp_path / "outer.prof").exists() and not (tmp_path / "inner.prof").exists()
+
+
+def test_stage_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(bds_profile, "PROFILE_DIR", None)
+    assert bds_profile.stage("fetch") is bds_profile._OFF
@@ -0,0 +1,51 @@
+import bds_executor
+import bds_indexes
+import bds_query
+
+
+def test_fclass_filter_only_when_every_entry_filters():
+    spec = {
+        "hospitals": ("pois_area", ["hospital"]),
+        "fire": ("pois_area", ["fire_station", "hospital"]),
+        "roads": ("roads", None),
+        "malls": ("buildings", ["mall"]),
+        "buildings": ("buildings", None),
+    }
+    assert bds_query.fclass_filter(spec) == {"pois_area": ["fire_station", "hospital"]}
+
+
+def test_count_grid_pushes_fclass_into_branch_match(monkeypatch):
+    sent = []
+
+    def run_jobs(db, jobs, *args, **kwargs):
+        sent.extend(jobs)
+        return [[{"cell": 0, "coll": "pois_area", "_id": "hospital", "n": 4},
+                 {"cell": 0, "coll": "roads", "_id": "primary", "n": 9}]]
+
+    monkeypatch.setattr(bds_executor, "run_jobs", run_jobs)
+    spec = {"hospitals": ("pois_area", ["hospital"]), "roads": ("roads", None)}
+
+    counts = bds_query.count_grid(None, [[76.95, 11.02]], 0.0005, spec, "aggregate")
+
+    assert counts == [{"hospitals": 4, "roads": 9}]
+    (collection, kind, pipeline), = sent
+    matches = [pipeline[0]["$match"]] + [
+        stage["$unionWith"]["pipeline"][0]["$match"]
+        for stage in pipeline if "$unionWith" in stage
+    ]
+    by_collection = dict(zip(["pois_area", "roads"], matches))
+    assert by_collection["pois_area"]["properties.fclass"] == "hospital"
+    assert "properties.fclass" not in by_collection["roads"]
+
+
+def test_index_names_ignores_rejected_plans():
+    plan = {
+        "queryPlanner": {
+            "winningPlan": {"inputStage": {"indexName": "fclass_geometry"}},
+            "rejectedPlans": [{"inputStage": {"indexName": "geometry_2dsphere"}}],
+        },
+        "executionStats": {"totalKeysExamined": 12, "totalDocsExamined": 3, "nReturned": 3},
+    }
+    assert list(bds_indexes.index_names(plan)) == ["fclass_geometry"]
+    assert bds_indexes.plan_total(plan, "totalKeysExamined") == 12
+    assert bds_indexes.execution_stats(plan)["nReturned"] == 3
@@ -0,0 +1,94 @@
+import mongomock
+import numpy as np
+import pytest
+
+import bds_indices
+import bds_raster
+import bds_synth
+from bds_query import EARTH_RADIUS_KM, count_grid, select, tally_grid
+from bds_run import bbox_grid
+
+RADII_KM = [1.5, 2, 3, 4]
+COLLECTIONS = ["buildings", "roads", "pois_area", "water"]
+
+# Centres strictly inside the raster bbox
+INNER_BBOX = (76.86, 10.96, 77.04, 11.09)
+
+
+def _specs():
+    return [index.spec() for index in bds_indices.INDICES.values()]
+
+
+def _totals(tally):
+    return {c: sum(by_fclass.values()) for c, by_fclass in tally.items()}
+
+
+def test_raster_matches_numpy_engine(synth_db):
+    points = bbox_grid(0.04, INNER_BBOX)
+    for radius_km in RADII_KM:
+        radius_rad = radius_km / EARTH_RADIUS_KM
+        raster = tally_grid(synth_db, points, radius_rad, COLLECTIONS, "raster")
+        numpy = tally_grid(synth_db, points, radius_rad, COLLECTIONS, "numpy")
+
+        for r, n in zip(raster, numpy):
+            assert _totals(r) == _totals(n)
+            for spec in _specs():
+                if all(c in COLLECTIONS for c, _ in spec.values()):
+                    assert select(r, spec) == select(n, spec)
+
+
+def test_raster_matches_local_engine_on_points():
+    # Point features: centroid and containment agree, so raster == local
+    db = mongomock.MongoClient()["bds_test_raster_points"]
+    rng = np.random.default_rng(3)
+    features = bds_synth.layer_chunk(rng, "pois_area", 3000, 1)
+    for f in features:
+        f["geometry"] = {"type": "Point", "coordinates": f["geometry"]["coordinates"][0][0]}
+    db.pois_area.insert_many(features)
+
+    points = bbox_grid(0.04, INNER_BBOX)
+    for radius_km in RADII_KM:
+        radius_rad = radius_km / EARTH_RADIUS_KM
+        raster = tally_grid(db, points, radius_rad, ["pois_area"], "raster")
+        local = tally_grid(db, points, radius_rad, ["pois_area"], "local")
+
+        for r, l in zip(raster, local):
+            assert _totals(r) == _totals(l)
+            for spec in _specs():
+                if all(c == "pois_area" for c, _ in spec.values()):
+                    assert select(r, spec) == select(l, spec)
+
+
+def test_raster_planes_only_for_common_fclasses(synth_db):
+    layer = bds_raster.engine_for(synth_db).layer("roads")
+    sizes = {n: synth_db.roads.count_documents({"properties.fclass": n})
+             for n in layer.fclass_names}
+
+    planed = {layer.fclass_names[c] for c in layer.plane_codes}
+    assert planed == {n for n, size in sizes.items() if size >= bds_raster.PLANE_MIN}
+    assert layer.sat.dtype == np.int32
+    assert layer.sat.shape[0] == len(planed)
+
+
+@pytest.mark.parametrize("plane_min", [1, 200, 10 ** 9])
+def test_raster_counts_fclasses_outside_the_specs(synth_db, plane_min, monkeypatch):
+    # Not an index spec: every fclass must keep its own exact count
+    spec = {
+        "schools": ("pois_area", ["school"]),
+        "worship": ("pois_area", ["place_of_worship"]),
+        "footways": ("roads", ["footway", "service"]),
+        "wetland": ("water", ["wetland"]),
+    }
+    monkeypatch.setattr(bds_raster, "PLANE_MIN", plane_min)
+    monkeypatch.setitem(bds_raster._ENGINES, synth_db.name, bds_raster.RasterEngine(synth_db))
+
+    points = bbox_grid(0.04, INNER_BBOX)
+    radius_rad = 2 / EARTH_RADIUS_KM
+    raster = count_grid(synth_db, points, radius_rad, spec, "raster")
+    assert raster == count_grid(synth_db, points, radius_rad, spec, "numpy")
+    assert any(row["schools"] for row in raster)
+
+    tallies = tally_grid(synth_db, points, radius_rad, ["roads"], "raster")
+    assert set().union(*tallies[0].values()) <= set(
+        synth_db.roads.distinct("properties.fclass")
+    )
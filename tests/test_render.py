@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+shapely = pytest.importorskip("shapely")
+pytest.importorskip("folium")
+
+import bds_render  # noqa: E402
+
+
+def _wiggly_line(n=2000):
+    lon = np.linspace(76.90, 77.00, n)
+    lat = 11.0 + 1e-6 * np.sin(np.arange(n))
+    return {"type": "LineString", "coordinates": np.column_stack([lon, lat]).tolist()}
+
+
+def test_simplify_by_zoom_band():
+    assert bds_render.pixel_degrees(0) == 360.0 / 256
+    line = shapely.geometry.shape(_wiggly_line())
+    coarse, fine = (
+        shapely.get_num_coordinates(bds_render.simplify(np.array([line]), zoom))[0]
+        for zoom in (12, 20)
+    )
+    assert coarse == 2 < fine
+
+    # Output coordinates are rounded to DECIMALS
+    coords = shapely.get_coordinates(bds_render.simplify(np.array([line]), 20))
+    assert np.array_equal(coords, np.round(coords, bds_render.DECIMALS))
+
+
+def test_feature_collection_drops_missing_geometries():
+    shapes = np.array([shapely.Point(77.0, 11.0), None, shapely.Point(77.1, 11.1)], dtype=object)
+    fc = bds_render.feature_collection(shapes, [{"kind": "a"}, {"kind": "b"}, {"kind": "c"}])
+    assert [f["properties"]["kind"] for f in fc["features"]] == ["a", "c"]
+    assert fc["features"][0]["geometry"] == {"type": "Point", "coordinates": [77.0, 11.0]}
+
+
+def test_geojson_layer_has_one_collection_per_band():
+    m = bds_render.make_map([11.0, 76.95], 12)
+    geometries = [_wiggly_line(), {"type": "Point", "coordinates": [76.95, 11.0]}]
+    styles = {"road": {"color": "gray"}, "water": {"color": "blue"}}
+    bands = bds_render.add_geojson_layer(m, "Roads", geometries, ["road", "water"], styles)
+
+    assert [(low, high) for _, low, high in bands] == [(0, 14), (14, 16), (16, 99)]
+    html = m.get_root().render()
+    assert html.count('"kind": "road"') == len(bands)
+    assert "zoomend" in html
+
+
+def test_point_layer_is_one_rounded_array():
+    m = bds_render.make_map([11.0, 76.95], 12)
+    latlons = [[11.0123456789, 76.9512345678], [11.02, 76.96]]
+    cluster = bds_render.add_point_layer(m, "Buildings", latlons, "red")
+    assert cluster.data == [[11.012346, 76.951235], [11.02, 76.96]]
+    assert '"red"' in cluster.callback
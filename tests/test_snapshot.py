@@ -0,0 +1,34 @@
+import numpy as np
+
+import bds_local
+import bds_snapshot
+from bds_local import LAYER_COLLECTIONS, LocalEngine, load_layer
+from bds_query import EARTH_RADIUS_KM
+from bds_run import bbox_grid
+
+
+def test_snapshot_round_trip(synth_db, tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot")
+    manifest = bds_snapshot.export_snapshot(synth_db, path)
+
+    assert bds_snapshot.read_manifest(path) == manifest
+    assert set(manifest["layers"]) == set(LAYER_COLLECTIONS)
+
+    layers = bds_snapshot.open_snapshot(path)
+    for collection in LAYER_COLLECTIONS:
+        source = load_layer(synth_db, collection)
+        layer = layers[collection]
+        assert manifest["layers"][collection]["features"] == len(source) == len(layer)
+        assert layer.fclass_names == source.fclass_names
+        assert isinstance(layer.coords, np.memmap)
+        for column in ("coords", "offsets", "fclass"):
+            np.testing.assert_array_equal(getattr(layer, column), getattr(source, column))
+        np.testing.assert_array_equal(layer.centroids(), source.centroids())
+        np.testing.assert_array_equal(layer.bboxes(), source.bboxes())
+
+    # Engines read the snapshot without a database
+    points = bbox_grid(0.05, (76.88, 10.97, 77.02, 11.08))
+    radius_rad = 2 / EARTH_RADIUS_KM
+    expected = LocalEngine(synth_db).tally_points(points, radius_rad, LAYER_COLLECTIONS)
+    monkeypatch.setattr(bds_local, "SNAPSHOT_DIR", path)
+    assert LocalEngine(None).tally_points(points, radius_rad, LAYER_COLLECTIONS) == expected
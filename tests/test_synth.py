@@ -0,0 +1,99 @@
+import json
+
+import mongomock
+import numpy as np
+
+import bds_synth
+from bds_query import BBOX, VERSIONS_COLLECTION
+
+GEOMETRY_TYPES = {
+    "buildings": "Polygon",
+    "roads": "LineString",
+    "pois_area": "Polygon",
+    "water": "Polygon",
+}
+FCLASSES = {
+    "buildings": bds_synth.BUILDING_FCLASSES[0],
+    "roads": bds_synth.ROAD_FCLASSES[0],
+    "pois_area": bds_synth.POI_FCLASSES[0],
+    "water": bds_synth.WATER_FCLASSES[0],
+}
+
+
+def _coordinates(geometry):
+    if geometry["type"] == "Polygon":
+        return np.array(geometry["coordinates"][0])
+    return np.array(geometry["coordinates"])
+
+
+def test_layer_counts_follow_shares():
+    counts = bds_synth.layer_counts(10000)
+    assert counts == {"buildings": 7000, "roads": 2000, "pois_area": 900, "water": 100}
+    assert bds_synth.layer_counts(10)["water"] == 1
+
+
+def test_generate_schema_and_counts():
+    chunks = list(bds_synth.generate(5000, seed=1, chunk_size=1000))
+    by_layer = {}
+    for layer, features in chunks:
+        by_layer.setdefault(layer, []).extend(features)
+        assert len(features) <= 1000
+
+    assert {layer: len(f) for layer, f in by_layer.items()} == bds_synth.layer_counts(5000)
+    ids = [f["properties"]["osm_id"] for features in by_layer.values() for f in features]
+    assert len(set(ids)) == len(ids)
+
+    min_lon, min_lat, max_lon, max_lat = BBOX
+    for layer, features in by_layer.items():
+        assert {f["properties"]["fclass"] for f in features} <= set(FCLASSES[layer])
+        for f in features:
+            assert f["type"] == "Feature"
+            assert f["geometry"]["type"] == GEOMETRY_TYPES[layer]
+            coords = _coordinates(f["geometry"])
+            if f["geometry"]["type"] == "Polygon":
+                assert coords[0].tolist() == coords[-1].tolist()
+            else:
+                assert len(coords) >= 2
+
+        centres = np.array([_coordinates(f["geometry"]).mean(axis=0) for f in features])
+        # Water polygons can reach ~1 km past a centre clipped to the bbox
+        assert (centres[:, 0] > min_lon - 0.02).all() and (centres[:, 0] < max_lon + 0.02).all()
+        assert (centres[:, 1] > min_lat - 0.02).all() and (centres[:, 1] < max_lat + 0.02).all()
+
+    # Clustered: most buildings sit near the Gandhipuram core
+    lon, lat = np.array([_coordinates(f["geometry"])[0] for f in by_layer["buildings"]]).T
+    near = np.hypot(lon - 76.9558, lat - 11.0168) < 0.04
+    assert near.mean() > 0.3
+
+
+def test_generate_is_deterministic_by_seed():
+    first = list(bds_synth.generate(500, seed=3))
+    assert first == list(bds_synth.generate(500, seed=3))
+    assert first != list(bds_synth.generate(500, seed=4))
+
+
+def test_write_files(tmp_path):
+    written = bds_synth.write_files(1000, str(tmp_path), seed=2)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "buildings.geojsonl", "pois_area.geojsonl", "roads.geojsonl", "water.geojsonl",
+    ]
+    assert len(written) == 4
+
+    counts = bds_synth.layer_counts(1000)
+    for layer, count in counts.items():
+        lines = (tmp_path / f"{layer}.geojsonl").read_text().splitlines()
+        assert len(lines) == count
+        assert json.loads(lines[0])["geometry"]["type"] == GEOMETRY_TYPES[layer]
+
+
+def test_write_db_counts_and_versions():
+    db = mongomock.MongoClient()["bds_test_synth_write"]
+    counts = bds_synth.write_db(db, 2000, seed=5, indexes=False)
+    assert counts == bds_synth.layer_counts(2000)
+
+    versions = {doc["_id"]: doc["writes"] for doc in db[VERSIONS_COLLECTION].find()}
+    assert versions == {layer: 1 for layer in bds_synth.LAYER_SHARES}
+
+    bds_synth.write_db(db, 2000, seed=5, indexes=False)
+    assert db.buildings.count_documents({}) == counts["buildings"]
+    assert db[VERSIONS_COLLECTION].find_one({"_id": "buildings"})["writes"] == 2
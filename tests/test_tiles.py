@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+
+import bds_tiles
+
+
+def _pngs(directory):
+    return {
+        os.path.relpath(os.path.join(root, name), directory)
+        for root, _, names in os.walk(directory)
+        for name in names if name.endswith(".png")
+    }
+
+
+def test_rerender_drops_stale_tiles(tmp_path):
+    directory = str(tmp_path / "UDI")
+    values = np.arange(12, dtype=np.float64).reshape(3, 4)
+
+    wide = bds_tiles.Surface(76.85, 10.95, 0.05, values)
+    bds_tiles.export_tiles(wide, directory, 10, 12)
+    before = _pngs(directory)
+
+    narrow = bds_tiles.Surface(76.95, 11.00, 0.01, values + 1)
+    bds_tiles.export_tiles(narrow, directory, 11, 11)
+    after = _pngs(directory)
+
+    assert after and not any(p.startswith(("10" + os.sep, "12" + os.sep)) for p in after)
+    assert after != before
+    assert sorted(os.listdir(tmp_path)) == ["UDI"]
+
+
+def test_saved_map_resolves_tile_urls(tmp_path):
+    folium = pytest.importorskip("folium")
+    root = str(tmp_path / "tiles")
+    rows = [
+        {"center": [76.85 + 0.05 * i, 10.95 + 0.05 * j], "UDI": float(i + j)}
+        for i in range(5) for j in range(4)
+    ]
+
+    m = folium.Map(location=[11.0, 76.95], zoom_start=12, tiles=None)
+    bds_tiles.index_tile_layer(rows, "UDI", 0.05, root).add_to(m)
+    path = bds_tiles.save_map(m, "UDI", root)
+
+    assert os.path.dirname(path) == root
+    html = open(path).read()
+    assert '"UDI/{z}/{x}/{y}.png"' in html
+    # The pyramid sits where the relative URL points from the HTML file
+    tile = sorted(_pngs(os.path.join(root, "UDI")))[0]
+    assert os.path.exists(os.path.join(os.path.dirname(path), "UDI", tile))
@@ -0,0 +1,29 @@
+import pytest
+
+import bds_indices
+import bds_raster
+import bds_topk
+from bds_query import BBOX
+
+
+def test_raster_start_step_keeps_bounds_countable():
+    index = bds_indices.INDICES["HAI"]
+    step = bds_topk.covered_step(index.radius_km, bds_topk.COARSE_STEP, BBOX,
+                                 bds_topk.radius_limit_km("raster"))
+
+    assert step < bds_topk.COARSE_STEP
+    assert index.radius_km + bds_topk.half_diagonal_km(BBOX[1], step) <= bds_raster.MAX_RADIUS_KM
+
+
+def test_top_k_runs_on_raster(synth_db):
+    index = bds_indices.INDICES["HAI"]
+    rows, stats = bds_topk.top_k(synth_db, index, 2, 500, "raster")
+
+    assert len(rows) == 2
+    assert stats["points_scored"] > 0
+
+
+def test_count_engine_falls_back_with_warning(synth_db):
+    with pytest.warns(UserWarning, match="aggregate"):
+        search = bds_topk.Search(synth_db, bds_indices.INDICES["UDI"], "count")
+    assert search.engine == "aggregate"
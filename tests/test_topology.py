@@ -0,0 +1,48 @@
+import mongomock
+
+import bds_topology
+from bds_topology import intersections, node_degrees
+
+
+def _line(*points):
+    return {"type": "LineString", "coordinates": [list(p) for p in points]}
+
+
+# A T-junction at (77.0, 11.0), a four-way crossing at (77.1, 11.1),
+# and two roads meeting end to end at (77.2, 11.0)
+ROADS = [
+    _line((76.99, 11.0), (77.0, 11.0), (77.01, 11.0)),
+    _line((77.0, 11.0), (77.0, 11.01)),
+    {"type": "MultiLineString", "coordinates": [
+        [[77.1, 11.09], [77.1, 11.1], [77.1, 11.11]],
+        [[77.09, 11.1], [77.1, 11.1], [77.11, 11.1]],
+    ]},
+    _line((77.19, 11.0), (77.2, 11.0)),
+    _line((77.2, 11.0), (77.2, 11.0), (77.21, 11.0)),
+]
+
+
+def test_node_degrees():
+    degree = node_degrees(ROADS)
+
+    assert degree[(77.0, 11.0)] == 3
+    assert degree[(77.1, 11.1)] == 4
+    # End to end (the repeated vertex is one node): a bend, not a junction
+    assert degree[(77.2, 11.0)] == 2
+    assert degree[(76.99, 11.0)] == degree[(77.0, 11.01)] == 1
+
+
+def test_intersections_and_table():
+    assert sorted(intersections(node_degrees(ROADS))) == [(77.0, 11.0, 3), (77.1, 11.1, 4)]
+
+    db = mongomock.MongoClient()["bds_test_topology"]
+    db.roads.insert_many([{"properties": {"fclass": "residential"}, "geometry": g} for g in ROADS])
+    stats = bds_topology.build(db)
+
+    assert stats["intersections"] == 2
+    rows = sorted(
+        (d["geometry"]["coordinates"], d["properties"]["degree"])
+        for d in db.road_intersections.find()
+    )
+    assert rows == [([77.0, 11.0], 3), ([77.1, 11.1], 4)]
+    assert all(d["properties"]["fclass"] == "intersection" for d in db.road_intersections.find())
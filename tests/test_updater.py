@@ -0,0 +1,142 @@
+import copy
+import json
+
+import pytest
+
+import bds_cube
+import bds_local
+import bds_synth
+import bds_updater
+import bds_vector
+
+POINTS = [[76.94, 11.0], [76.96, 11.01], [76.98, 11.03], [77.0, 11.04]]
+RADII_KM = [1.0, 2.5]
+
+
+def _moved(doc, dlon, dlat):
+    doc = copy.deepcopy(doc)
+    ring = doc["geometry"]["coordinates"][0]
+    doc["geometry"]["coordinates"][0] = [[x + dlon, y + dlat] for x, y in ring]
+    return doc
+
+
+def _recount(db, source="local"):
+    bds_local._ENGINES.pop(bds_local.engine_key(db), None)
+    bds_vector._ENGINES.pop(bds_local.engine_key(db), None)
+    cube = bds_cube.Cube("recount")
+    cube.fill(db, POINTS, RADII_KM, ["buildings"], source)
+    return cube
+
+
+def _engine(db, tmp_path, monkeypatch, source="local"):
+    engine = bds_cube.CubeEngine(db, str(tmp_path / "cube.json"))
+    monkeypatch.setitem(bds_cube._ENGINES, db.name, engine)
+    engine.cube = _recount(db, source)
+    return engine
+
+
+@pytest.mark.parametrize("source", ["local", "numpy"])
+def test_replay_matches_full_recount(tmp_path, monkeypatch, source):
+    db = bds_synth.mock_db(3000, seed=3, name=f"bds_test_updater_{source}")
+    engine = _engine(db, tmp_path, monkeypatch, source)
+    initial = copy.deepcopy(engine.current().entries)
+
+    docs = list(db.buildings.find().limit(3))
+    a, removed, template = docs
+    # A -> B -> C in quick succession: each event carries its own images
+    b = _moved(a, 0.01, 0.005)
+    c = _moved(b, 0.015, 0.01)
+    d = _moved(template, -0.01, 0.01)
+    d["_id"] = "inserted"
+    # ~1.5 km across on a cube cell: its centroid is inside the 1 km
+    # circle, its vertices are not
+    e = _moved(template, 0, 0)
+    e["_id"] = "large"
+    lon, lat = POINTS[0]
+    e["geometry"]["coordinates"][0] = [
+        [lon - 0.007, lat - 0.007], [lon + 0.007, lat - 0.007],
+        [lon + 0.007, lat + 0.007], [lon - 0.007, lat + 0.007], [lon - 0.007, lat - 0.007],
+    ]
+    events = [
+        {"op": "update", "collection": "buildings", "before": a, "after": b},
+        {"op": "update", "collection": "buildings", "before": b, "after": c},
+        {"op": "insert", "collection": "buildings", "before": None, "after": d},
+        {"op": "insert", "collection": "buildings", "before": None, "after": e},
+        {"op": "delete", "collection": "buildings", "before": removed, "after": None},
+    ]
+    oplog = tmp_path / "changes.jsonl"
+    oplog.write_text("".join(json.dumps(e, default=str) + "\n" for e in events))
+
+    db.buildings.replace_one({"_id": a["_id"]}, c)
+    db.buildings.insert_one(d)
+    db.buildings.insert_one(e)
+    db.buildings.delete_one({"_id": removed["_id"]})
+
+    updater = bds_updater.Updater(db, results_path=str(tmp_path / "results.json"))
+    assert updater.run(bds_updater.oplog_events(str(oplog))) == len(events)
+
+    replayed = {
+        key: {"buildings": tally["buildings"]}
+        for key, tally in updater.cube.entries.items()
+    }
+    assert replayed != initial
+    assert replayed == _recount(db, source).entries
+    assert bds_cube.Cube.load(engine.path).rule == bds_cube.COUNT_RULES[source]
+
+
+def test_resume_token_saved_after_cube(tmp_path, monkeypatch):
+    db = bds_synth.mock_db(500, seed=6, name="bds_test_updater_token")
+    engine = _engine(db, tmp_path, monkeypatch)
+    resume_path = tmp_path / "resume.json"
+    doc = db.buildings.find_one()
+    events = [
+        {"op": "delete", "collection": "buildings", "before": doc, "after": None,
+         "resume_token": '"t1"'},
+        {"op": "idle", "resume_token": '"t2"'},
+    ]
+
+    def crash(path):
+        raise OSError("disk full")
+
+    updater = bds_updater.Updater(db, results_path=str(tmp_path / "results.json"),
+                                  resume_path=str(resume_path))
+    monkeypatch.setattr(updater.cube, "save", crash)
+    with pytest.raises(OSError):
+        updater.run(iter(events))
+    # The cube never held the delete, so its token must not be saved
+    assert not resume_path.exists()
+
+    monkeypatch.undo()
+    monkeypatch.setitem(bds_cube._ENGINES, db.name, engine)
+    updater = bds_updater.Updater(db, results_path=str(tmp_path / "results.json"),
+                                  resume_path=str(resume_path))
+    updater.run(iter(events))
+    assert resume_path.read_text() == '"t2"'
+
+
+def test_cells_cube_is_refused(tmp_path, monkeypatch):
+    db = bds_synth.mock_db(200, seed=8, name="bds_test_updater_cells")
+    engine = _engine(db, tmp_path, monkeypatch)
+    engine.cube.rule = "cells"
+    with pytest.raises(ValueError):
+        bds_updater.Updater(db, results_path=str(tmp_path / "results.json"))
+
+
+def test_fill_refuses_other_rule():
+    db = bds_synth.mock_db(200, seed=9, name="bds_test_updater_fill")
+    cube = _recount(db)
+    with pytest.raises(ValueError):
+        cube.fill(db, POINTS, [0.5], ["buildings"], "numpy")
+
+
+def test_missing_post_image_drops_layer(tmp_path, monkeypatch):
+    db = bds_synth.mock_db(1000, seed=4, name="bds_test_updater_images")
+    _engine(db, tmp_path, monkeypatch)
+
+    doc = db.buildings.find_one()
+    updater = bds_updater.Updater(db, results_path=str(tmp_path / "results.json"))
+    touched = set()
+    updater.apply({"op": "update", "collection": "buildings", "before": doc, "after": None}, touched)
+
+    assert all("buildings" not in tally for tally in updater.cube.entries.values())
+    assert touched == set(updater.cube.entries)
@@ -0,0 +1,36 @@
+import mongomock
+import numpy as np
+
+import bds_vector
+from bds_local import vertex_centroid
+
+SQUARE = {"type": "Polygon", "coordinates": [[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]]}
+
+
+def test_vertex_centroid_counts_closing_vertex_once():
+    assert vertex_centroid(SQUARE).tolist() == [1.0, 1.0]
+    line = {"type": "LineString", "coordinates": [[0, 0], [3, 0], [3, 3]]}
+    assert vertex_centroid(line).tolist() == [2.0, 1.0]
+
+
+def test_load_centroids_prefers_stored_centroid_and_streams(monkeypatch):
+    db = mongomock.MongoClient()["bds_test_vector_load"]
+    moved = {"type": "Point", "coordinates": [5.0, 6.0]}
+    db.buildings.insert_many(
+        [{"properties": {"fclass": "building"}, "geometry": SQUARE, "centroid": moved}]
+        + [{"properties": {"fclass": "house"}, "geometry": SQUARE} for _ in range(5)]
+    )
+    monkeypatch.setattr(bds_vector, "LOAD_CHUNK", 2)
+
+    lon, lat, fclass, names = bds_vector.load_centroids(db, "buildings")
+
+    assert names == ["building", "house"]
+    assert lon.tolist() == [5.0] + [1.0] * 5
+    assert lat.tolist() == [6.0] + [1.0] * 5
+    assert fclass.dtype == np.int32 and fclass.tolist() == [0, 1, 1, 1, 1, 1]
+
+
+def test_load_centroids_empty_layer():
+    db = mongomock.MongoClient()["bds_test_vector_empty"]
+    lon, lat, fclass, names = bds_vector.load_centroids(db, "water")
+    assert len(lon) == len(lat) == len(fclass) == 0 and names == []